@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-19 11:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_alter_user_first_name_alter_user_last_name_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='has_branch_loans',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -50,7 +50,9 @@ class User(AbstractUser):
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     is_superuser = models.BooleanField(default=False)
-
+    # Set on the first branch loan, so patrons who only use the shared
+    # counter never have their penalties looked up on the branch shards
+    has_branch_loans = models.BooleanField(default=False)
 
     # Link to Custom manager
     objects = UserManager()
@@ -60,21 +62,28 @@ class User(AbstractUser):
     # Other required fields
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
+    # Patrons owing this much in unpaid penalties cannot borrow
+    MAX_UNPAID_PENALTIES = Decimal('60.00')
+
     def __str__(self):
         return self.email
     
     @property
     def total_penalties(self):
-        """Calculate total unpaid penalties for the user."""
-        return sum(
+        """Calculate total unpaid penalties for the user, including branch loans."""
+        total = sum(
             transaction.penalty_amount 
             for transaction in self.transaction_set.filter(penalty_paid=False)
         )
+        if self.has_branch_loans:
+            from library.models import BranchLoan
+
+            total += BranchLoan.objects.unpaid_total(self.pk)
+        return total
     
     def can_borrow_books(self):
         """Check if user can borrow books based on unpaid penalties."""
-        MAX_UNPAID_PENALTIES = Decimal('60.00')
-        return self.total_penalties < MAX_UNPAID_PENALTIES
+        return self.total_penalties < self.MAX_UNPAID_PENALTIES
 
 # Profile model linked to the custom user model
 class Profile(models.Model):
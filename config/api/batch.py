@@ -0,0 +1,151 @@
+import json
+import logging
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.http import Http404, HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework import status
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+API_PREFIX = '/api/'
+
+# Request headers that describe the batch's own body, not a sub-request's.
+_BODY_META = ('CONTENT_LENGTH', 'CONTENT_TYPE', 'HTTP_CONTENT_LENGTH', 'HTTP_CONTENT_TYPE', 'wsgi.input')
+
+
+class BatchError(ValueError):
+    """The batch itself is malformed; nothing in it was run."""
+
+
+def parse_items(data):
+    """
+    Validate a batch body and return its sub-requests as ``(id, path)`` pairs.
+
+    The body is either a list or ``{"requests": [...], "budget_ms": N}``; each
+    entry is a path string or ``{"path": ..., "id": ..., "method": "GET"}``.
+    Ids default to the entry's position and must be unique.
+    """
+    entries = data.get('requests') if isinstance(data, dict) else data
+    if not isinstance(entries, list) or not entries:
+        raise BatchError('Send a non-empty list of requests')
+    limit = getattr(settings, 'BATCH_MAX_REQUESTS', 20)
+    if len(entries) > limit:
+        raise BatchError(f'A batch can hold at most {limit} requests')
+
+    items = []
+    for position, entry in enumerate(entries):
+        if isinstance(entry, str):
+            entry = {'path': entry}
+        if not isinstance(entry, dict) or not isinstance(entry.get('path'), str):
+            raise BatchError(f'Request {position} needs a "path"')
+        if str(entry.get('method', 'GET')).upper() != 'GET':
+            raise BatchError(f'Request {position}: only GET requests can be batched')
+        items.append((str(entry.get('id', position)), entry['path']))
+    if len({item_id for item_id, _ in items}) < len(items):
+        raise BatchError('Request ids must be unique')
+    return items
+
+
+def budget_seconds(data):
+    """``BATCH_TIME_BUDGET_MS``, or the client's smaller ``budget_ms``."""
+    budget = getattr(settings, 'BATCH_TIME_BUDGET_MS', 5000)
+    requested = data.get('budget_ms') if isinstance(data, dict) else None
+    if requested is not None:
+        try:
+            requested = float(requested)
+        except (TypeError, ValueError):
+            raise BatchError('budget_ms must be a number')
+        budget = min(budget, max(requested, 0))
+    return budget / 1000
+
+
+def sub_request(request, path):
+    """
+    Build a GET request for ``path`` that reuses ``request``'s headers and
+    authenticated user, so the sub-request's view does not authenticate again.
+    """
+    url = urlsplit(path)
+    sub = HttpRequest()
+    sub.method = 'GET'
+    sub.path = sub.path_info = url.path
+    sub.META = {key: value for key, value in request.META.items() if key not in _BODY_META}
+    sub.META.update({'REQUEST_METHOD': 'GET', 'PATH_INFO': url.path, 'QUERY_STRING': url.query})
+    sub.GET = QueryDict(url.query)
+    sub.COOKIES = request.COOKIES
+    # Read by DRF's Request in place of the view's authentication classes.
+    sub._force_auth_user = request.user
+    sub._force_auth_token = request.auth
+    return sub
+
+
+def error(code, message):
+    return code, {'error': message}
+
+
+def dispatch(request, path):
+    """Run one sub-request through its view and return ``(status, body)``."""
+    url = urlsplit(path)
+    if url.scheme or url.netloc or not url.path.startswith(API_PREFIX):
+        return error(status.HTTP_400_BAD_REQUEST, f'Only paths under {API_PREFIX} can be batched')
+    try:
+        match = resolve(url.path)
+    except Resolver404:
+        return error(status.HTTP_404_NOT_FOUND, 'Not found')
+    if match.url_name == 'batch':
+        return error(status.HTTP_400_BAD_REQUEST, 'Batches cannot be nested')
+
+    sub = sub_request(request, path)
+    sub.resolver_match = match
+    try:
+        response = match.func(sub, *match.args, **match.kwargs)
+    except Http404:
+        return error(status.HTTP_404_NOT_FOUND, 'Not found')
+    except Exception:
+        # Only this item fails; the rest of the batch still gets its answers.
+        logger.exception('Batched GET %s failed', path)
+        return error(status.HTTP_500_INTERNAL_SERVER_ERROR, 'Internal server error')
+
+    if isinstance(response, Response):
+        # The batch response renders the data once; no need to render here.
+        return response.status_code, response.data
+    if hasattr(response, 'render'):
+        response.render()
+    content = getattr(response, 'content', b'')
+    try:
+        return response.status_code, json.loads(content) if content else None
+    except ValueError:
+        return response.status_code, content.decode(response.charset or 'utf-8', 'replace')
+
+
+def run(request, items, budget):
+    """
+    Run ``items`` in order within ``budget`` seconds.
+
+    A sub-request is not interrupted once started; those still waiting when
+    the budget runs out are answered with 504 and never run.
+
+    Returns:
+        tuple: ``(results, complete)``; ``complete`` is False if any item was
+        skipped for time
+    """
+    deadline = time.monotonic() + budget
+    results, complete = [], True
+    for item_id, path in items:
+        started = time.monotonic()
+        if started >= deadline:
+            complete = False
+            code, body = error(status.HTTP_504_GATEWAY_TIMEOUT, 'Not run: the batch time budget ran out')
+        else:
+            code, body = dispatch(request, path)
+        results.append({
+            'id': item_id,
+            'path': path,
+            'status': code,
+            'body': body,
+            'duration_ms': round((time.monotonic() - started) * 1000, 1),
+        })
+    return results, complete
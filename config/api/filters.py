@@ -0,0 +1,67 @@
+from datetime import date
+from library.isbn import catalogue_key
+from library.text import fold
+
+
+def filter_books(queryset, params):
+    """
+    Narrow a Book queryset by the catalogue filters accepted on ``/api/books/``.
+
+    Supported query parameters:
+        genre: exact genre
+        status: status code (A, M, R, C)
+        author: author name, matched on the folded Author key
+        author_id: Author primary key
+        decade: decade label or start year, e.g. ``1960s`` or ``1960``
+        isbn: ISBN-10 or ISBN-13, hyphens allowed (see ``catalogue_key``)
+
+    Returns:
+        tuple: The filtered queryset and whether any filter was applied
+    """
+    filtered = False
+
+    genre = params.get('genre')
+    if genre:
+        queryset = queryset.filter(genre=genre)
+        filtered = True
+
+    status = params.get('status')
+    if status:
+        queryset = queryset.filter(status=status)
+        filtered = True
+
+    author = params.get('author')
+    if author:
+        queryset = queryset.filter(author_record__name_key=fold(author))
+        filtered = True
+
+    author_id = params.get('author_id')
+    if author_id:
+        if author_id.isdigit():
+            queryset = queryset.filter(author_record_id=author_id)
+        else:
+            queryset = queryset.none()
+        filtered = True
+
+    decade = params.get('decade')
+    if decade:
+        start = decade.rstrip('s')
+        if start.isdigit():
+            start = int(start) // 10 * 10
+            queryset = queryset.filter(
+                publish_date__gte=date(start, 1, 1),
+                publish_date__lt=date(start + 10, 1, 1),
+            )
+        else:
+            queryset = queryset.none()
+        filtered = True
+
+    isbn = params.get('isbn')
+    if isbn:
+        try:
+            queryset = queryset.filter(isbn=catalogue_key(isbn)[0])
+        except ValueError:
+            queryset = queryset.none()
+        filtered = True
+
+    return queryset, filtered
@@ -0,0 +1,111 @@
+import json
+import time
+from functools import wraps
+from hashlib import sha256
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+def request_fingerprint(request, kwargs):
+    """Hash the parts of a request that decide what it does."""
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = {key: values for key, values in data.lists()}
+    body = json.dumps(data, sort_keys=True, default=str)
+    return sha256(f'{request.method}\n{request.path}\n{sorted(kwargs.items())}\n{body}'.encode()).hexdigest()
+
+
+def wait_for_completion(record):
+    """
+    Poll a key another request is still processing.
+
+    Returns the completed record, or None if it is still in progress (or was
+    abandoned) after ``IDEMPOTENCY_WAIT_TIMEOUT`` seconds.
+    """
+    deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT_TIMEOUT', 5)
+    interval = 0.05
+    while True:
+        if record.is_complete:
+            return record
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(interval)
+        interval = min(interval * 2, 0.5)
+        record = IdempotencyKey.objects.filter(pk=record.pk).first()
+        if record is None:
+            return None
+
+
+def idempotent(view_method):
+    """
+    Make an unsafe view method safe to retry with an ``Idempotency-Key`` header.
+
+    The first request with a key runs the view and stores its response; a
+    retry with the same key and the same request gets that response back
+    (marked with ``Idempotent-Replayed: true``) without running the view
+    again. Reusing a key for a different request is rejected with 422. A
+    retry that arrives while the first request is still running waits for
+    it to finish, and gets 409 if it does not finish in time; once the first
+    request has held the key past ``IDEMPOTENCY_PROCESSING_TIMEOUT`` it is
+    presumed dead and a retry runs the view again.
+
+    Server errors and exceptions are not stored, so the client can retry them. Requests
+    without the header are passed straight through.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {"error": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        fingerprint = request_fingerprint(request, kwargs)
+        record, created = IdempotencyKey.objects.claim(request.user, key, fingerprint)
+        if not created:
+            if record.request_hash != fingerprint:
+                return Response(
+                    {"error": f"{HEADER} was already used for a different request"},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+            record = wait_for_completion(record)
+            if record is None:
+                return Response(
+                    {"error": "A request with this idempotency key is still in progress"},
+                    status=status.HTTP_409_CONFLICT,
+                    headers={'Retry-After': '1'}
+                )
+            return Response(
+                record.response_body,
+                status=record.response_status,
+                headers={REPLAYED_HEADER: 'true'}
+            )
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+        if response.status_code >= 500:
+            record.delete()
+        else:
+            # An update, not save(): if this request overran its lease and a
+            # retry took the key over, the row is gone and nothing is stored.
+            IdempotencyKey.objects.filter(pk=record.pk, response_status__isnull=True).update(
+                response_status=response.status_code,
+                response_body=json.loads(json.dumps(response.data, default=str)),
+            )
+        return response
+
+    return wrapper
@@ -0,0 +1,54 @@
+import os
+import tempfile
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory
+from rest_framework.throttling import AnonRateThrottle
+from rest_framework.views import APIView
+
+from api.throttling import LoginIPThrottle, MemoryStore, SQLiteStore
+
+
+class Command(BaseCommand):
+    help = (
+        "Time one throttle check with the GCRA memory and SQLite stores, next to "
+        "DRF's cache-backed AnonRateThrottle, and print microseconds per check."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000, help='Checks per backend (default: 20000)')
+        parser.add_argument('--keys', type=int, default=1000, help='Distinct client keys to spread the checks over')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        keys = [f'bench:{i}' for i in range(options['keys'])]
+
+        with tempfile.TemporaryDirectory() as directory:
+            backends = {
+                'gcra-memory': MemoryStore(),
+                'gcra-sqlite': SQLiteStore(os.path.join(directory, 'throttle.sqlite3')),
+            }
+            for name, store in backends.items():
+                store.update('warmup', time.time(), 1, 60)
+                start = time.perf_counter()
+                for i in range(iterations):
+                    store.update(keys[i % len(keys)], time.time(), 0.001, 60)
+                self.report(name, start, iterations)
+
+        # End-to-end checks through DRF, including key building and rate parsing.
+        factory = APIRequestFactory()
+        request = APIView().initialize_request(factory.post('/auth/', REMOTE_ADDR='10.0.0.1'))
+        for name, throttle_class in (('drf-anon-cache', AnonRateThrottle), ('login-ip-gcra', LoginIPThrottle)):
+            # A rate high enough that every check is allowed and recorded.
+            throttle_class = type(name, (throttle_class,), {'rate': f'{iterations * 2}/hour'})
+            cache.clear()
+            start = time.perf_counter()
+            for _ in range(iterations):
+                throttle_class().allow_request(request, None)
+            self.report(name, start, iterations)
+
+    def report(self, name, start, iterations):
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'{name:16} {elapsed / iterations * 1e6:8.2f} us/check  ({iterations} checks)')
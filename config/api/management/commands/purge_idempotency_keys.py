@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys whose retention period (IDEMPOTENCY_KEY_TTL) has passed.'
+
+    def handle(self, *args, **options):
+        deleted = IdempotencyKey.objects.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired idempotency keys'))
@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
+
+
+class IdempotencyKeyManager(models.Manager):
+    def claim(self, user, key, request_hash):
+        """
+        Reserve ``key`` for this request.
+
+        Returns:
+            tuple: ``(record, created)``; ``created`` is False when another
+            request already holds or has completed the key
+        """
+        now = timezone.now()
+        ttl = getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60)
+        lease = getattr(settings, 'IDEMPOTENCY_PROCESSING_TIMEOUT', 60)
+        # Reclaimable: expired, or never completed by a request that must
+        # have crashed, since it has held the key longer than its lease.
+        stale = models.Q(expires_at__lte=now) | models.Q(
+            response_status__isnull=True, created_at__lte=now - timedelta(seconds=lease)
+        )
+        for _ in range(2):
+            try:
+                with transaction.atomic():
+                    return self.create(
+                        user=user,
+                        key=key,
+                        request_hash=request_hash,
+                        expires_at=now + timedelta(seconds=ttl),
+                    ), True
+            except IntegrityError:
+                # A stale record is as good as no record: drop it and retry.
+                if not self.filter(stale, user=user, key=key).delete()[0]:
+                    break
+        return self.get(user=user, key=key), False
+
+    def purge_expired(self):
+        """Delete every expired key and return how many were removed."""
+        return self.filter(expires_at__lte=timezone.now()).delete()[0]
+
+
+class IdempotencyKey(models.Model):
+    """
+    The outcome of a request sent with an ``Idempotency-Key`` header.
+
+    A row without a ``response_status`` is still being processed, for at
+    most ``IDEMPOTENCY_PROCESSING_TIMEOUT`` seconds before a retry may take
+    the key over. Retries with the same key get the stored response instead
+    of repeating the side effects, until the row expires.
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    objects = IdempotencyKeyManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}:{self.key}"
+
+    @property
+    def is_complete(self):
+        return self.response_status is not None
@@ -0,0 +1,168 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+from hashlib import sha1
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class EstimatedCountPagination(LimitOffsetPagination):
+    """
+    Limit/offset pagination that avoids an exact COUNT(*) on large tables.
+
+    Unfiltered querysets use the planner's row estimate for the table
+    (``sqlite_stat1`` after ``ANALYZE``, ``information_schema.TABLES`` on
+    MySQL, ``pg_class.reltuples`` on PostgreSQL) once that estimate is above
+    ``PAGINATION_ESTIMATE_THRESHOLD``. Small or filtered result sets get an
+    exact count, cached for ``PAGINATION_COUNT_CACHE_TTL`` seconds.
+
+    The response carries ``count_is_approximate`` so clients know when the
+    total is an estimate.
+    """
+    cache_prefix = 'pagination-count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        self.count_is_approximate = False
+        self.count = self.get_count(queryset)
+        self.offset = self.get_offset(request)
+        if self.count > self.limit and self.template is not None:
+            self.display_page_controls = True
+
+        # An estimate can be short of the real total, so never refuse to
+        # fetch a page just because the offset lies beyond it.
+        if not self.count_is_approximate and (self.count == 0 or self.offset > self.count):
+            return []
+        page = list(queryset[self.offset:self.offset + self.limit])
+        if self.count_is_approximate:
+            self.count = max(self.count, self.offset + len(page))
+        self.page_is_full = len(page) == self.limit
+        return page
+
+    def get_count(self, queryset):
+        """Return an estimated total for large unfiltered tables, else an exact (cached) one."""
+        if self.is_unfiltered(queryset):
+            estimate = self.estimate_table_rows(queryset)
+            threshold = getattr(settings, 'PAGINATION_ESTIMATE_THRESHOLD', 10000)
+            if estimate is not None and estimate >= threshold:
+                self.count_is_approximate = True
+                return estimate
+        return self.get_exact_count(queryset)
+
+    def get_exact_count(self, queryset):
+        """Run COUNT(*) for the queryset, caching the result for a short TTL."""
+        ttl = getattr(settings, 'PAGINATION_COUNT_CACHE_TTL', 30)
+        if not ttl:
+            return super().get_count(queryset)
+
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except Exception:
+            return super().get_count(queryset)
+        digest = sha1(f'{queryset.db}:{sql}:{params!r}'.encode()).hexdigest()
+        key = f'{self.cache_prefix}:{digest}'
+
+        count = cache.get(key)
+        if count is None:
+            count = super().get_count(queryset)
+            cache.set(key, count, ttl)
+        return count
+
+    @staticmethod
+    def is_unfiltered(queryset):
+        """True when the queryset would count every row of its model's table."""
+        query = getattr(queryset, 'query', None)
+        if query is None:
+            return False
+        return not (
+            query.where
+            or query.combinator
+            or query.distinct
+            or query.is_sliced
+            or query.group_by
+        )
+
+    @staticmethod
+    def estimate_table_rows(queryset):
+        """
+        Return the database's row estimate for the queryset's table.
+
+        Returns None when the backend has no statistics for the table yet.
+        """
+        table = queryset.model._meta.db_table
+        connection = connections[queryset.db]
+        try:
+            with connection.cursor() as cursor:
+                if connection.vendor == 'sqlite':
+                    cursor.execute(
+                        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+                    )
+                    if cursor.fetchone() is None:
+                        return None
+                    cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+                    row = cursor.fetchone()
+                    return int(row[0].split()[0]) if row else None
+                if connection.vendor == 'mysql':
+                    cursor.execute(
+                        "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                        [table],
+                    )
+                    row = cursor.fetchone()
+                    return int(row[0]) if row and row[0] is not None else None
+                if connection.vendor == 'postgresql':
+                    cursor.execute(
+                        "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)",
+                        [table],
+                    )
+                    row = cursor.fetchone()
+                    return int(row[0]) if row and row[0] >= 0 else None
+        except (DatabaseError, ValueError, IndexError):
+            return None
+        return None
+
+    def get_next_link(self):
+        if self.count_is_approximate:
+            # The total is only a guess; a full page means there may be more.
+            if not self.page_is_full:
+                return None
+            url = self.request.build_absolute_uri()
+            url = replace_query_param(url, self.limit_query_param, self.limit)
+            return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+        return super().get_next_link()
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.count,
+            'count_is_approximate': self.count_is_approximate,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data
+        })
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count_is_approximate'] = {
+            'type': 'boolean',
+            'example': False,
+        }
+        return response_schema
+
+
+class DueDateCursorPagination(CursorPagination):
+    """
+    Cursor pagination over ``(due_date, id)`` for reports on very large loan
+    tables: each page is an index range scan from the previous page's last
+    due date rather than an ever-growing OFFSET.
+
+    Views may set ``ordering`` per request to reverse the direction.
+    """
+    ordering = ('due_date', 'id')
+    page_size = 50
+    page_size_query_param = 'limit'
+    max_page_size = 500
@@ -1,15 +1,28 @@
 from rest_framework import serializers
-from library.models import Book, Transaction
+from library.models import Author, Book, BookCopy, BranchLoan, OutboxEvent, PenaltyPayment, Transaction
 from accounts.models import User, Profile
 from decimal import Decimal
+from django.utils import timezone
+
+class AuthorSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the Author model.
+    """
+
+    class Meta:
+        model = Author
+        fields = ["id", "name"]
+
 
 class BookSerializer(serializers.ModelSerializer):
     """
     Serializer for the Book model.
     
     Handles the serialization and deserialization of Book objects, including
-    validation and creation/update operations.
+    validation and creation/update operations. ``author`` stays the plain
+    author name; ``author_id`` points at the normalised Author record.
     """
+    author_id = serializers.PrimaryKeyRelatedField(source='author_record', read_only=True)
     
     class Meta:
         model = Book
@@ -17,6 +30,7 @@ class BookSerializer(serializers.ModelSerializer):
             "id",
             "title",
             "author",
+            "author_id",
             "isbn",
             "genre",
             "publish_date",
@@ -47,7 +61,8 @@ class BookSerializer(serializers.ModelSerializer):
         """
         Validate the entire object.
         
-        Ensures that available_copies doesn't exceed total_copies.
+        Ensures that available_copies doesn't exceed total_copies. On a
+        partial update the missing side is taken from the instance.
         
         Args:
             data (dict): The data to validate
@@ -58,13 +73,51 @@ class BookSerializer(serializers.ModelSerializer):
         Raises:
             serializers.ValidationError: If validation fails
         """
-        if data.get('available_copies', 0) > data.get('total_copies', 0):
+        available = data.get('available_copies', getattr(self.instance, 'available_copies', 0))
+        total = data.get('total_copies', getattr(self.instance, 'total_copies', 0))
+        if available > total:
             raise serializers.ValidationError(
                 "Available copies cannot exceed total copies"
             )
         return data
 
 
+class BookBatchSerializer(BookSerializer):
+    """
+    One row of a bulk book write. The per-row ISBN uniqueness query is
+    dropped; the view checks the whole batch against the database at once.
+    """
+
+    class Meta(BookSerializer.Meta):
+        extra_kwargs = {'isbn': {'validators': []}}
+
+
+class CopyScanSerializer(serializers.ModelSerializer):
+    """
+    Serializer for a copy resolved by ``BookCopy.objects.scan()``: the copy,
+    its book and its open loan, all from the one query's columns.
+    """
+    book = BookSerializer(read_only=True)
+    open_loan = serializers.SerializerMethodField()
+
+    class Meta:
+        model = BookCopy
+        fields = ['id', 'barcode', 'book', 'open_loan']
+
+    def get_open_loan(self, copy):
+        if copy.loan_id is None:
+            return None
+        days_overdue = max((timezone.now().date() - copy.loan_due_date).days, 0)
+        return {
+            'id': copy.loan_id,
+            'user_id': copy.loan_user_id,
+            'user_email': copy.loan_user_email,
+            'checkout_date': copy.loan_checkout_date,
+            'due_date': copy.loan_due_date,
+            'days_overdue': days_overdue,
+        }
+
+
 class TransactionSerializer(serializers.ModelSerializer):
     """
     Serializer for the Transaction model.
@@ -72,7 +125,7 @@ class TransactionSerializer(serializers.ModelSerializer):
     Handles the serialization and deserialization of Transaction objects,
     including the relationship between users and books.
     """
-    days_overdue = serializers.IntegerField(read_only=True)
+    days_overdue = serializers.SerializerMethodField()
     penalty_amount = serializers.DecimalField(
         max_digits=5, 
         decimal_places=2, 
@@ -88,6 +141,12 @@ class TransactionSerializer(serializers.ModelSerializer):
             'penalty_paid'
         ]
         read_only_fields = ['penalty_amount','penalty_paid', 'days_overdue']
+
+    def get_days_overdue(self, transaction):
+        """The ``with_overdue()`` annotation when the queryset has it, else the model property."""
+        if hasattr(transaction, 'overdue_days'):
+            return transaction.overdue_days
+        return transaction.days_overdue
         
     def validate(self, data):
         """
@@ -122,13 +181,78 @@ class TransactionSerializer(serializers.ModelSerializer):
             
         return data
 
+class OverdueTransactionSerializer(TransactionSerializer):
+    """
+    Transaction with the overdue figures computed by
+    ``TransactionQuerySet.with_overdue()`` rather than per row in Python.
+    """
+    days_overdue = serializers.IntegerField(source='overdue_days', read_only=True)
+    accrued_penalty = serializers.DecimalField(max_digits=5, decimal_places=2, read_only=True)
+    user_email = serializers.EmailField(source='user.email', read_only=True)
+
+    class Meta(TransactionSerializer.Meta):
+        fields = TransactionSerializer.Meta.fields + ['user_email', 'accrued_penalty']
+
+class ActiveLoanSerializer(TransactionSerializer):
+    """
+    An open loan on the patron dashboard, with the overdue figures from
+    ``TransactionQuerySet.with_overdue()``.
+    """
+    book = serializers.PrimaryKeyRelatedField(read_only=True)
+    days_overdue = serializers.IntegerField(source='overdue_days', read_only=True)
+    accrued_penalty = serializers.DecimalField(max_digits=5, decimal_places=2, read_only=True)
+    is_overdue = serializers.SerializerMethodField()
+
+    class Meta(TransactionSerializer.Meta):
+        fields = ['id', 'book', 'book_title', 'checkout_date', 'due_date', 'is_overdue', 'days_overdue', 'accrued_penalty']
+
+    def get_is_overdue(self, transaction):
+        return transaction.overdue_days > 0
+
+class BranchLoanSerializer(serializers.ModelSerializer):
+    """
+    Serializer for loans of a branch's copies.
+    """
+
+    class Meta:
+        model = BranchLoan
+        fields = [
+            'id', 'branch_code', 'book', 'checkout_date', 'due_date',
+            'return_date', 'penalty_amount', 'penalty_paid', 'payment'
+        ]
+        read_only_fields = fields
+
+class OutboxEventSerializer(serializers.ModelSerializer):
+    """
+    Serializer for entries of the change feed.
+    """
+
+    class Meta:
+        model = OutboxEvent
+        fields = ['id', 'topic', 'object_type', 'object_id', 'payload', 'created_at']
+
 class PenaltyPaymentSerializer(serializers.Serializer):
     payment_method = serializers.ChoiceField(
-        choices=['credit_card', 'debit_card', 'M-pesa'],
+        choices=PenaltyPayment.PATRON_METHODS,
         required=True
     )
 
 
+class PenaltyReceiptSerializer(serializers.ModelSerializer):
+    """A recorded penalty payment and the loans it settled, live or archived."""
+    transactions = serializers.SerializerMethodField()
+
+    def get_transactions(self, payment):
+        return sorted(
+            [*payment.transactions.values_list('id', flat=True),
+             *payment.archived_transactions.values_list('id', flat=True)]
+        )
+
+    class Meta:
+        model = PenaltyPayment
+        fields = ['id', 'amount', 'payment_method', 'loan_count', 'paid_at', 'transactions']
+
+
 class UserSerializer(serializers.ModelSerializer):
     """
     Serializer for the User model.
@@ -0,0 +1,214 @@
+import os
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class MemoryStore:
+    """
+    GCRA state for one process, kept in a dict behind a lock.
+
+    Each key holds its theoretical arrival time (TAT): the moment the key's
+    allowance would be fully used if requests kept arriving at the sustained
+    rate. Cheap, but every worker process has its own counters.
+    """
+    PRUNE_EVERY = 10000
+
+    def __init__(self):
+        self.tats = {}
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def update(self, key, now, interval, period):
+        """
+        Record a request for ``key`` if its allowance permits it.
+
+        Args:
+            interval: Seconds one request uses up (period / number of requests)
+            period: Seconds of burst allowance
+
+        Returns:
+            float: 0 when the request is allowed, else seconds until it would be
+        """
+        with self.lock:
+            tat = max(self.tats.get(key, now), now) + interval
+            if tat - now > period:
+                return tat - now - period
+            self.tats[key] = tat
+            self.calls += 1
+            if self.calls % self.PRUNE_EVERY == 0:
+                self.tats = {k: v for k, v in self.tats.items() if v > now}
+            return 0
+
+    def clear(self):
+        with self.lock:
+            self.tats.clear()
+
+
+class SQLiteStore:
+    """
+    GCRA state in a small SQLite file shared by every worker on the host.
+
+    The check is one UPSERT that only advances the key's TAT when the request
+    fits, so concurrent workers never lose updates. The file is separate from
+    the application database and runs with ``synchronous=OFF``: losing a few
+    counters in a crash only relaxes throttling briefly.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+
+    @property
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=1, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute('CREATE TABLE IF NOT EXISTS gcra (key TEXT PRIMARY KEY, tat REAL NOT NULL) WITHOUT ROWID')
+            self.local.connection = connection
+        return connection
+
+    def update(self, key, now, interval, period):
+        """Same contract as ``MemoryStore.update``."""
+        row = self.connection.execute(
+            'INSERT INTO gcra (key, tat) VALUES (:key, :now + :interval) '
+            'ON CONFLICT (key) DO UPDATE SET tat = max(tat, :now) + :interval '
+            'WHERE max(tat, :now) + :interval - :now <= :period '
+            'RETURNING tat',
+            {'key': key, 'now': now, 'interval': interval, 'period': period},
+        ).fetchone()
+        if row is not None:
+            return 0
+        (tat,) = self.connection.execute('SELECT tat FROM gcra WHERE key = ?', (key,)).fetchone()
+        return max(tat, now) + interval - now - period
+
+    def prune(self, now=None):
+        """Delete keys whose allowance has fully recovered."""
+        return self.connection.execute(
+            'DELETE FROM gcra WHERE tat <= ?', (time.time() if now is None else now,)
+        ).rowcount
+
+    def clear(self):
+        self.connection.execute('DELETE FROM gcra')
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store():
+    """
+    The store named by ``THROTTLE_STORE``: ``'memory'`` (the default) or the
+    path of a SQLite file.
+    """
+    name = getattr(settings, 'THROTTLE_STORE', 'memory') or 'memory'
+    store = _stores.get(name)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(name)
+            if store is None:
+                if name == 'memory':
+                    store = MemoryStore()
+                else:
+                    os.makedirs(os.path.dirname(os.path.abspath(name)), exist_ok=True)
+                    store = SQLiteStore(name)
+                _stores[name] = store
+    return store
+
+
+class GCRAThrottle(SimpleRateThrottle):
+    """
+    Rate throttle using the generic cell rate algorithm.
+
+    A rate of ``N/period`` allows bursts of up to N requests and then one
+    request every period/N seconds: a smooth sliding window that needs one
+    timestamp per key instead of a list of request times. Rates come from
+    ``DEFAULT_THROTTLE_RATES`` like DRF's own throttles; subclasses define
+    ``scope`` and ``get_cache_key``.
+    """
+    cache_format = '%(scope)s:%(ident)s'
+    timer = time.time
+
+    def get_rate(self):
+        # Read the rates per instance so settings overrides take effect.
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        if self.scope not in rates:
+            raise ImproperlyConfigured(f"No default throttle rate set for '{self.scope}' scope")
+        return rates[self.scope]
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        self.wait_seconds = get_store().update(
+            self.key, self.timer(), self.duration / self.num_requests, self.duration
+        )
+        return self.wait_seconds == 0
+
+    def wait(self):
+        return self.wait_seconds
+
+    def user_or_ident(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user-{request.user.pk}'
+        return f'ip-{self.get_ident(request)}'
+
+
+class LoginIPThrottle(GCRAThrottle):
+    """Login attempts per client IP."""
+    scope = 'login_ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class LoginAccountThrottle(GCRAThrottle):
+    """Login attempts per targeted account, whichever IPs they come from."""
+    scope = 'login_account'
+
+    def get_cache_key(self, request, view):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if not isinstance(email, str) or not email.strip():
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': email.strip().casefold()}
+
+
+class CirculationUserThrottle(GCRAThrottle):
+    """Checkouts, returns and payments per user."""
+    scope = 'circulation_user'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.user_or_ident(request)}
+
+
+class CirculationIPThrottle(GCRAThrottle):
+    """Checkouts, returns and payments per client IP."""
+    scope = 'circulation_ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class WriteThrottle(GCRAThrottle):
+    """Any unsafe request, per user (or per IP when anonymous). Reads are not throttled."""
+    scope = 'writes'
+
+    def get_cache_key(self, request, view):
+        if request.method in SAFE_METHODS:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': self.user_or_ident(request)}
+
+
+LOGIN_THROTTLES = [LoginIPThrottle, LoginAccountThrottle]
+CIRCULATION_THROTTLES = [CirculationUserThrottle, CirculationIPThrottle, WriteThrottle]
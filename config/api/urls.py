@@ -1,17 +1,27 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
+    AuthorViewSet,
     BookViewSet, 
+    BranchViewSet,
     TransactionViewSet, 
     UserViewSet, 
     ProfileViewSet,
     CheckoutBookView,
-    ReturnBookView
+    ReturnBookView,
+    CirculationStatsView,
+    BatchView,
+    ChangeFeedView,
+    DashboardView,
+    ScanView,
+    ScanReturnView,
 )
 
 # Create a router and register viewsets with it.
 router = DefaultRouter()
 router.register(r'books', BookViewSet)
+router.register(r'authors', AuthorViewSet)
+router.register(r'branches', BranchViewSet, basename='branch')
 router.register(r'transactions', TransactionViewSet)
 router.register(r'users', UserViewSet)
 router.register(r'profiles', ProfileViewSet)
@@ -21,5 +31,11 @@ urlpatterns = [
     path('', include(router.urls)),
     path('checkout/', CheckoutBookView.as_view(), name='checkout-book'),
     path('return/<int:pk>/', ReturnBookView.as_view(), name='return-book'),
+    path('stats/circulation/', CirculationStatsView.as_view(), name='circulation-stats'),
+    path('changes/', ChangeFeedView.as_view(), name='change-feed'),
+    path('batch/', BatchView.as_view(), name='batch'),
+    path('me/dashboard/', DashboardView.as_view(), name='me-dashboard'),
+    path('scan/<str:barcode>/', ScanView.as_view(), name='scan'),
+    path('scan/<str:barcode>/return/', ScanReturnView.as_view(), name='scan-return'),
 
 ]
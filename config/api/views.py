@@ -1,23 +1,308 @@
 from rest_framework import viewsets, generics, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from .serializers import BookSerializer, TransactionSerializer, UserSerializer, ProfileSerializer , PenaltyPaymentSerializer
-from library.models import Book, Transaction
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
+from rest_framework.views import APIView
+from .serializers import ActiveLoanSerializer, AuthorSerializer, BookBatchSerializer, BookSerializer, BranchLoanSerializer, CopyScanSerializer, OutboxEventSerializer, OverdueTransactionSerializer, PenaltyReceiptSerializer, TransactionSerializer, UserSerializer, ProfileSerializer , PenaltyPaymentSerializer
+from library import autocomplete, dashboard
+from library.isbn import catalogue_key
+from library.models import ArchivedTransaction, Author, Book, BookBorrowCount, BookCopy, BranchHolding, BranchLoan, BookCooccurrence, BookFacetCount, DailyCirculationStat, OutboxConsumer, OutboxEvent, Transaction
+from . import batch
+from .filters import filter_books
+from .pagination import DueDateCursorPagination
+from .idempotency import idempotent
+from .throttling import CIRCULATION_THROTTLES
 from accounts.models import User, Profile
+from django.conf import settings
 from django.db.models import Sum
+from django.utils import timezone
+from datetime import date, timedelta
+from decimal import Decimal
+import re
+import time
 
 class BookViewSet(viewsets.ModelViewSet):
     """
     ViewSet for handling CRUD operations on Book model.
     
     This ViewSet provides list, create, retrieve, update, and delete actions for books.
-    It also includes a custom action to list available books.
+    It also includes custom actions to list available books and facet counts.
+    The list accepts the catalogue filters documented in ``api.filters.filter_books``.
     """
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'facets'):
+            queryset, _ = filter_books(queryset, self.request.query_params)
+        return queryset
+
+    def create(self, request, *args, **kwargs):
+        """Create one book, or many when the body is a list (see ``save_batch``)."""
+        if isinstance(request.data, list):
+            return self.save_batch(request.data)
+        return super().create(request, *args, **kwargs)
+
+    @action(detail=False, methods=['patch'], url_path='bulk')
+    def bulk_update(self, request):
+        """Partially update many books: a list of rows, each with the book's ``id``."""
+        return self.save_batch(request.data, key='id')
+
+    @action(detail=False, methods=['post'])
+    def upsert(self, request):
+        """
+        Create or partially update many books, matched by ``isbn``: rows for
+        an existing ISBN update that book, the rest create new ones.
+        """
+        return self.save_batch(request.data, key='isbn')
+
+    def save_batch(self, rows, key=None):
+        """
+        Validate a list of book rows and write them all in one transaction.
+
+        Existing books and taken ISBNs are read for the whole batch in one
+        query each, and the writes are one ``bulk_create`` and one
+        ``bulk_update`` (``Book.objects.bulk_save``). Nothing is written if
+        any row is invalid: the 400 response's ``errors`` list has the
+        row's errors at its index and null for the valid rows.
+
+        Args:
+            key (str): None to create every row, ``'id'`` to update books by
+                id, ``'isbn'`` to upsert by ISBN
+        """
+        max_rows = getattr(settings, 'BOOK_BULK_MAX_ROWS', 1000)
+        if not isinstance(rows, list) or not rows:
+            return Response({"error": "Expected a non-empty list of books"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > max_rows:
+            return Response(
+                {"error": f"At most {max_rows} books can be written at once"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        objects = [row if isinstance(row, dict) else {} for row in rows]
+        isbns = {row['isbn'] for row in objects if isinstance(row.get('isbn'), str)}
+        # in_bulk splits the IN list to the backend's parameter limit.
+        taken = Book.objects.order_by().in_bulk(isbns, field_name='isbn')
+        if key == 'id':
+            existing = Book.objects.order_by().in_bulk(
+                [row['id'] for row in objects if isinstance(row.get('id'), int)]
+            )
+        elif key == 'isbn':
+            existing = taken
+        else:
+            existing = {}
+
+        errors = [None] * len(rows)
+        created, updated, books = [], [], []
+        seen_isbns, seen_ids = {}, set()
+        for index, row in enumerate(rows):
+            if not isinstance(row, dict):
+                errors[index] = {'non_field_errors': ['Expected a book object']}
+                continue
+            instance = existing.get(row.get(key)) if key else None
+            if key == 'id' and instance is None:
+                errors[index] = {'id': ['No book with this id']}
+                continue
+            if instance is not None and instance.pk in seen_ids:
+                errors[index] = {key: ['This book appears more than once in the batch']}
+                continue
+
+            serializer = BookBatchSerializer(instance, data=row, partial=instance is not None)
+            if not serializer.is_valid():
+                errors[index] = serializer.errors
+                continue
+            isbn = serializer.validated_data.get('isbn', getattr(instance, 'isbn', None))
+            owner = taken.get(isbn)
+            if owner is not None and (instance is None or owner.pk != instance.pk):
+                errors[index] = {'isbn': ['book with this isbn already exists.']}
+                continue
+            if isbn in seen_isbns:
+                errors[index] = {'isbn': [f'Duplicate of row {seen_isbns[isbn]}']}
+                continue
+            seen_isbns[isbn] = index
+
+            book = instance or Book()
+            for attr, value in serializer.validated_data.items():
+                setattr(book, attr, value)
+            if instance is None:
+                created.append(book)
+            else:
+                seen_ids.add(instance.pk)
+                updated.append(book)
+            books.append(book)
+
+        if any(errors):
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        Book.objects.bulk_save(created, updated)
+        return Response(
+            {
+                'created': len(created),
+                'updated': len(updated),
+                'results': BookSerializer(books, many=True).data,
+            },
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Return book counts per genre, status and decade in one response.
+
+        Without filters the counts come from the precomputed BookFacetCount
+        table. With filters they are grouped over the (narrowed) result set.
+        """
+        queryset, filtered = filter_books(Book.objects.all(), request.query_params)
+        if filtered:
+            facets = BookFacetCount.objects.tally(queryset)
+        else:
+            facets = BookFacetCount.objects.as_dict()
+        facets['total'] = sum(facets[BookFacetCount.STATUS].values())
+        return Response(facets)
+
+    @action(detail=False, methods=['get'])
+    def popular(self, request):
+        """
+        Most borrowed books over a rolling window, e.g. ``?window=7d`` or
+        ``?window=4w`` (default 7d), merged from daily borrow buckets.
+
+        Accepts ``limit`` (default 10, at most 100).
+        """
+        window = request.query_params.get('window', '7d')
+        match = re.fullmatch(r'(\d+)([dw])', window)
+        days = int(match.group(1)) * (7 if match.group(2) == 'w' else 1) if match else 0
+        if not 0 < days <= BookBorrowCount.RETENTION_DAYS:
+            return Response(
+                {"error": f"window must be between 1d and {BookBorrowCount.RETENTION_DAYS}d"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 100)
+        except ValueError:
+            limit = 10
+
+        top = BookBorrowCount.objects.top(days, limit)
+        books = Book.objects.in_bulk([book_id for book_id, _ in top])
+        results = []
+        for book_id, borrows in top:
+            if book_id in books:
+                data = self.get_serializer(books[book_id]).data
+                data['borrow_count'] = borrows
+                results.append(data)
+        return Response({'window': window, 'results': results})
+
+    @action(detail=True, methods=['get'])
+    def related(self, request, pk=None):
+        """
+        "Patrons also borrowed": the books most often borrowed by patrons who
+        borrowed this one, read from the precomputed co-occurrence index.
+
+        Accepts ``limit`` (default 10, at most 50).
+        """
+        book = self.get_object()
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            limit = 10
+
+        results = []
+        for pair in BookCooccurrence.objects.top_related(book.pk, limit):
+            data = self.get_serializer(pair.related_book).data
+            data['borrowed_together'] = pair.count
+            results.append(data)
+        return Response({'book': book.pk, 'results': results})
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """
+        Type-ahead suggestions: books with a title or author word starting
+        with ``q``, accent- and case-insensitively.
+
+        Served from this worker's in-memory prefix index
+        (``library.autocomplete``) rather than a ``LIKE`` query per
+        keystroke. Accepts ``limit`` (default 10, at most 50).
+        """
+        query = request.query_params.get('q', '')
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            limit = 10
+        return Response({
+            'q': query,
+            'results': [
+                {'id': book_id, 'title': title, 'author': author}
+                for book_id, title, author in autocomplete.index.search(query, limit)
+            ],
+        })
+
+    @action(detail=False, methods=['post'])
+    def lookup(self, request):
+        """
+        Resolve many ISBNs at once: ``{"isbns": ["0-306-40615-2", ...]}``.
+
+        Each ISBN-10 or ISBN-13 is normalised and checksum-validated (a
+        13-character value with a bad check digit still matches a book stored
+        under it, see ``catalogue_key``), then all of them are fetched in
+        chunked ``IN`` queries on the unique isbn index. ``results`` maps every input to ``{"isbn", "book"}`` or
+        ``{"error"}``; unknown ISBNs have a null book.
+        """
+        isbns = request.data.get('isbns') if hasattr(request.data, 'get') else None
+        max_isbns = getattr(settings, 'BOOK_LOOKUP_MAX_ISBNS', 5000)
+        if not isinstance(isbns, list) or not isbns:
+            return Response({"error": "isbns must be a non-empty list"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(isbns) > max_isbns:
+            return Response(
+                {"error": f"At most {max_isbns} ISBNs can be looked up at once"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = {}
+        normalized = {}
+        invalid = {}
+        for value in isbns:
+            key = str(value)
+            try:
+                normalized[key], invalid[key] = catalogue_key(value)
+            except ValueError as e:
+                results[key] = {'error': str(e)}
+
+        # in_bulk splits the IN list to the backend's parameter limit.
+        books = Book.objects.order_by().in_bulk(set(normalized.values()), field_name='isbn')
+        for key, isbn in normalized.items():
+            book = books.get(isbn)
+            if book is None and invalid[key] is not None:
+                # Not a valid ISBN, and no book is stored under it either.
+                results[key] = {'error': str(invalid[key])}
+                continue
+            results[key] = {
+                'isbn': isbn,
+                'book': self.get_serializer(book).data if book is not None else None,
+            }
+        return Response({
+            'found': sum(1 for result in results.values() if result.get('book')),
+            'results': {str(value): results[str(value)] for value in isbns},
+        })
+
+    @action(detail=True, methods=['get'])
+    def availability(self, request, pk=None):
+        """
+        Copies of the book across branches, merged from every branch shard.
+
+        Without configured branches this is the book's own copy counters.
+        """
+        book = self.get_object()
+        if not settings.LIBRARY_BRANCHES:
+            return Response({
+                'book': book.pk,
+                'total_copies': book.total_copies,
+                'available_copies': book.available_copies,
+                'branches': {},
+            })
+        return Response({'book': book.pk, **BranchHolding.objects.availability([book.pk])[book.pk]})
+
     @action(detail=False, methods=['get'])
     def available(self, request):
         """
@@ -29,20 +314,122 @@ class BookViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(available_books, many=True)
         return Response(serializer.data)
 
+class AuthorViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    ViewSet for browsing normalised authors and their books.
+    """
+    queryset = Author.objects.all()
+    serializer_class = AuthorSerializer
+    permission_classes = [IsAuthenticated]
+
+    @action(detail=True, methods=['get'])
+    def books(self, request, pk=None):
+        """List the author's books through the indexed author_record foreign key."""
+        author = self.get_object()
+        books = Book.objects.filter(author_record=author)
+        page = self.paginate_queryset(books)
+        if page is not None:
+            serializer = BookSerializer(page, many=True, context=self.get_serializer_context())
+            return self.get_paginated_response(serializer.data)
+        serializer = BookSerializer(books, many=True, context=self.get_serializer_context())
+        return Response(serializer.data)
+
+class BranchViewSet(viewsets.ViewSet):
+    """
+    Branch circulation. Each branch lends from its own holdings, stored on
+    the branch's database shard (see ``LIBRARY_BRANCHES``).
+    """
+    permission_classes = [IsAuthenticated]
+    lookup_field = 'code'
+    lookup_value_regex = r'[\w-]+'
+
+    def list(self, request):
+        return Response([{'code': code} for code in settings.LIBRARY_BRANCHES])
+
+    def get_branch(self, code):
+        if code not in settings.LIBRARY_BRANCHES:
+            raise NotFound(f"Unknown branch: {code}")
+        return code
+
+    @action(detail=True, methods=['post'], throttle_classes=CIRCULATION_THROTTLES)
+    @idempotent
+    def checkout(self, request, code=None):
+        """Borrow a copy of ``book`` from this branch."""
+        code = self.get_branch(code)
+        book_id = request.data.get('book')
+        try:
+            book = Book.objects.get(id=book_id)
+        except (Book.DoesNotExist, ValueError, TypeError):
+            return Response(
+                {"error": f"Book not found with ID: {book_id}"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        try:
+            loan = BranchHolding.objects.checkout(code, book, request.user)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(BranchLoanSerializer(loan).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'], url_path='return', url_name='return', throttle_classes=CIRCULATION_THROTTLES)
+    @idempotent
+    def return_loan(self, request, code=None):
+        """Return the user's branch ``loan``."""
+        code = self.get_branch(code)
+        try:
+            loan = BranchLoan.objects.for_branch(code).get(pk=request.data.get('loan'), user=request.user)
+        except (BranchLoan.DoesNotExist, ValueError, TypeError):
+            raise NotFound("Loan not found")
+        try:
+            loan.return_book()
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(BranchLoanSerializer(loan).data)
+
+    @action(detail=True, methods=['post'], throttle_classes=CIRCULATION_THROTTLES)
+    @idempotent
+    def pay_penalty(self, request, code=None):
+        """Pay the penalty of the user's branch ``loan``."""
+        code = self.get_branch(code)
+        try:
+            loan = BranchLoan.objects.for_branch(code).get(pk=request.data.get('loan'), user=request.user)
+        except (BranchLoan.DoesNotExist, ValueError, TypeError):
+            raise NotFound("Loan not found")
+        serializer = PenaltyPaymentSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        if not loan.pay_penalty(serializer.validated_data['payment_method']):
+            return Response({"error": "No penalty to pay"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            "status": "Penalty paid successfully",
+            "loan": BranchLoanSerializer(loan).data,
+        })
+
 class TransactionViewSet(viewsets.ModelViewSet):
     """
     ViewSet for handling CRUD operations on Transaction model.
     
     This ViewSet provides list, create, retrieve, update, and delete actions for transactions.
+    The list is the user's full history, including loans moved to the archive table.
     """
     queryset = Transaction.objects.all()
     serializer_class = TransactionSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Transaction.objects.filter(user=self.request.user)
+        return Transaction.objects.filter(user=self.request.user).with_overdue()
+
+    def list(self, request, *args, **kwargs):
+        history = ArchivedTransaction.objects.history(request.user.pk)
+        page = self.paginate_queryset(history)
+        rows = page if page is not None else list(history)
+        serializer = self.get_serializer(ArchivedTransaction.objects.load_history(rows), many=True)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
 
-    @action(detail=True, methods=['post'])
+    @action(detail=True, methods=['post'], throttle_classes=CIRCULATION_THROTTLES)
+    @idempotent
     def pay_penalty(self, request, pk=None):
         """Endpoint to pay penalty for a specific transaction."""
         transaction = self.get_object()
@@ -64,15 +451,78 @@ class TransactionViewSet(viewsets.ModelViewSet):
             )
         
 
-        success = transaction.pay_penalty()
+        success = transaction.pay_penalty(serializer.validated_data['payment_method'])
         
         if success:
-            return Response({"status": "Penalty paid successfully"})
+            return Response({
+                "status": "Penalty paid successfully",
+                "payment": PenaltyReceiptSerializer(transaction.payment).data,
+            })
         return Response(
             {"error": "Failed to process payment"}, 
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    @action(detail=False, methods=['post'], throttle_classes=CIRCULATION_THROTTLES)
+    @idempotent
+    def pay_all(self, request):
+        """
+        Pay every unpaid penalty of the current user at once.
+
+        All the loans are marked paid by one ``UPDATE`` and recorded as a
+        single payment with the given ``payment_method``, in one transaction.
+        """
+        serializer = PenaltyPaymentSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        payments = Transaction.objects.filter(user=request.user).pay_penalties(
+            serializer.validated_data['payment_method']
+        )
+        if not payments:
+            return Response({"error": "No penalty to pay"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            "status": "Penalties paid successfully",
+            "payment": PenaltyReceiptSerializer(payments[0]).data,
+        })
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def overdue(self, request):
+        """
+        Staff report of every open overdue loan, with days overdue and the
+        accrued (capped) penalty computed in SQL.
+
+        Query parameters:
+            order: ``-days_overdue`` (default, most overdue first) or ``days_overdue``
+            min_days: Only loans at least this many days overdue
+            limit: Page size (default 50, at most 500); follow ``next`` for more
+        """
+        order = request.query_params.get('order', '-days_overdue')
+        if order not in ('days_overdue', '-days_overdue'):
+            return Response(
+                {"error": "order must be 'days_overdue' or '-days_overdue'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            min_days = max(int(request.query_params.get('min_days', 1)), 1)
+        except ValueError:
+            return Response({"error": "min_days must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        today = timezone.now().date()
+        # Days overdue only grow as the due date recedes, so ordering by
+        # due_date walks the index instead of sorting a computed column.
+        loans = (
+            Transaction.objects.overdue(today)
+            .filter(due_date__lte=today - timedelta(days=min_days))
+            .with_overdue(today)
+            .select_related('book', 'user')
+        )
+        paginator = DueDateCursorPagination()
+        paginator.ordering = ('due_date', 'id') if order == '-days_overdue' else ('-due_date', '-id')
+        page = paginator.paginate_queryset(loans, request, view=self)
+        serializer = OverdueTransactionSerializer(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+
     @action(detail=False, methods=['get'])
     def unpaid_penalties(self, request):
         """Get all unpaid penalties for the current user."""
@@ -125,21 +575,35 @@ class ProfileViewSet(viewsets.ModelViewSet):
 class CheckoutBookView(generics.CreateAPIView):
     serializer_class = TransactionSerializer
     permission_classes = [IsAuthenticated]
+    throttle_classes = CIRCULATION_THROTTLES
 
+    @idempotent
     def create(self, request, *args, **kwargs):
         # Debug logging
         print("Request data:", request.data)
         print("User:", request.user)
         
         book_id = request.data.get('book')
+        barcode = request.data.get('barcode')
         print("Attempting to find book with ID:", book_id)
         
         try:
-            # Try to get the book and print its details
-            book = Book.objects.get(id=book_id)
+            copy = None
+            if barcode:
+                # A scanned copy identifies the book too
+                copy = BookCopy.objects.select_related('book').filter(barcode=barcode).first()
+                if copy is None:
+                    return Response(
+                        {"error": f"No copy with barcode: {barcode}"},
+                        status=status.HTTP_404_NOT_FOUND
+                    )
+                book = copy.book
+            else:
+                # Try to get the book and print its details
+                book = Book.objects.get(id=book_id)
             print("Found book:", book)
             
-            transaction = book.checkout(request.user)
+            transaction = book.checkout(request.user, copy=copy)
             serializer = self.get_serializer(transaction)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         except Book.DoesNotExist:
@@ -164,7 +628,9 @@ class ReturnBookView(generics.UpdateAPIView):
     queryset = Transaction.objects.all()
     serializer_class = TransactionSerializer
     permission_classes = [IsAuthenticated]
+    throttle_classes = CIRCULATION_THROTTLES
 
+    @idempotent
     def update(self, request, *args, **kwargs):
         """
         Handle PUT/PATCH requests to return a book.
@@ -174,8 +640,201 @@ class ReturnBookView(generics.UpdateAPIView):
         """
         transaction = self.get_object()
         try:
-            transaction.book.return_book(request.user)
-            serializer = self.get_serializer(transaction)
+            returned = transaction.book.return_book(request.user)
+            serializer = self.get_serializer(returned)
             return Response(serializer.data)
         except ValueError as e:
-            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+class CirculationStatsView(APIView):
+    """
+    Staff circulation statistics served from the daily rollup table.
+
+    Query parameters:
+        start, end: Inclusive date range (YYYY-MM-DD); defaults to the last 30 days
+        genre: Restrict to one genre
+        bucket: ``day`` (default) or ``month``
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        today = timezone.localdate()
+        try:
+            end = date.fromisoformat(request.query_params.get('end', today.isoformat()))
+            start = date.fromisoformat(
+                request.query_params.get('start', (end - timedelta(days=29)).isoformat())
+            )
+        except ValueError:
+            return Response(
+                {"error": "start and end must be dates in YYYY-MM-DD format"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        bucket = request.query_params.get('bucket', 'day')
+        if bucket not in ('day', 'month') or start > end:
+            return Response(
+                {"error": "bucket must be 'day' or 'month' and start must not be after end"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response({
+            'start': start,
+            'end': end,
+            'bucket': bucket,
+            'results': DailyCirculationStat.objects.summarize(
+                start, end, genre=request.query_params.get('genre'), bucket=bucket
+            ),
+        })
+
+
+class DashboardView(APIView):
+    """
+    Everything the patron app shows on launch in one response: open loans
+    with their overdue status, penalty totals, borrowing eligibility and the
+    profile.
+
+    Built with three queries (loans, penalty totals, profile) however many
+    loans the patron has, then cached per patron until their next checkout,
+    return, payment or profile change.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        user = request.user
+        data = dashboard.get_cached(user.pk)
+        if data is None:
+            generation = dashboard.generation(user.pk)
+            loans = dashboard.active_loans(user)
+            penalties = dashboard.penalty_totals(user)
+            profile = Profile.objects.filter(user=user).first()
+            penalties['accruing'] = sum((loan.accrued_penalty for loan in loans), Decimal('0.00'))
+            data = {
+                'user': UserSerializer(user).data,
+                'profile': {
+                    'id': profile.pk, 'profile_pic': profile.profile_pic, 'bio': profile.bio,
+                } if profile else None,
+                'loans': ActiveLoanSerializer(loans, many=True).data,
+                'overdue_count': sum(1 for loan in loans if loan.overdue_days > 0),
+                'penalties': penalties,
+                'can_borrow': penalties['unpaid_total'] + penalties['branch_unpaid_total'] < User.MAX_UNPAID_PENALTIES,
+                'max_unpaid_penalties': User.MAX_UNPAID_PENALTIES,
+                'generated_at': timezone.now(),
+            }
+            dashboard.set_cached(user.pk, data, generation)
+        return Response(data)
+
+
+class BatchView(APIView):
+    """
+    Run several GET requests against this API in one round trip.
+
+    The body is a list of paths under ``/api/`` (or ``{"path", "id"}``
+    objects), optionally wrapped as ``{"requests": [...], "budget_ms": N}``.
+    Sub-requests run in order inside this request, as this request's user and
+    on its database connection, and each answers with its own status and body.
+    Those not started within the time budget come back as 504.
+    """
+    permission_classes = [IsAuthenticated]
+    # Only GETs are batched and reads are not throttled; the write throttle
+    # would otherwise count a batch of reads as a write.
+    throttle_classes = []
+
+    def post(self, request):
+        try:
+            items = batch.parse_items(request.data)
+            budget = batch.budget_seconds(request.data)
+        except batch.BatchError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        started = time.perf_counter()
+        results, complete = batch.run(request, items, budget)
+        return Response({
+            'results': results,
+            'complete': complete,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+        })
+
+
+class ChangeFeedView(APIView):
+    """
+    Staff feed of catalogue and circulation changes from the outbox table.
+
+    Query parameters:
+        after: Return events with an id above this cursor (default 0)
+        limit: Events per page (default 100, at most 1000)
+        consumer: Name of the reading service. Passing it acknowledges every
+            event up to ``after``, which lets ``compact_outbox`` delete them
+
+    Pass the returned ``next`` as ``after`` to continue; ``has_more`` is False
+    once the feed is caught up.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        try:
+            after = max(int(request.query_params.get('after', 0)), 0)
+            limit = min(max(int(request.query_params.get('limit', 100)), 1), 1000)
+        except ValueError:
+            return Response(
+                {"error": "after and limit must be integers"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        name = request.query_params.get('consumer')
+        if name:
+            consumer, _ = OutboxConsumer.objects.get_or_create(name=name[:100])
+            OutboxConsumer.objects.filter(pk=consumer.pk, position__lt=after).update(position=after)
+
+        events = list(OutboxEvent.objects.after(after, limit + 1))
+        has_more = len(events) > limit
+        events = events[:limit]
+        delay = getattr(settings, 'OUTBOX_VISIBILITY_DELAY', 0)
+        if delay:
+            # Ids are assigned at insert, not commit: stop short of recent
+            # events so slower concurrent transactions can commit lower ids
+            # before the cursor moves past them.
+            cutoff = timezone.now() - timedelta(seconds=delay)
+            settled = [event for event in events if event.created_at <= cutoff]
+            if len(settled) < len(events):
+                events, has_more = events[:len(settled)], True
+        return Response({
+            'results': OutboxEventSerializer(events, many=True).data,
+            'next': events[-1].pk if events else after,
+            'has_more': has_more,
+        })
+
+
+class ScanView(APIView):
+    """
+    Circulation desk lookup of a scanned barcode: the copy, its book and its
+    open loan (``open_loan`` is null when the copy is on the shelf), resolved
+    in a single indexed query.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, barcode):
+        try:
+            copy = BookCopy.objects.scan(barcode)
+        except BookCopy.DoesNotExist:
+            raise NotFound(f"No copy with barcode: {barcode}")
+        return Response(CopyScanSerializer(copy).data)
+
+
+class ScanReturnView(APIView):
+    """
+    Check a scanned copy back in at the desk, whoever borrowed it.
+    """
+    permission_classes = [IsAdminUser]
+    throttle_classes = CIRCULATION_THROTTLES
+
+    @idempotent
+    def post(self, request, barcode):
+        try:
+            copy = BookCopy.objects.scan(barcode)
+        except BookCopy.DoesNotExist:
+            raise NotFound(f"No copy with barcode: {barcode}")
+        if copy.loan_id is None:
+            return Response({"error": "This copy is not on loan"}, status=status.HTTP_400_BAD_REQUEST)
+
+        loan = Transaction.objects.select_related('user').get(pk=copy.loan_id)
+        returned = copy.book.return_book(loan.user, transaction=loan)
+        return Response(TransactionSerializer(returned).data)
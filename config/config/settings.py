@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 LOGIN_REDIRECT_URL = '/api' 
@@ -48,15 +49,97 @@ INSTALLED_APPS = [
 
 ]
 
+# The HTML browsable API and its session login pages (/api-auth/). Off unless
+# BROWSABLE_API=1 (DEBUG is hard-coded above, so it cannot tell development
+# from production): clients speak JSON and workers should not load them.
+BROWSABLE_API = os.environ.get('BROWSABLE_API', '').lower() in ('1', 'true', 'yes')
+
 REST_FRAMEWORK = {
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
+    'DEFAULT_RENDERER_CLASSES': (
+        ('rest_framework.renderers.JSONRenderer', 'rest_framework.renderers.BrowsableAPIRenderer')
+        if BROWSABLE_API else ('rest_framework.renderers.JSONRenderer',)
+    ),
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.EstimatedCountPagination',
     'PAGE_SIZE': 30,
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+    ),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'api.throttling.WriteThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '20/min',
+        'login_account': '10/min',
+        'circulation_user': '30/min',
+        'circulation_ip': '120/min',
+        'writes': '120/min',
+    },
+}
 
+# Where GCRA throttle counters live: 'memory' (per process) or the path of a
+# SQLite file shared by every worker on the host.
+THROTTLE_STORE = os.environ.get('THROTTLE_STORE', 'memory')
+
+# The dashboard cache must be shared by every worker so a circulation event
+# in one process invalidates the copy another process would serve; the
+# file-based backend does that on a single host. It unpickles what it reads,
+# so keep it in a directory only the app can write to: inside the project by
+# default, never a shared temp directory.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'dashboard': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('DASHBOARD_CACHE_LOCATION', str(BASE_DIR / 'cache' / 'dashboard')),
+        # Backstop for changes made outside the circulation code paths (admin edits)
+        'TIMEOUT': 300,
+    },
 }
 
+# Unfiltered list endpoints switch from COUNT(*) to the table's row estimate
+# above this size; exact counts are cached for PAGINATION_COUNT_CACHE_TTL seconds.
+PAGINATION_ESTIMATE_THRESHOLD = 10000
+PAGINATION_COUNT_CACHE_TTL = 30
+
+# Largest batch accepted by POST /api/books/lookup/.
+BOOK_LOOKUP_MAX_ISBNS = 5000
+
+# Largest list accepted by the bulk book create, update and upsert endpoints.
+BOOK_BULK_MAX_ROWS = 1000
+
+# POST /api/batch/: most GETs per batch, and the time after which sub-requests
+# not yet started are answered with 504 instead of run.
+BATCH_MAX_REQUESTS = 20
+BATCH_TIME_BUDGET_MS = 5000
+
+# How often each worker checks whether another worker changed the catalogue
+# behind its in-memory autocomplete index.
+AUTOCOMPLETE_VERSION_CHECK_SECONDS = 1.0
+
+# Responses to requests sent with an Idempotency-Key header are kept this many
+# seconds; a retry that races the original waits up to IDEMPOTENCY_WAIT_TIMEOUT.
+# A key still unanswered after IDEMPOTENCY_PROCESSING_TIMEOUT seconds belongs
+# to a crashed request and is handed to the next retry.
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+IDEMPOTENCY_WAIT_TIMEOUT = 5
+IDEMPOTENCY_PROCESSING_TIMEOUT = 60
+
+# The change feed holds back outbox events younger than this many seconds.
+# SQLite commits writers one at a time, so ids already appear in commit order;
+# on databases with concurrent writers set it above the longest write transaction.
+OUTBOX_VISIBILITY_DELAY = 0
+
+# Background jobs (python manage.py run_workers): failed attempts are retried
+# after JOB_RETRY_BASE_DELAY * 2**n seconds (capped), and a job held by a
+# worker for longer than JOB_LOCK_TIMEOUT seconds is assumed abandoned.
+JOB_RETRY_BASE_DELAY = 5
+JOB_RETRY_MAX_DELAY = 3600
+JOB_LOCK_TIMEOUT = 600
+
+# Messages per second sent by send_reminders over its SMTP connection.
+REMINDER_RATE_LIMIT = 5
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -98,6 +181,48 @@ DATABASES = {
     }
 }
 
+# Branch code -> database alias holding that branch's holdings and loans.
+# LIBRARY_BRANCHES=north,south gives each branch its own SQLite shard
+# (branch_north.sqlite3, ...); "north:default" keeps a branch in the main
+# database. The catalogue always stays on "default". Migrate each shard with
+# `python manage.py migrate --database branch_<code>`.
+LIBRARY_BRANCHES = {}
+for entry in filter(None, os.environ.get('LIBRARY_BRANCHES', '').split(',')):
+    code, _, alias = entry.strip().partition(':')
+    alias = alias or f'branch_{code}'
+    DATABASES.setdefault(alias, {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / f"{alias}.sqlite3",
+    })
+    LIBRARY_BRANCHES[code] = alias
+
+DATABASE_ROUTERS = ['library.routers.BranchRouter']
+
+# Opt-in SQLite profile for serving concurrent writers (SQLITE_PRODUCTION=1):
+# WAL so readers never block the writer, a 5s busy timeout, synchronous=NORMAL
+# (no corruption on crash, the last commits may roll back on power loss), a
+# 256MB memory map, and BEGIN IMMEDIATE so a transaction takes the write lock
+# up front instead of failing with "database is locked" when it upgrades from
+# a read. Applied to every SQLite database, branch shards included.
+SQLITE_PRODUCTION = os.environ.get('SQLITE_PRODUCTION', '').lower() in ('1', 'true', 'yes')
+SQLITE_PRODUCTION_OPTIONS = {
+    "init_command": (
+        "PRAGMA journal_mode=WAL; PRAGMA busy_timeout=5000; "
+        "PRAGMA synchronous=NORMAL; PRAGMA mmap_size=268435456"
+    ),
+    "transaction_mode": "IMMEDIATE",
+}
+if SQLITE_PRODUCTION:
+    for database in DATABASES.values():
+        if database["ENGINE"] == "django.db.backends.sqlite3":
+            database.setdefault("OPTIONS", {}).update(SQLITE_PRODUCTION_OPTIONS)
+
+# Circulation writes that still find the database locked are retried this
+# many times in all, sleeping a random 0..min(base * 2**n, max) seconds between.
+DB_LOCK_RETRY_ATTEMPTS = 5
+DB_LOCK_RETRY_BASE_DELAY = 0.05
+DB_LOCK_RETRY_MAX_DELAY = 1.0
+
 
 
 # Password validation
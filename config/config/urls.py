@@ -14,18 +14,22 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
+from api.throttling import LOGIN_THROTTLES
 
 urlpatterns = [
-    path('auth/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('auth/', TokenObtainPairView.as_view(throttle_classes=LOGIN_THROTTLES), name='token_obtain_pair'),
     path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
-    path('api-auth/', include("rest_framework.urls", namespace="login")),
     path('admin/', admin.site.urls),
     path('accounts/', include('accounts.urls')),
     path('api/', include('api.urls')),
 ]
+
+if settings.BROWSABLE_API:
+    urlpatterns.append(path('api-auth/', include("rest_framework.urls", namespace="login")))
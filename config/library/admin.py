@@ -1,5 +1,10 @@
 from django.contrib import admin
-from .models import Book, Transaction
+from django.utils import timezone
+from . import tasks
+from .models import ArchivedTransaction, Author, Book, BookCopy, Job, OutboxConsumer, PenaltyPayment, Transaction
+
+# Admin bulk actions on more rows than this are queued as background jobs
+ADMIN_INLINE_LIMIT = 1000
 
 # Inline Configuration for Transactions
 class TransactionInline(admin.TabularInline):
@@ -10,6 +15,15 @@ class TransactionInline(admin.TabularInline):
     model = Transaction
     extra = 0  # Number of empty transaction forms to display (0 means no extra empty forms)
 
+@admin.register(Author)
+class AuthorAdmin(admin.ModelAdmin):
+    """
+    Admin interface for normalised authors.
+    """
+    list_display = ('name', 'name_key')
+    search_fields = ('name', 'name_key')
+    readonly_fields = ('name_key',)
+
 @admin.register(Book)
 class BookAdmin(admin.ModelAdmin):
     """
@@ -53,12 +67,93 @@ class TransactionAdmin(admin.ModelAdmin):
     list_filter = ['penalty_paid', 'transaction_type']
     search_fields = ['user__username', 'book__title']
     
-    readonly_fields = ['penalty_amount', 'penalty_paid']
+    readonly_fields = ['penalty_amount', 'penalty_paid', 'payment']
     
     actions = ['mark_penalties_paid']
     
     def mark_penalties_paid(self, request, queryset):
-        updated = queryset.filter(penalty_amount__gt=0).update(penalty_paid=True)
-        self.message_user(request, f'{updated} penalties marked as paid.')
+        ids = list(queryset.filter(penalty_amount__gt=0, penalty_paid=False).values_list('pk', flat=True))
+        if len(ids) <= ADMIN_INLINE_LIMIT:
+            tasks.mark_penalties_paid(ids)
+            self.message_user(request, f'{len(ids)} penalties marked as paid.')
+            return
+        # Large selections are handed to the background workers in chunks.
+        for start in range(0, len(ids), ADMIN_INLINE_LIMIT):
+            tasks.mark_penalties_paid.enqueue(ids[start:start + ADMIN_INLINE_LIMIT])
+        self.message_user(request, f'{len(ids)} penalties queued to be marked as paid by the job workers.')
     mark_penalties_paid.short_description = "Mark selected penalties as paid"
 
+
+
+@admin.register(ArchivedTransaction)
+class ArchivedTransactionAdmin(admin.ModelAdmin):
+    """
+    Read-only view of loans moved out of the live table by archive_transactions.
+    """
+    list_display = [
+        'user', 'book', 'checkout_date', 'due_date',
+        'return_date', 'penalty_amount', 'penalty_paid', 'archived_at'
+    ]
+    search_fields = ['user__username', 'book__title']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PenaltyPayment)
+class PenaltyPaymentAdmin(admin.ModelAdmin):
+    """
+    Read-only record of penalty payments and the loans each one settled.
+    """
+    list_display = ['user', 'amount', 'loan_count', 'payment_method', 'paid_at']
+    list_filter = ['payment_method']
+    search_fields = ['user__username', 'user__email']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(OutboxConsumer)
+class OutboxConsumerAdmin(admin.ModelAdmin):
+    """
+    Change feed consumers and their acknowledged positions. Delete a retired
+    consumer here so it no longer holds back outbox compaction.
+    """
+    list_display = ['name', 'position', 'updated_at']
+    readonly_fields = ['position', 'updated_at']
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """
+    Background jobs with their status, attempts and timings.
+    """
+    list_display = ['id', 'name', 'status', 'attempts', 'run_at', 'wait_ms', 'duration_ms']
+    list_filter = ['status', 'name']
+    readonly_fields = [
+        'locked_by', 'locked_at', 'started_at', 'finished_at', 'wait_ms', 'duration_ms', 'last_error', 'created_at'
+    ]
+    actions = ['retry_now']
+
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status=Job.Status.RUNNING).update(
+            status=Job.Status.QUEUED, run_at=timezone.now(), attempts=0
+        )
+        self.message_user(request, f'{updated} jobs queued to run again.')
+    retry_now.short_description = "Run selected jobs again"
+
+
+@admin.register(BookCopy)
+class BookCopyAdmin(admin.ModelAdmin):
+    """
+    Physical copies and their barcodes.
+    """
+    list_display = ['barcode', 'book', 'added_at']
+    search_fields = ['barcode', 'book__title']
+    raw_id_fields = ['book']
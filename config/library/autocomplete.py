@@ -0,0 +1,152 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+from .models import Book, IndexVersion
+from .text import fold
+
+INDEX_NAME = 'book_autocomplete'
+
+_SPACE = re.compile(' ')
+
+
+def word_starts(text):
+    """
+    The folded ``text`` and each of its suffixes that starts a word, so a
+    prefix matches the start of any word: "Lord of the Rings" is found by
+    "lor", "the r" and "rin".
+    """
+    key = fold(text)
+    if not key:
+        return []
+    # fold() leaves single spaces between words.
+    return [key] + [key[match.end():] for match in _SPACE.finditer(key)]
+
+
+class PrefixIndex:
+    """
+    Book titles and authors, accent-folded, in one sorted list searched
+    with ``bisect``.
+
+    ``keys`` holds every word-start suffix of each book's title and author,
+    with the book in ``ids`` at the same position and a flag in ``starts``
+    for suffixes that are the whole title or author. A lookup bisects to the
+    first key at or above the prefix and walks forward while keys still
+    start with it.
+    """
+
+    def __init__(self, books, version=0):
+        """
+        Args:
+            books: ``(id, title, author)`` rows
+            version: The ``IndexVersion`` the rows were read at
+        """
+        self.version = version
+        self.books = {}
+        keys, ids, starts = [], [], bytearray()
+        for book_id, title, author in books:
+            self.books[book_id] = (title, author)
+            for text in (title, author):
+                suffixes = word_starts(text)
+                keys += suffixes
+                ids += [book_id] * len(suffixes)
+                starts += bytes([1] + [0] * (len(suffixes) - 1)) if suffixes else b''
+        # Sorting positions by key compares strings only, not tuples.
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.keys = [keys[position] for position in order]
+        self.ids = [ids[position] for position in order]
+        self.starts = bytearray(starts[position] for position in order)
+
+    def __len__(self):
+        return len(self.books)
+
+    def search(self, query, limit=10):
+        """
+        Books with a title or author word starting with ``query``.
+
+        Returns:
+            list: up to ``limit`` ``(id, title, author)`` tuples, books whose
+            title or author starts with the query first, then in key order
+        """
+        prefix = fold(query)
+        if not prefix or limit < 1:
+            return []
+        # Dicts as insertion-ordered sets.
+        leading, inner = {}, {}
+        position = bisect_left(self.keys, prefix)
+        while position < len(self.keys) and self.keys[position].startswith(prefix):
+            book_id = self.ids[position]
+            if self.starts[position]:
+                if book_id not in leading:
+                    leading[book_id] = None
+                    inner.pop(book_id, None)
+                    if len(leading) == limit:
+                        break
+            elif book_id not in leading:
+                inner.setdefault(book_id)
+            position += 1
+        return [(book_id, *self.books[book_id]) for book_id in [*leading, *inner][:limit]]
+
+
+class AutocompleteIndex:
+    """
+    This worker's ``PrefixIndex``, built on first use and rebuilt when the
+    catalogue's ``IndexVersion`` moves.
+
+    Book saves, deletes and bulk saves bump the version (see
+    ``library.receivers``), so a change made by any worker reaches every
+    other one within ``AUTOCOMPLETE_VERSION_CHECK_SECONDS``; the worker
+    that made it rebuilds on its next lookup. Between checks a lookup
+    costs no queries at all, and while one request rebuilds, concurrent
+    lookups are answered from the previous index instead of waiting.
+    """
+
+    def __init__(self):
+        self.index = None
+        self.checked_at = 0
+        self.stale = False
+        self.lock = threading.Lock()
+
+    def get(self):
+        index = self.index
+        interval = getattr(settings, 'AUTOCOMPLETE_VERSION_CHECK_SECONDS', 1.0)
+        if index is not None and not self.stale and time.monotonic() - self.checked_at < interval:
+            return index
+        # One thread checks and rebuilds; the others keep answering from the
+        # index they have until it is swapped. Only the first build waits.
+        if not self.lock.acquire(blocking=index is None):
+            return index
+        try:
+            if self.index is not None and index is None:
+                # Built by the thread we waited for.
+                return self.index
+            self.stale = False
+            version = IndexVersion.objects.current(INDEX_NAME)
+            if self.index is None or self.index.version != version:
+                self.index = self.build(version)
+            self.checked_at = time.monotonic()
+            return self.index
+        finally:
+            self.lock.release()
+
+    @staticmethod
+    def build(version):
+        return PrefixIndex(Book.objects.order_by().values_list('id', 'title', 'author').iterator(), version)
+
+    def invalidate(self):
+        """Check the version on the next lookup instead of waiting out the interval."""
+        self.stale = True
+
+    def reset(self):
+        with self.lock:
+            self.index = None
+            self.stale = False
+
+    def search(self, query, limit=10):
+        return self.get().search(query, limit)
+
+
+index = AutocompleteIndex()
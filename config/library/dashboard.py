@@ -0,0 +1,77 @@
+from decimal import Decimal
+from uuid import uuid4
+
+from django.core.cache import caches
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import BranchLoan, Transaction
+
+CACHE_ALIAS = 'dashboard'
+
+
+def cache_key(user_id, today=None):
+    # The date is part of the key: overdue figures change at midnight even
+    # without a circulation event.
+    return f'dashboard:{user_id}:{today or timezone.now().date()}'
+
+
+def generation_key(user_id):
+    return f'dashboard:{user_id}:generation'
+
+
+def get_cached(user_id):
+    return caches[CACHE_ALIAS].get(cache_key(user_id))
+
+
+def generation(user_id):
+    """The patron's invalidation token; read it before building a dashboard to cache."""
+    return caches[CACHE_ALIAS].get(generation_key(user_id))
+
+
+def set_cached(user_id, data, built_at_generation):
+    """
+    Cache ``data`` unless the patron's dashboard was invalidated since
+    ``built_at_generation`` was read, which would make it stale already.
+    """
+    if generation(user_id) == built_at_generation:
+        caches[CACHE_ALIAS].set(cache_key(user_id), data)
+
+
+def invalidate(*user_ids):
+    """Drop the cached dashboards of ``user_ids`` and start new generations for them."""
+    cache = caches[CACHE_ALIAS]
+    today = timezone.now().date()
+    user_ids = set(user_ids)
+    # A fresh token rather than a counter, so an evicted key can never
+    # come back equal to a value a request read before the invalidation.
+    cache.set_many({generation_key(user_id): uuid4().hex for user_id in user_ids}, timeout=None)
+    cache.delete_many([cache_key(user_id, today) for user_id in user_ids])
+
+
+def active_loans(user, today=None):
+    """The patron's open loans with their overdue days and accrued penalty, soonest due first."""
+    return list(
+        Transaction.objects.filter(user=user, return_date__isnull=True)
+        .with_overdue(today)
+        .select_related('book')
+        .order_by('due_date', 'id')
+    )
+
+
+def penalty_totals(user):
+    """
+    Assessed unpaid penalties of the patron: ``{'unpaid_total', 'unpaid_count',
+    'branch_unpaid_total'}``. Branch loans are only queried for patrons who
+    have borrowed from a branch.
+    """
+    unpaid = Q(penalty_paid=False, penalty_amount__gt=0)
+    totals = Transaction.objects.filter(user=user).aggregate(
+        unpaid_total=Sum('penalty_amount', filter=unpaid),
+        unpaid_count=Count('id', filter=unpaid),
+    )
+    totals['unpaid_total'] = totals['unpaid_total'] or 0
+    totals['branch_unpaid_total'] = (
+        BranchLoan.objects.unpaid_total(user.pk) if user.has_branch_loans else Decimal('0.00')
+    )
+    return totals
@@ -0,0 +1,33 @@
+from django.db import models
+
+
+class DaysBetween(models.Func):
+    """
+    Whole days from ``start`` to ``end`` (``end - start``) for two date
+    expressions, computed by the database.
+    """
+    output_field = models.IntegerField()
+    arity = 2
+
+    def __init__(self, end, start, **extra):
+        super().__init__(end, start, **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template='CAST(julianday(%(expressions)s) AS INTEGER)',
+            arg_joiner=') - julianday(',
+            **extra_context,
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function='DATEDIFF', **extra_context)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        # date - date is already an integer number of days.
+        return self.as_sql(compiler, connection, template='(%(expressions)s)', arg_joiner=' - ', **extra_context)
+
+    def as_oracle(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, template='(TRUNC(%(expressions)s))', arg_joiner=') - TRUNC(', **extra_context
+        )
@@ -0,0 +1,71 @@
+import re
+
+_SEPARATORS = re.compile(r'[\s-]')
+
+
+def _isbn10_check_digit(digits):
+    total = sum((10 - i) * int(d) for i, d in enumerate(digits[:9]))
+    check = (11 - total % 11) % 11
+    return 'X' if check == 10 else str(check)
+
+
+def _isbn13_check_digit(digits):
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits[:12]))
+    return str((10 - total % 10) % 10)
+
+
+def normalize(value):
+    """
+    Return the ISBN-13 form of an ISBN-10 or ISBN-13, validating its check digit.
+
+    Hyphens and spaces are ignored, so "0-306-40615-2" and "978 0 306 40615 7"
+    both normalise to "9780306406157".
+
+    Raises:
+        ValueError: If the value is not a well-formed ISBN or its check digit is wrong
+    """
+    if not isinstance(value, str):
+        raise ValueError("ISBN must be a string")
+    compact = _SEPARATORS.sub('', value).upper()
+
+    if len(compact) == 10:
+        if not (compact[:9].isdigit() and (compact[9].isdigit() or compact[9] == 'X')):
+            raise ValueError("ISBN-10 must be 9 digits followed by a digit or X")
+        if _isbn10_check_digit(compact) != compact[9]:
+            raise ValueError("invalid ISBN-10 check digit")
+        prefixed = '978' + compact[:9]
+        return prefixed + _isbn13_check_digit(prefixed)
+
+    if len(compact) == 13:
+        if not compact.isdigit():
+            raise ValueError("ISBN-13 must be 13 digits")
+        if _isbn13_check_digit(compact) != compact[12]:
+            raise ValueError("invalid ISBN-13 check digit")
+        return compact
+
+    raise ValueError("ISBN must have 10 or 13 digits")
+
+
+def catalogue_key(value):
+    """
+    Return the value to match against ``Book.isbn`` for a searched ISBN.
+
+    That is the normalised ISBN-13 when ``value`` is a valid ISBN. The
+    catalogue has never checked check digits, so a 13-character value that
+    fails validation falls back to itself with separators removed, and books
+    stored with such an ISBN can still be found.
+
+    Returns:
+        tuple: ``(key, error)``; ``error`` is the ValueError from
+        ``normalize()`` when the key is a fallback, else None
+
+    Raises:
+        ValueError: If the value is neither a valid ISBN nor 13 characters long
+    """
+    try:
+        return normalize(value), None
+    except ValueError as e:
+        compact = _SEPARATORS.sub('', value) if isinstance(value, str) else ''
+        if len(compact) != 13:
+            raise
+        return compact, e
@@ -0,0 +1,177 @@
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import OperationalError, close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .models import Job
+from .retry import is_locked_error, retry_on_locked
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+def job(func=None, *, name=None, max_attempts=None):
+    """
+    Register ``func`` as a background job and give it an ``enqueue()`` method:
+
+        @job
+        def recompute_penalties(): ...
+
+        recompute_penalties.enqueue()
+
+    Arguments passed to ``enqueue()`` are stored as JSON, so keep them to
+    ids, strings and numbers.
+    """
+    def register(func):
+        job_name = name or f'{func.__module__}.{func.__name__}'
+        registry[job_name] = func
+
+        def enqueue(*args, run_at=None, **kwargs):
+            return Job.objects.enqueue(job_name, *args, run_at=run_at, max_attempts=max_attempts, **kwargs)
+
+        func.job_name = job_name
+        func.enqueue = enqueue
+        return func
+
+    return register(func) if func is not None else register
+
+
+def backoff(attempts):
+    """Seconds to wait before retry number ``attempts``: exponential with jitter, capped."""
+    base = getattr(settings, 'JOB_RETRY_BASE_DELAY', 5)
+    cap = getattr(settings, 'JOB_RETRY_MAX_DELAY', 3600)
+    delay = min(base * 2 ** (attempts - 1), cap)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def claim(worker_id):
+    """
+    Claim the oldest runnable job for ``worker_id`` and return it, or None.
+
+    Uses ``SELECT ... FOR UPDATE SKIP LOCKED`` where the database supports it,
+    so concurrent workers never wait on each other's rows. Elsewhere (SQLite)
+    the claim is a compare-and-set UPDATE on the row's status and lock time,
+    which succeeds for exactly one worker.
+    """
+    now = timezone.now()
+    lock_timeout = timedelta(seconds=getattr(settings, 'JOB_LOCK_TIMEOUT', 600))
+    runnable = Job.objects.runnable(now, lock_timeout)
+    claimed = {'status': Job.Status.RUNNING, 'locked_by': worker_id, 'locked_at': now, 'started_at': now}
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = runnable.select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            Job.objects.filter(pk=job.pk).update(**claimed)
+    else:
+        for job in runnable[:10]:
+            if Job.objects.filter(
+                pk=job.pk, status=job.status, locked_at=job.locked_at
+            ).update(**claimed):
+                break
+        else:
+            return None
+
+    for field, value in claimed.items():
+        setattr(job, field, value)
+    return job
+
+
+def run_job(job):
+    """Execute a claimed job and record its outcome, timing and any retry."""
+    func = registry.get(job.name)
+    started = time.monotonic()
+    error = None
+    try:
+        if func is None:
+            raise LookupError(f'No job registered as {job.name!r}')
+        func(*job.args, **job.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+
+    finished = timezone.now()
+    outcome = {
+        'attempts': job.attempts + 1,
+        'finished_at': finished,
+        'duration_ms': int((time.monotonic() - started) * 1000),
+        'wait_ms': max(int((job.started_at - job.run_at).total_seconds() * 1000), 0),
+        'locked_by': '',
+        'locked_at': None,
+        'last_error': error or '',
+    }
+    if error is None:
+        outcome['status'] = Job.Status.SUCCEEDED
+    elif outcome['attempts'] < job.max_attempts:
+        outcome['status'] = Job.Status.QUEUED
+        outcome['run_at'] = finished + timedelta(seconds=backoff(outcome['attempts']))
+    else:
+        outcome['status'] = Job.Status.FAILED
+    for field, value in outcome.items():
+        setattr(job, field, value)
+    # The job has run; retry only the bookkeeping if the database is busy,
+    # so the job is not left RUNNING until JOB_LOCK_TIMEOUT.
+    record_outcome(job.pk, outcome)
+
+    if error is None:
+        logger.info('Job %s %s succeeded in %dms', job.pk, job.name, job.duration_ms)
+    else:
+        logger.warning('Job %s %s failed (attempt %d/%d):\n%s',
+                       job.pk, job.name, job.attempts, job.max_attempts, error)
+    return job
+
+
+@retry_on_locked
+def record_outcome(job_id, outcome):
+    Job.objects.filter(pk=job_id).update(**outcome)
+
+
+class Worker:
+    """
+    Claims and runs jobs until ``stop`` is set. With ``drain`` it returns as
+    soon as no job is runnable instead of polling.
+    """
+
+    def __init__(self, name=None, poll_interval=1.0, drain=False, stop=None):
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+        self.poll_interval = poll_interval
+        self.drain = drain
+        self.stop = stop or threading.Event()
+        self.processed = 0
+
+    def run(self):
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                try:
+                    job = claim(self.name)
+                    if job is None:
+                        if self.drain:
+                            break
+                        self.stop.wait(self.poll_interval)
+                        continue
+                    run_job(job)
+                except OperationalError as e:
+                    if not is_locked_error(e):
+                        raise
+                    # Another writer holds the database; back off and try
+                    # again rather than letting the thread die. A job whose
+                    # result still could not be saved is reclaimed after
+                    # JOB_LOCK_TIMEOUT.
+                    logger.warning('Worker %s: %s; retrying', self.name, e)
+                    self.stop.wait(random.uniform(0, self.poll_interval))
+                    continue
+                self.processed += 1
+        finally:
+            # Each worker thread has its own connection; don't leak it.
+            connection.close()
+        return self.processed
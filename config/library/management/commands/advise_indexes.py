@@ -0,0 +1,302 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+from contextlib import ExitStack
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, migrations, models
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.writer import MigrationWriter
+from django.test.runner import DiscoverRunner
+from library.query_plans import FULL_SCAN, TEMP_SORT, explain, plan_issues
+
+TARGET_APPS = ('library', 'accounts')
+
+_COLUMN = r'(?:"(?P<table>\w+)"|(?P<alias>T\d+))\."(?P<column>\w+)"'
+_PREDICATE = re.compile(_COLUMN + r'\s*(?P<op>=|IN\b|IS\b|<=|>=|<|>|BETWEEN\b|LIKE\b)')
+_ORDER_TERM = re.compile(_COLUMN + r'(?:\s+(?P<dir>ASC|DESC))?')
+_ALIAS = re.compile(r'"(\w+)" (T\d+)\b')
+
+
+class WorkloadRecorder:
+    """Execute wrapper that counts every distinct statement shape it sees."""
+
+    def __init__(self):
+        self.shapes = Counter()
+        self.params = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        statement = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ''
+        if not many and statement in ('SELECT', 'UPDATE', 'DELETE') and 'sqlite_master' not in sql:
+            self.shapes[sql] += 1
+            self.params.setdefault(sql, list(params or ()))
+        return execute(sql, params, many, context)
+
+
+class WorkloadTestRunner(DiscoverRunner):
+    """Test runner that records the suite's SQL and analyses it before the test databases go away."""
+
+    def __init__(self, recorder, on_teardown, **kwargs):
+        super().__init__(**kwargs)
+        self.recorder = recorder
+        self.on_teardown = on_teardown
+
+    def run_suite(self, suite, **kwargs):
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(self.recorder))
+            return super().run_suite(suite, **kwargs)
+
+    def teardown_databases(self, old_config, **kwargs):
+        self.on_teardown()
+        super().teardown_databases(old_config, **kwargs)
+
+
+class Command(BaseCommand):
+    help = (
+        'Capture the SQL issued by the test suite (or replay a recorded workload), '
+        'explain each distinct query shape and write a migration with candidate '
+        'indexes for the library and accounts apps.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'test_labels', nargs='*', default=list(TARGET_APPS),
+            help='Test labels to run while capturing SQL (default: library accounts)',
+        )
+        parser.add_argument(
+            '--workload',
+            help='JSON lines file of {"sql": ..., "params": [...], "count": n} to explain instead of running tests',
+        )
+        parser.add_argument('--save-workload', help='Write the captured workload to this JSON lines file')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to explain against')
+        parser.add_argument(
+            '--assume-rows', type=int,
+            help='Minimum table size for benefit estimates (default: 100000 when running tests, '
+                 'whose databases are nearly empty; the real row count for --workload)',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Print the migrations instead of writing them')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.findings = []
+
+        if options['assume_rows'] is None:
+            options['assume_rows'] = 0 if options['workload'] else 100000
+
+        if options['workload']:
+            recorder = self.load_workload(options['workload'])
+            self.analyse(recorder)
+        else:
+            recorder = WorkloadRecorder()
+            runner = WorkloadTestRunner(
+                recorder,
+                on_teardown=lambda: self.analyse(recorder),
+                verbosity=max(options['verbosity'] - 1, 0),
+                interactive=False,
+            )
+            runner.run_tests(options['test_labels'])
+
+        if options['save_workload']:
+            with open(options['save_workload'], 'w') as f:
+                for sql, count in recorder.shapes.most_common():
+                    f.write(json.dumps({'sql': sql, 'params': recorder.params[sql], 'count': count}, default=str))
+                    f.write('\n')
+
+        self.report()
+        self.write_migrations()
+
+    def load_workload(self, path):
+        recorder = WorkloadRecorder()
+        try:
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        recorder.shapes[entry['sql']] += entry.get('count', 1)
+                        recorder.params.setdefault(entry['sql'], entry.get('params', []))
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f'Could not read workload {path}: {e}')
+        return recorder
+
+    def analyse(self, recorder):
+        """Explain every captured shape and collect candidate indexes."""
+        connection = connections[self.options['database']]
+        tables = {model._meta.db_table: model for model in apps.get_models()}
+        candidates = {}
+
+        for sql, executions in recorder.shapes.items():
+            try:
+                plan = explain(sql, recorder.params[sql], using=self.options['database'])
+            except DatabaseError:
+                continue
+            issues = plan_issues(plan, connection.vendor)
+            if not issues:
+                continue
+
+            where_columns, order_columns = self.parse_columns(sql)
+            for kind, table in issues:
+                table = self.resolve_alias(sql, table) or (order_columns[0][0] if order_columns else None)
+                model = tables.get(table)
+                if model is None or model._meta.app_label not in TARGET_APPS:
+                    continue
+                if any(
+                    owner == table and column == model._meta.pk.column
+                    for owner, column, _ in where_columns
+                ):
+                    # Primary key lookups only ever sort a handful of rows.
+                    continue
+                columns = self.candidate_columns(table, kind, where_columns, order_columns)
+                if not columns or self.has_index(connection, table, columns):
+                    continue
+                key = (table, tuple(columns))
+                finding = candidates.setdefault(key, {
+                    'model': model,
+                    'table': table,
+                    'columns': columns,
+                    'kinds': set(),
+                    'executions': 0,
+                    'example': sql,
+                    'plan': plan,
+                })
+                finding['kinds'].add(kind)
+                finding['executions'] += executions
+
+        # An index on (a, b) also serves queries that only need (a).
+        for key, finding in list(candidates.items()):
+            table, columns = key
+            wider = [
+                other for other_key, other in candidates.items()
+                if other_key[0] == table and len(other_key[1]) > len(columns)
+                and other_key[1][:len(columns)] == columns
+            ]
+            if wider:
+                wider[0]['kinds'] |= finding['kinds']
+                wider[0]['executions'] += finding['executions']
+                del candidates[key]
+
+        for finding in candidates.values():
+            rows = max(self.table_rows(connection, finding['table']), self.options['assume_rows'], 2)
+            saved = 0
+            if FULL_SCAN in finding['kinds']:
+                saved += rows - math.log2(rows)
+            if TEMP_SORT in finding['kinds']:
+                saved += rows * math.log2(rows)
+            finding['rows'] = rows
+            finding['benefit'] = int(saved * finding['executions'])
+        self.findings = sorted(candidates.values(), key=lambda f: f['benefit'], reverse=True)
+
+    @staticmethod
+    def parse_columns(sql):
+        """Return ``(where, order)`` lists of ``(table_or_alias, column, op_or_dir)``."""
+        upper = sql.upper()
+        where_at = upper.find(' WHERE ')
+        order_at = upper.rfind(' ORDER BY ')
+        limit_at = upper.rfind(' LIMIT ')
+        where_end = min(pos for pos in (order_at, limit_at, len(sql)) if pos > where_at) if where_at >= 0 else 0
+        where = sql[where_at:where_end] if where_at >= 0 else ''
+        order = sql[order_at:limit_at if limit_at > order_at else len(sql)] if order_at >= 0 else ''
+
+        where_columns = [
+            (m.group('table') or m.group('alias'), m.group('column'), m.group('op').upper())
+            for m in _PREDICATE.finditer(where)
+        ]
+        order_columns = [
+            (m.group('table') or m.group('alias'), m.group('column'), (m.group('dir') or 'ASC').upper())
+            for m in _ORDER_TERM.finditer(order)
+        ]
+        return where_columns, order_columns
+
+    @staticmethod
+    def resolve_alias(sql, name):
+        if name is None:
+            return None
+        aliases = {alias: table for table, alias in _ALIAS.findall(sql)}
+        return aliases.get(name, name)
+
+    def candidate_columns(self, table, kind, where_columns, order_columns):
+        """
+        Equality columns first, then the sort columns (to drop a temp sort)
+        or else the first range column.
+        """
+        columns = []
+        ranges = []
+        for owner, column, op in where_columns:
+            if owner != table:
+                continue
+            if op in ('=', 'IN', 'IS'):
+                if column not in columns:
+                    columns.append(column)
+            elif column not in ranges:
+                ranges.append(column)
+        ranges = [column for column in ranges if column not in columns]
+
+        order = [column for owner, column, _ in order_columns if owner == table]
+        if order and (kind == TEMP_SORT or not ranges):
+            columns += [column for column in order if column not in columns]
+        elif ranges:
+            columns.append(ranges[0])
+        return columns
+
+    @staticmethod
+    def has_index(connection, table, columns):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, table)
+        return any(
+            (info.get('index') or info.get('unique') or info.get('primary_key'))
+            and info['columns'][:len(columns)] == columns
+            for info in constraints.values()
+        )
+
+    @staticmethod
+    def table_rows(connection, table):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+            return cursor.fetchone()[0]
+
+    def report(self):
+        if not self.findings:
+            self.stdout.write(self.style.SUCCESS('No full scans or temp sorts on library/accounts tables.'))
+            return
+        for finding in self.findings:
+            self.stdout.write(self.style.WARNING(
+                f"{finding['table']} ({', '.join(finding['columns'])}): "
+                f"{' + '.join(sorted(finding['kinds']))}, {finding['executions']} executions, "
+                f"est. {finding['benefit']:,} row operations saved at {finding['rows']:,} rows"
+            ))
+            self.stdout.write(f"  query: {finding['example'][:200]}")
+            for line in finding['plan']:
+                self.stdout.write(f"  plan:  {line}")
+
+    def write_migrations(self):
+        by_app = {}
+        for finding in self.findings:
+            model = finding['model']
+            columns = {field.column: field.name for field in model._meta.concrete_fields}
+            index = models.Index(fields=[columns[column] for column in finding['columns']], name='')
+            index.set_name_with_model(model)
+            by_app.setdefault(model._meta.app_label, []).append(
+                migrations.AddIndex(model_name=model._meta.model_name, index=index)
+            )
+
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        for app_label, operations in by_app.items():
+            leaf = max(loader.graph.leaf_nodes(app_label))
+            number = int(leaf[1].split('_', 1)[0]) + 1
+            migration = migrations.Migration(f'{number:04d}_advised_indexes', app_label)
+            migration.dependencies = [leaf]
+            migration.operations = operations
+            writer = MigrationWriter(migration)
+
+            if self.options['dry_run']:
+                self.stdout.write(self.style.MIGRATE_HEADING(f'-- {writer.path}'))
+                self.stdout.write(writer.as_string())
+                continue
+            if os.path.exists(writer.path):
+                raise CommandError(f'{writer.path} already exists')
+            with open(writer.path, 'w') as f:
+                f.write(writer.as_string())
+            self.stdout.write(self.style.SUCCESS(f'Wrote {writer.path} for review'))
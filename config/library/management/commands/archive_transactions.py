@@ -0,0 +1,60 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from library.models import ArchivedTransaction, Transaction
+
+
+class Command(BaseCommand):
+    help = (
+        'Move closed transactions (returned, penalty paid or zero) older than a cutoff '
+        'into the archive table in throttled batches. Safe to interrupt and re-run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='Archive loans returned more than this many days ago (default: 365)',
+        )
+        parser.add_argument('--before', help='Archive loans returned before this date (YYYY-MM-DD); overrides --days')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows moved per transaction (default: 1000)')
+        parser.add_argument('--sleep', type=float, default=0.1, help='Seconds to pause between batches (default: 0.1)')
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches')
+
+    def handle(self, *args, **options):
+        if options['before']:
+            try:
+                cutoff = date.fromisoformat(options['before'])
+            except ValueError as e:
+                raise CommandError(str(e))
+        else:
+            cutoff = timezone.localdate() - timedelta(days=options['days'])
+
+        closed = ArchivedTransaction.closed_transactions(cutoff).order_by('pk')
+        moved = batches = 0
+        while options['max_batches'] is None or batches < options['max_batches']:
+            # Each batch commits on its own, so an interrupted run simply
+            # resumes with the rows that are still in the live table.
+            with transaction.atomic():
+                rows = list(
+                    closed.values_list(*ArchivedTransaction.COPIED_FIELDS)[:options['batch_size']]
+                )
+                if not rows:
+                    break
+                ArchivedTransaction.objects.bulk_create(
+                    [ArchivedTransaction(**dict(zip(ArchivedTransaction.COPIED_FIELDS, row))) for row in rows],
+                    ignore_conflicts=True,
+                )
+                Transaction.objects.filter(pk__in=[row[0] for row in rows]).delete()
+
+            moved += len(rows)
+            batches += 1
+            self.stdout.write(f'Archived {moved} transactions')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {moved} transactions returned before {cutoff} in {batches} batches'
+        ))
@@ -0,0 +1,210 @@
+import contextlib
+import io
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import date
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Count
+from library.models import Book, Transaction, User
+
+PROFILES = {
+    'default': ({}, 1),
+    'production': (settings.SQLITE_PRODUCTION_OPTIONS, None),
+}
+
+
+def use_database(path, options):
+    """Point this process's default connection at ``path`` with ``options``."""
+    connections.close_all()
+    connection = connections[DEFAULT_DB_ALIAS]
+    connection.settings_dict['NAME'] = path
+    connection.settings_dict['OPTIONS'] = dict(options)
+
+
+def migrate(path):
+    use_database(path, {})
+    call_command('migrate', verbosity=0, interactive=False)
+    connections.close_all()
+
+
+def seed(path, books, workers):
+    use_database(path, {})
+    Book.objects.bulk_save([
+        Book(
+            title=f'Benchmark {n}', author='Benchmark', isbn=f'{9799990000000 + n}',
+            publish_date=date(2000, 1, 1), genre='Benchmark', total_copies=10 ** 6, available_copies=10 ** 6,
+        )
+        for n in range(books)
+    ])
+    User.objects.bulk_create(
+        User(email=f'bench{n}@example.com', username=f'bench{n}') for n in range(workers)
+    )
+    connections.close_all()
+
+
+def worker(path, options, retry_attempts, number, books, deadline, results):
+    """Check out and return random books until ``deadline``; report to ``results``."""
+    use_database(path, options)
+    if retry_attempts is not None:
+        settings.DB_LOCK_RETRY_ATTEMPTS = retry_attempts
+    user = User.objects.get(username=f'bench{number}')
+    book_ids = list(Book.objects.filter(genre='Benchmark').values_list('pk', flat=True)[:books])
+    completed, errors, latencies = 0, {}, []
+    # Book.checkout prints its errors; keep the report readable.
+    with contextlib.redirect_stdout(io.StringIO()):
+        while time.time() < deadline:
+            started = time.perf_counter()
+            try:
+                book = Book.objects.get(pk=random.choice(book_ids))
+                loan = book.checkout(user)
+                book.return_book(user, transaction=loan)
+            except Exception as e:
+                key = f'{type(e).__name__}: {e}'
+                errors[key] = errors.get(key, 0) + 1
+            else:
+                completed += 1
+                latencies.append(time.perf_counter() - started)
+    connections.close_all()
+    results.put((completed, errors, latencies))
+
+
+def check_counters(path, results):
+    """Report each benchmark book whose shelved and lent copies do not add up to its total."""
+    use_database(path, {})
+    open_loans = dict(
+        Transaction.objects.filter(book__genre='Benchmark', return_date__isnull=True)
+        .order_by().values('book').annotate(count=Count('id')).values_list('book', 'count')
+    )
+    results.put([
+        (pk, total, available, open_loans.get(pk, 0))
+        for pk, total, available in Book.objects.filter(genre='Benchmark').values_list(
+            'pk', 'total_copies', 'available_copies'
+        )
+        if available + open_loans.get(pk, 0) != total
+    ])
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Stress the circulation write path from several processes against a scratch '
+        'SQLite database, once with the default connection settings and no retries and '
+        'once with SQLITE_PRODUCTION_OPTIONS and lock retries, and compare throughput, '
+        'error rate and latency. Fails if any book\'s copy counters no longer match '
+        'its open loans afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8, help='Concurrent writer processes (default: 8)')
+        parser.add_argument('--seconds', type=float, default=5, help='Duration of each run (default: 5)')
+        parser.add_argument('--books', type=int, default=5, help='Books the writers compete for (default: 5)')
+        parser.add_argument(
+            '--profile', choices=sorted(PROFILES), action='append',
+            help='Run only this profile (repeatable; default: all)',
+        )
+
+    def handle(self, *args, **options):
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError('benchmark_sqlite needs the fork start method')
+        context = multiprocessing.get_context('fork')
+        profiles = options['profile'] or list(PROFILES)
+
+        directory = tempfile.mkdtemp(prefix='benchmark_sqlite_')
+        corrupted = 0
+        try:
+            template = os.path.join(directory, 'template.sqlite3')
+            self.run_process(context, migrate, template)
+            for name in profiles:
+                path = os.path.join(directory, f'{name}.sqlite3')
+                shutil.copyfile(template, path)
+                self.run_process(context, seed, path, options['books'], options['processes'])
+                result = self.run_profile(context, path, name, options)
+                result['mismatched'] = self.verify_counters(context, path)
+                self.report(name, result)
+                corrupted += bool(result['mismatched'])
+            if corrupted:
+                raise CommandError('Copy counters do not match the open loans; concurrent writes were lost')
+        finally:
+            connections.close_all()
+            shutil.rmtree(directory, ignore_errors=True)
+
+    @staticmethod
+    def run_process(context, target, *args):
+        # Each step runs in a child so the parent's connections never point
+        # at the scratch database.
+        connections.close_all()
+        process = context.Process(target=target, args=args)
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            raise CommandError(f'{target.__name__} failed with exit code {process.exitcode}')
+
+    @staticmethod
+    def verify_counters(context, path):
+        connections.close_all()
+        results = context.Queue()
+        process = context.Process(target=check_counters, args=(path, results))
+        process.start()
+        mismatched = results.get()
+        process.join()
+        return mismatched
+
+    def run_profile(self, context, path, name, options):
+        db_options, retry_attempts = PROFILES[name]
+        results = context.Queue()
+        deadline = time.time() + options['seconds']
+        connections.close_all()
+        processes = [
+            context.Process(
+                target=worker,
+                args=(path, db_options, retry_attempts, number, options['books'], deadline, results),
+            )
+            for number in range(options['processes'])
+        ]
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        collected = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+
+        errors = {}
+        for _, process_errors, _ in collected:
+            for key, count in process_errors.items():
+                errors[key] = errors.get(key, 0) + count
+        latencies = sorted(latency for _, _, process_latencies in collected for latency in process_latencies)
+        return {
+            'completed': sum(completed for completed, _, _ in collected),
+            'errors': errors,
+            'elapsed': elapsed,
+            'latencies': latencies,
+        }
+
+    def report(self, name, result):
+        completed = result['completed']
+        failed = sum(result['errors'].values())
+        attempted = completed + failed
+        latencies = result['latencies']
+        p50 = statistics.median(latencies) * 1000 if latencies else 0
+        p99 = latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1000 if latencies else 0
+        self.stdout.write(
+            f"{name:<11} {completed / result['elapsed']:8.1f} loans/s  "
+            f"{failed / attempted if attempted else 0:7.1%} errors ({failed}/{attempted})  "
+            f"p50 {p50:6.1f} ms  p99 {p99:7.1f} ms"
+        )
+        for error, count in sorted(result['errors'].items(), key=lambda item: -item[1])[:3]:
+            self.stdout.write(f'  {count:6} x {error[:100]}')
+        for pk, total, available, lent in result['mismatched']:
+            self.stdout.write(self.style.ERROR(
+                f'  book {pk}: {available} shelved + {lent} on loan != {total} copies'
+            ))
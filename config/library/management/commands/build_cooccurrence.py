@@ -0,0 +1,58 @@
+from collections import Counter
+from itertools import combinations, groupby
+from operator import itemgetter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from library.models import ArchivedTransaction, BookCooccurrence, Transaction
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the "patrons also borrowed" co-occurrence counts from the full loan history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Rows per bulk insert (default: 5000)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # Pairs are packed into one int (low id << 32 | high id) so the counter
+        # holds a single small key per pair instead of a tuple.
+        counts = Counter()
+        patrons = 0
+        max_history = BookCooccurrence.objects.MAX_HISTORY
+        fields = ('user_id', 'book_id', 'checkout_date', 'id')
+        loans = (
+            Transaction.objects.order_by().values_list(*fields)
+            .union(ArchivedTransaction.objects.order_by().values_list(*fields), all=True)
+            .order_by('user_id', '-checkout_date', '-id')
+            .iterator(chunk_size=batch_size)
+        )
+        for _, group in groupby(loans, key=itemgetter(0)):
+            # Most recent distinct books first, as in the incremental path
+            recent = {}
+            for _, book_id, _, _ in group:
+                if len(recent) < max_history:
+                    recent.setdefault(book_id, None)
+            books = sorted(recent)
+            counts.update(low << 32 | high for low, high in combinations(books, 2))
+            patrons += 1
+
+        with transaction.atomic():
+            BookCooccurrence.objects.all().delete()
+            batch = []
+            for key, count in counts.items():
+                low, high = key >> 32, key & 0xFFFFFFFF
+                batch.append(BookCooccurrence(book_id=low, related_book_id=high, count=count))
+                batch.append(BookCooccurrence(book_id=high, related_book_id=low, count=count))
+                if len(batch) >= batch_size:
+                    BookCooccurrence.objects.bulk_create(batch)
+                    batch = []
+            BookCooccurrence.objects.bulk_create(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Counted {len(counts)} book pairs from {patrons} patrons'
+        ))
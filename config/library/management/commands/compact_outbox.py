@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+from library.models import OutboxEvent
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete outbox events that every registered consumer has acknowledged, '
+        'in small batches. Safe to interrupt and re-run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Events deleted per statement (default: 1000)')
+        parser.add_argument('--sleep', type=float, default=0.1, help='Seconds to pause between batches (default: 0.1)')
+
+    def handle(self, *args, **options):
+        position = OutboxEvent.objects.compactable_position()
+        if position is None:
+            self.stdout.write('No outbox consumers are registered; nothing is safe to delete.')
+            return
+
+        consumed = OutboxEvent.objects.filter(pk__lte=position).order_by('pk')
+        deleted = batches = 0
+        while True:
+            ids = list(consumed.values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            deleted += OutboxEvent.objects.filter(pk__in=ids).delete()[0]
+            batches += 1
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} outbox events up to #{position} in {batches} batches'
+        ))
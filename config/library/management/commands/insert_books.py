@@ -1,5 +1,5 @@
 from django.core.management.base import BaseCommand
-from library.models import Book
+from library.models import Author, Book, BookFacetCount
 from django.utils.dateparse import parse_date
 
 class Command(BaseCommand):
@@ -169,13 +169,20 @@ class Command(BaseCommand):
             }
         ]
 
-        # Convert string dates to date objects
+        # Convert string dates to date objects and link each book to its Author record
+        authors = {}
         for book in books_data:
             book['publish_date'] = parse_date(book['publish_date'])
+            if book['author'] not in authors:
+                authors[book['author']] = Author.objects.for_name(book['author'])
+            book['author_record'] = authors[book['author']]
 
         books_to_create = [Book(**book_data) for book_data in books_data]
         
         # Use bulk_create to insert all books at once
         created_books = Book.objects.bulk_create(books_to_create)
+
+        # bulk_create skips Book.save(), so refresh the facet counts in one pass
+        BookFacetCount.objects.rebuild()
         
         self.stdout.write(self.style.SUCCESS(f'Successfully added {len(created_books)} books to the database'))
\ No newline at end of file
@@ -0,0 +1,203 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter, so nothing is imported or cached yet. Prints
+# one marker line of JSON timings on stdout.
+CHILD = r'''
+import importlib.util, json, os, sys, time
+from wsgiref.util import setup_testing_defaults
+
+started = time.perf_counter()
+import django
+from django.conf import settings
+settings.INSTALLED_APPS
+configured = time.perf_counter()
+django.setup(set_prefix=False)
+ready = time.perf_counter()
+from django.utils.module_loading import import_string
+application = import_string(settings.WSGI_APPLICATION)
+loaded = time.perf_counter()
+
+path = sys.argv[1]
+host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+
+def request():
+    environ = {'PATH_INFO': path, 'REQUEST_METHOD': 'GET', 'HTTP_HOST': host, 'HTTP_ACCEPT': 'application/json'}
+    setup_testing_defaults(environ)
+    statuses = []
+    body = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        b''.join(body)
+    finally:
+        getattr(body, 'close', lambda: None)()
+    return int(statuses[0].split()[0])
+
+status = request()
+first = time.perf_counter()
+request()
+second = time.perf_counter()
+
+compiled = []
+for name, module in list(sys.modules.items()):
+    source = getattr(module, '__file__', None)
+    if not source or not source.endswith('.py'):
+        continue
+    try:
+        fresh = os.stat(importlib.util.cache_from_source(source)).st_mtime >= os.stat(source).st_mtime
+    except (OSError, NotImplementedError, ValueError):
+        fresh = False
+    if not fresh:
+        compiled.append(name)
+
+ms = lambda a, b: (b - a) * 1000
+print('PROFILE_STARTUP ' + json.dumps({
+    'settings': ms(started, configured),
+    'apps_ready': ms(configured, ready),
+    'wsgi': ms(ready, loaded),
+    'first_response': ms(loaded, first),
+    'second_response': ms(first, second),
+    'total': ms(started, first),
+    'status': status,
+    'compiled': compiled,
+    'dont_write_bytecode': sys.dont_write_bytecode,
+}))
+'''
+
+_IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+PHASES = [
+    ('settings', 'settings'),
+    ('apps_ready', 'apps ready'),
+    ('wsgi', 'wsgi handler'),
+    ('first_response', 'first response'),
+    ('total', 'total to first response'),
+    ('second_response', 'second response'),
+    ('process', 'process wall time'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure cold start in fresh interpreters: settings, app registry and WSGI '
+        'handler load times, time to the first response for --path, and per-module '
+        'import times from -X importtime. With --budget-ms, fail when the median '
+        'time to first response is over budget.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/books/', help='Path of the first request (default: /api/books/)')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed cold starts to take the median of (default: 5)')
+        parser.add_argument('--top', type=int, default=15, help='How many modules and packages to list (default: 15)')
+        parser.add_argument(
+            '--budget-ms', type=float,
+            help='Exit with an error when the median time to first response exceeds this many ms',
+        )
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+
+    def handle(self, *args, **options):
+        # One run under -X importtime for the module breakdown; its timings
+        # include the tracing overhead, so the phases come from plain runs.
+        traced, stderr = self.cold_start(options['path'], importtime=True)
+        imports = self.parse_importtime(stderr)
+        runs = [self.cold_start(options['path'])[0] for _ in range(max(options['repeat'], 1))]
+        phases = {key: statistics.median(run[key] for run in runs) for key, _ in PHASES}
+
+        project = {name for name in imports if self.is_project_module(name)}
+        by_package = Counter()
+        for name, (own, _) in imports.items():
+            by_package[name.split('.')[0]] += own
+        result = {
+            'path': options['path'],
+            'status': runs[0]['status'],
+            'runs': len(runs),
+            'phases_ms': {key: round(value, 1) for key, value in phases.items()},
+            'slowest_imports_ms': [
+                {'module': name, 'self': own / 1000, 'cumulative': cumulative / 1000}
+                for name, (own, cumulative) in sorted(imports.items(), key=lambda item: -item[1][0])[:options['top']]
+            ],
+            'packages_ms': {name: own / 1000 for name, own in by_package.most_common(options['top'])},
+            'project_imports_ms': round(sum(imports[name][0] for name in project) / 1000, 1),
+            'compiled_from_source': len(traced['compiled']),
+            'project_compiled_from_source': sorted(n for n in traced['compiled'] if self.is_project_module(n)),
+            'dont_write_bytecode': traced['dont_write_bytecode'],
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+        else:
+            self.report(result)
+
+        budget = options['budget_ms']
+        if budget is not None:
+            if phases['total'] > budget:
+                raise CommandError(f"Cold start took {phases['total']:.0f}ms, over the {budget:.0f}ms budget")
+            if not options['json']:
+                self.stdout.write(self.style.SUCCESS(f"Within the {budget:.0f}ms budget"))
+
+    def cold_start(self, path, importtime=False):
+        """Start a fresh interpreter, serve ``path`` twice and return ``(timings, stderr)``."""
+        command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', CHILD, path]
+        env = dict(os.environ)
+        env.setdefault('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE)
+        started = time.perf_counter()
+        try:
+            process = subprocess.run(
+                command, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, timeout=300
+            )
+        except subprocess.TimeoutExpired:
+            raise CommandError('Cold start did not finish within 300s')
+        wall = (time.perf_counter() - started) * 1000
+        for line in process.stdout.splitlines():
+            if line.startswith('PROFILE_STARTUP '):
+                timings = json.loads(line.split(' ', 1)[1])
+                timings['process'] = wall
+                return timings, process.stderr
+        raise CommandError(f'Cold start failed (exit {process.returncode}):\n{process.stderr[-2000:]}')
+
+    @staticmethod
+    def parse_importtime(stderr):
+        """Map each imported module to ``(self, cumulative)`` microseconds."""
+        imports = {}
+        for line in stderr.splitlines():
+            match = _IMPORT_LINE.match(line)
+            if match:
+                imports[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+        return imports
+
+    @staticmethod
+    def is_project_module(name):
+        root = name.split('.')[0]
+        return (settings.BASE_DIR / root).is_dir() or (settings.BASE_DIR / f'{root}.py').is_file()
+
+    def report(self, result):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Cold start, median of {result['runs']} runs (GET {result['path']} -> {result['status']}):"
+        ))
+        for key, label in PHASES:
+            self.stdout.write(f"  {label:<26}{result['phases_ms'][key]:>9.1f} ms")
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Slowest imports (self / cumulative ms):'))
+        for entry in result['slowest_imports_ms']:
+            self.stdout.write(f"  {entry['module']:<48}{entry['self']:>8.1f}{entry['cumulative']:>10.1f}")
+        self.stdout.write(self.style.MIGRATE_HEADING('Import time by top-level package (ms):'))
+        for name, own in result['packages_ms'].items():
+            self.stdout.write(f"  {name:<48}{own:>8.1f}")
+        self.stdout.write(f"  (this project's modules: {result['project_imports_ms']:.1f} ms)")
+
+        compiled = result['compiled_from_source']
+        if compiled:
+            self.stdout.write(self.style.WARNING(
+                f"{compiled} modules ({len(result['project_compiled_from_source'])} from this project) "
+                f"had no up-to-date bytecode and were compiled from source on every start. "
+                f"Run `python -m compileall` when deploying"
+                + (' and unset PYTHONDONTWRITEBYTECODE.' if result['dont_write_bytecode'] else '.')
+            ))
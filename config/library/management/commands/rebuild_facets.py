@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from library.models import BookFacetCount
+
+
+class Command(BaseCommand):
+    help = 'Recompute the precomputed book facet counts from the catalogue'
+
+    def handle(self, *args, **options):
+        BookFacetCount.objects.rebuild()
+        rows = BookFacetCount.objects.count()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} facet counts'))
@@ -0,0 +1,106 @@
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from library.jobs import Worker
+from library.models import Job
+
+
+def run_worker_process(name, poll_interval, drain):
+    """Entry point of a worker process; stops on SIGTERM."""
+    import django
+    django.setup()
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    signal.signal(signal.SIGINT, lambda *args: stop.set())
+    Worker(name, poll_interval, drain, stop).run()
+
+
+class Command(BaseCommand):
+    help = (
+        'Run background job workers that claim jobs from the database queue. '
+        'Stop them with Ctrl+C or SIGTERM; the job in progress is finished first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Number of workers (default: 2)')
+        parser.add_argument(
+            '--mode', choices=['thread', 'process'], default='thread',
+            help='Run workers as threads (I/O-bound jobs) or processes (CPU-bound jobs); default: thread',
+        )
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--drain', action='store_true', help='Exit once no job is runnable instead of polling')
+        parser.add_argument('--stats', action='store_true', help='Print per-job counts and timings, then exit')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.print_stats()
+            return
+
+        names = [f"{socket.gethostname()}:{os.getpid()}:{i}" for i in range(options['workers'])]
+        self.stdout.write(f"Starting {len(names)} {options['mode']} workers")
+        if options['mode'] == 'process':
+            self.run_processes(names, options)
+        else:
+            self.run_threads(names, options)
+        self.print_stats()
+
+    def run_threads(self, names, options):
+        stop = threading.Event()
+        workers = [Worker(name, options['poll'], options['drain'], stop) for name in names]
+        threads = [threading.Thread(target=worker.run, name=worker.name) for worker in workers]
+        previous = signal.signal(signal.SIGTERM, lambda *args: stop.set())
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping workers after their current job...')
+            stop.set()
+            for thread in threads:
+                thread.join()
+        finally:
+            signal.signal(signal.SIGTERM, previous)
+        self.stdout.write(f'Processed {sum(worker.processed for worker in workers)} jobs')
+
+    def run_processes(self, names, options):
+        # Children must not inherit the parent's open database connections.
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=run_worker_process, args=(name, options['poll'], options['drain']))
+            for name in names
+        ]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping workers after their current job...')
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join()
+
+    def print_stats(self):
+        stats = Job.objects.stats()
+        if not stats:
+            self.stdout.write('No jobs recorded.')
+            return
+        for name, row in sorted(stats.items()):
+            timings = ''
+            if row['avg_run_ms'] is not None:
+                timings = (
+                    f", wait {row['avg_wait_ms']:.0f}ms avg, "
+                    f"run {row['avg_run_ms']:.0f}ms avg / {row['max_run_ms']}ms max"
+                )
+            self.stdout.write(
+                f"{name}: {row['queued']} queued, {row['running']} running, "
+                f"{row['succeeded']} succeeded, {row['failed']} failed{timings}"
+            )
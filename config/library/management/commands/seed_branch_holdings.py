@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from library.models import Book, BranchHolding
+from library.routers import branch_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Move catalogue books' shelved copies into branch holdings, split evenly "
+        'across the branches. The shared Book counters keep only the copies still on '
+        'legacy loans, so no copy can be lent from both; running again moves copies '
+        'returned to the shared pool since.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('branches', nargs='*', help='Branch codes to stock (default: every LIBRARY_BRANCHES entry)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Books per batch (default: 1000)')
+
+    def handle(self, *args, **options):
+        codes = options['branches'] or list(settings.LIBRARY_BRANCHES)
+        if not codes:
+            raise CommandError('No branches configured; set LIBRARY_BRANCHES (e.g. LIBRARY_BRANCHES=north,south)')
+        try:
+            databases = {code: branch_database(code) for code in codes}
+        except LookupError as e:
+            raise CommandError(str(e))
+
+        books = Book.objects.filter(available_copies__gt=0).order_by('pk')
+        moved = seen = 0
+        last_pk = 0
+        while True:
+            # The shared counter is emptied and committed before any branch
+            # is stocked: a failure in between leaves copies lendable
+            # nowhere, never from both the shared pool and a branch.
+            with transaction.atomic():
+                batch = list(books.filter(pk__gt=last_pk)[:options['batch_size']])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+                shelved = {book.pk: book.available_copies for book in batch}
+                for book in batch:
+                    book.total_copies -= book.available_copies
+                    book.available_copies = 0
+                # Status, facet counts and change events as for any edit.
+                Book.objects.bulk_save(updated=batch)
+            for index, code in enumerate(codes):
+                try:
+                    self.stock(code, databases[code], index, len(codes), shelved)
+                except Exception as e:
+                    raise CommandError(
+                        f'Stocking branch {code} failed: {e}. Books {min(shelved)}-{max(shelved)} are '
+                        f'already off the shared counter; only {codes[:index] or "no branches"} got their copies'
+                    ) from e
+            seen += len(batch)
+            moved += sum(shelved.values())
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {moved} copies of {seen} books into {len(codes)} branches'
+        ))
+
+    def stock(self, code, database, index, branches, shelved):
+        """Add branch ``index``'s share of each book's ``shelved`` copies to its holdings."""
+        shares = {
+            pk: self.share(copies, branches, index) for pk, copies in shelved.items()
+        }
+        holdings = BranchHolding.objects.for_branch(code)
+        with transaction.atomic(using=database):
+            held = set(holdings.filter(book_id__in=shares).values_list('book_id', flat=True))
+            BranchHolding.objects.using(database).bulk_create(
+                BranchHolding(branch_code=code, book_id=pk, total_copies=copies, available_copies=copies)
+                for pk, copies in shares.items() if pk not in held
+            )
+            for pk in held:
+                if shares[pk]:
+                    holdings.filter(book_id=pk).update(
+                        total_copies=F('total_copies') + shares[pk],
+                        available_copies=F('available_copies') + shares[pk],
+                    )
+
+    @staticmethod
+    def share(copies, branches, index):
+        """Branch ``index``'s part of ``copies``; earlier branches take the remainder."""
+        return copies // branches + (1 if index < copies % branches else 0)
@@ -0,0 +1,119 @@
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef
+from django.template.loader import render_to_string
+from django.utils import timezone
+from library.models import Reminder, Transaction
+
+
+class Command(BaseCommand):
+    help = (
+        'Email patrons about loans due within --days days and loans that are overdue, '
+        'one message per patron over a single SMTP connection. Sent reminders are '
+        'recorded, so re-running the command does not email anyone twice.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=3, help='Remind about loans due within this many days (default: 3)')
+        parser.add_argument(
+            '--overdue-every', type=int, default=7,
+            help='Days between repeated overdue reminders for the same loan (default: 7)',
+        )
+        parser.add_argument(
+            '--rate', type=float, default=getattr(settings, 'REMINDER_RATE_LIMIT', 5),
+            help='Maximum messages per second (default: REMINDER_RATE_LIMIT)',
+        )
+        parser.add_argument('--limit', type=int, help='Stop after emailing this many patrons')
+        parser.add_argument('--dry-run', action='store_true', help='Report who would be emailed without sending')
+
+    def handle(self, *args, **options):
+        today = timezone.now().date()
+        recipients = self.collect(today, options)
+        if options['limit'] is not None:
+            recipients = recipients[:options['limit']]
+
+        if options['dry_run']:
+            for user, loans in recipients:
+                self.stdout.write(
+                    f"{user.email}: {len(loans[Reminder.Kind.OVERDUE])} overdue, "
+                    f"{len(loans[Reminder.Kind.DUE_SOON])} due soon"
+                )
+            self.stdout.write(f'{len(recipients)} patrons would be emailed')
+            return
+
+        sent = failed = 0
+        interval = 1 / options['rate'] if options['rate'] > 0 else 0
+        next_send = time.monotonic()
+        with get_connection() as connection:
+            for user, loans in recipients:
+                delay = next_send - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                next_send = max(next_send, time.monotonic()) + interval
+                try:
+                    connection.send_messages([self.build_message(user, loans)])
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'Could not email {user.email}: {e}')
+                    continue
+                # Recorded per patron as soon as their message is accepted, so an
+                # interrupted run resumes without duplicates.
+                Reminder.objects.bulk_create(
+                    [
+                        Reminder(transaction=loan, kind=kind, sent_on=today)
+                        for kind, kind_loans in loans.items() for loan in kind_loans
+                    ],
+                    ignore_conflicts=True,
+                )
+                sent += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Sent {sent} reminder emails ({failed} failed)'))
+
+    def collect(self, today, options):
+        """
+        Select every loan needing a reminder in two set-wise queries (ranges
+        over the open-loan due date index) and group them by patron.
+
+        Returns:
+            list: ``(user, {kind: [loans]})`` pairs, ordered by user id
+        """
+        open_loans = Transaction.objects.filter(return_date__isnull=True).select_related('book', 'user')
+        due_soon = open_loans.filter(
+            due_date__gte=today, due_date__lte=today + timedelta(days=options['days'])
+        ).exclude(
+            Exists(Reminder.objects.filter(transaction=OuterRef('pk'), kind=Reminder.Kind.DUE_SOON))
+        )
+        overdue = open_loans.overdue(today).with_overdue(today).exclude(
+            Exists(Reminder.objects.filter(
+                transaction=OuterRef('pk'),
+                kind=Reminder.Kind.OVERDUE,
+                sent_on__gt=today - timedelta(days=options['overdue_every']),
+            ))
+        )
+
+        by_user = {}
+        for kind, queryset in ((Reminder.Kind.DUE_SOON, due_soon), (Reminder.Kind.OVERDUE, overdue)):
+            for loan in queryset.order_by('due_date', 'id'):
+                user, loans = by_user.setdefault(loan.user_id, (loan.user, defaultdict(list)))
+                loans[kind].append(loan)
+        return [
+            (user, loans) for user, loans in (by_user[user_id] for user_id in sorted(by_user))
+            if user.email and user.is_active
+        ]
+
+    def build_message(self, user, loans):
+        overdue = loans[Reminder.Kind.OVERDUE]
+        subject = 'Overdue library books' if overdue else 'Library books due soon'
+        body = render_to_string('library/email/reminder.txt', {
+            'user': user,
+            'overdue': overdue,
+            'due_soon': loans[Reminder.Kind.DUE_SOON],
+            'penalty_rate': Transaction.PENALTY_RATE,
+            'max_penalty': Transaction.MAX_PENALTY,
+        })
+        return EmailMessage(subject, body, to=[user.email])
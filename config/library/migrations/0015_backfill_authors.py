@@ -0,0 +1,52 @@
+from django.db import migrations
+
+from library.text import fold
+
+BATCH_SIZE = 500
+
+
+def backfill_authors(apps, schema_editor):
+    """Create Author rows from existing Book.author strings and link them, in pk-ordered batches."""
+    Author = apps.get_model('library', 'Author')
+    Book = apps.get_model('library', 'Book')
+    db_alias = schema_editor.connection.alias
+
+    last_pk = 0
+    while True:
+        batch = list(
+            Book.objects.using(db_alias)
+            .filter(pk__gt=last_pk)
+            .order_by('pk')
+            .only('pk', 'author', 'author_record')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+
+        names = {}
+        for book in batch:
+            names.setdefault(fold(book.author), book.author.strip())
+        Author.objects.using(db_alias).bulk_create(
+            [Author(name=name, name_key=key) for key, name in names.items()],
+            ignore_conflicts=True,
+        )
+        author_ids = dict(
+            Author.objects.using(db_alias)
+            .filter(name_key__in=names)
+            .values_list('name_key', 'pk')
+        )
+
+        for book in batch:
+            book.author_record_id = author_ids[fold(book.author)]
+        Book.objects.using(db_alias).bulk_update(batch, ['author_record'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0014_author'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_authors, migrations.RunPython.noop),
+    ]
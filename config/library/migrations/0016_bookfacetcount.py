@@ -0,0 +1,25 @@
+# Generated by Django 5.1 on 2026-10-19 09:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0015_backfill_authors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookFacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(max_length=20)),
+                ('value', models.CharField(max_length=255)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('facet', 'value'), name='unique_book_facet_value')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def populate_book_facets(apps, schema_editor):
+    """Seed BookFacetCount from the existing catalogue."""
+    Book = apps.get_model('library', 'Book')
+    BookFacetCount = apps.get_model('library', 'BookFacetCount')
+    db_alias = schema_editor.connection.alias
+
+    counts = {}
+    rows = (
+        Book.objects.using(db_alias).order_by()
+        .values_list('genre', 'status', 'publish_date__year')
+        .annotate(total=Count('id'))
+    )
+    for genre, status, year, total in rows:
+        for facet, value in (
+            ('genre', genre),
+            ('status', status),
+            ('decade', f"{year // 10 * 10}s"),
+        ):
+            counts[facet, value] = counts.get((facet, value), 0) + total
+
+    BookFacetCount.objects.using(db_alias).bulk_create(
+        BookFacetCount(facet=facet, value=value, count=count)
+        for (facet, value), count in counts.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0016_bookfacetcount'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_book_facets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1 on 2026-10-19 09:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0017_populate_book_facets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookCooccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='library.book')),
+                ('related_book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='library.book')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['book', '-count', 'related_book'], name='cooccurrence_top_idx')],
+                'constraints': [models.UniqueConstraint(fields=('book', 'related_book'), name='unique_book_cooccurrence')],
+            },
+        ),
+    ]
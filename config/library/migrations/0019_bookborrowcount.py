@@ -0,0 +1,26 @@
+# Generated by Django 5.1 on 2026-10-19 09:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0018_bookcooccurrence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookBorrowCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='library.book')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'book'), name='unique_book_borrow_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1 on 2026-10-19 09:56
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0019_bookborrowcount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCirculationStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('genre', models.CharField(max_length=255)),
+                ('checkouts', models.PositiveIntegerField(default=0)),
+                ('returns', models.PositiveIntegerField(default=0)),
+                ('overdue_returns', models.PositiveIntegerField(default=0)),
+                ('penalties_assessed', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('penalties_paid', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+            ],
+            options={
+                'ordering': ['day', 'genre'],
+                'constraints': [models.UniqueConstraint(fields=('day', 'genre'), name='unique_circulation_day_genre')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1 on 2026-10-19 09:57
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0020_dailycirculationstat'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTransaction',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('transaction_type', models.CharField(choices=[('CO', 'Check Out'), ('RE', 'Return')], default='RE', max_length=2)),
+                ('checkout_date', models.DateField()),
+                ('due_date', models.DateField(blank=True, null=True)),
+                ('return_date', models.DateField()),
+                ('penalty_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=5)),
+                ('penalty_paid', models.BooleanField(default=False)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_transactions', to='library.book')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_transactions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-checkout_date'],
+                'indexes': [models.Index(fields=['user', '-checkout_date'], name='archived_txn_user_idx')],
+            },
+        ),
+    ]
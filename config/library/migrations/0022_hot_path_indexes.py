@@ -0,0 +1,53 @@
+# Generated by Django 5.1 on 2026-10-19 10:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0021_archivedtransaction'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='archivedtransaction',
+            name='archived_txn_user_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='book',
+            name='library_boo_status_52a709_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='library_tra_user_id_2b19e4_idx',
+        ),
+        migrations.AlterField(
+            model_name='book',
+            name='author_record',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='books', to='library.author'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtransaction',
+            index=models.Index(fields=['user', 'checkout_date', 'id'], name='archived_txn_history_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['title'], name='library_boo_title_c38ef2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['status', 'title'], name='library_boo_status_552711_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['author_record', 'title'], name='library_boo_author__77715b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'checkout_date'], name='library_tra_user_id_74119f_idx'),
+        ),
+    ]
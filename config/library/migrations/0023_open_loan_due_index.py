@@ -0,0 +1,19 @@
+# Generated by Django 5.1 on 2026-10-19 10:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0022_hot_path_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('return_date__isnull', True)), fields=['due_date', 'id'], name='open_loan_due_idx'),
+        ),
+    ]
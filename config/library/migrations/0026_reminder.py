@@ -0,0 +1,26 @@
+# Generated by Django 5.1 on 2026-10-19 10:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0025_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('due_soon', 'Due soon'), ('overdue', 'Overdue')], max_length=10)),
+                ('sent_on', models.DateField()),
+                ('transaction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='library.transaction')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('transaction', 'kind', 'sent_on'), name='unique_reminder_per_day')],
+            },
+        ),
+    ]
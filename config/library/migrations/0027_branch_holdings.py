@@ -0,0 +1,48 @@
+# Generated by Django 5.1 on 2026-10-19 10:14
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0026_reminder'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BranchHolding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('branch_code', models.CharField(max_length=20)),
+                ('total_copies', models.PositiveIntegerField(default=0)),
+                ('available_copies', models.PositiveIntegerField(default=0)),
+                ('book', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='library.book')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('branch_code', 'book'), name='unique_branch_holding')],
+            },
+        ),
+        migrations.CreateModel(
+            name='BranchLoan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('branch_code', models.CharField(max_length=20)),
+                ('checkout_date', models.DateField(auto_now_add=True)),
+                ('due_date', models.DateField()),
+                ('return_date', models.DateField(blank=True, null=True)),
+                ('penalty_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=5)),
+                ('penalty_paid', models.BooleanField(default=False)),
+                ('book', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='library.book')),
+                ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-checkout_date'],
+                'indexes': [models.Index(fields=['branch_code', 'user', 'checkout_date'], name='branch_loan_user_idx')],
+            },
+        ),
+    ]
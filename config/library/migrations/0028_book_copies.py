@@ -0,0 +1,41 @@
+# Generated by Django 5.1 on 2026-10-19 10:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0027_branch_holdings'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookCopy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('barcode', models.CharField(max_length=32, unique=True)),
+                ('added_at', models.DateTimeField(auto_now_add=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='copies', to='library.book')),
+            ],
+            options={
+                'verbose_name_plural': 'book copies',
+            },
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='copy',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='loans', to='library.bookcopy'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['copy', 'checkout_date'], name='copy_loans_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='transaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('return_date__isnull', True)), fields=('copy',), name='unique_open_loan_per_copy'),
+        ),
+    ]
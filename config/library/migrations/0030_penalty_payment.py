@@ -0,0 +1,40 @@
+# Generated by Django 5.1 on 2026-10-19 10:44
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0029_index_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PenaltyPayment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10)),
+                ('payment_method', models.CharField(blank=True, choices=[('credit_card', 'Credit card'), ('debit_card', 'Debit card'), ('M-pesa', 'M-Pesa'), ('staff', 'Recorded by staff')], max_length=20)),
+                ('loan_count', models.PositiveIntegerField(default=0)),
+                ('paid_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='penalty_payments', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-paid_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='payment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transactions', to='library.penaltypayment'),
+        ),
+        migrations.AddIndex(
+            model_name='penaltypayment',
+            index=models.Index(fields=['user', 'paid_at'], name='library_pen_user_id_1b9e12_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1 on 2026-10-19 10:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0030_penalty_payment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='copy',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_loans', to='library.bookcopy'),
+        ),
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='payment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_transactions', to='library.penaltypayment'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1 on 2026-10-19 11:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0031_archived_transaction_payment_copy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='branchloan',
+            name='payment',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='library.penaltypayment'),
+        ),
+    ]
@@ -1,9 +1,108 @@
 from decimal import Decimal  # Ensure this import is present
-from django.db import models
+import heapq
+from django.db import IntegrityError, models, transaction as db_transaction
+from django.db.models import F
+from django.db.models.functions import Least
 from django.utils import timezone
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from accounts.models import User
 from datetime import timedelta
+from .expressions import DaysBetween
+from .retry import retry_on_locked
+from .routers import branch_database, branch_databases
+from .signals import book_checked_out, book_returned, branch_loan_changed, books_bulk_saved, penalties_paid
+from .text import fold
+
+
+class AuthorManager(models.Manager):
+    def for_name(self, name):
+        """Return the Author whose folded key matches ``name``, creating it on first use."""
+        author, _ = self.get_or_create(
+            name_key=fold(name),
+            defaults={'name': name.strip()},
+        )
+        return author
+
+    def for_names(self, names):
+        """
+        Resolve many author names at once, creating the missing Authors in
+        one insert.
+
+        Returns:
+            dict: ``{folded name: Author}`` for every name given
+        """
+        names = {fold(name): name.strip() for name in names}
+        authors = self.in_bulk(list(names), field_name='name_key')
+        missing = [Author(name=name, name_key=key) for key, name in names.items() if key not in authors]
+        if missing:
+            # Concurrent writers may create some of the same authors; re-read them.
+            self.bulk_create(missing, ignore_conflicts=True)
+            authors = self.in_bulk(list(names), field_name='name_key')
+        return authors
+
+
+class Author(models.Model):
+    """
+    A normalised author record shared by every book with the same author name.
+
+    Attributes:
+        name (str): The display name, as first seen in the catalogue
+        name_key (str): Accent-folded, casefolded lookup key (unique, indexed)
+    """
+
+    name = models.CharField(max_length=255)
+    name_key = models.CharField(max_length=255, unique=True)
+
+    objects = AuthorManager()
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        """Keep the lookup key in step with the display name."""
+        self.name_key = fold(self.name)
+        super().save(*args, **kwargs)
+
+
+class BookManager(models.Manager):
+    BULK_FIELDS = [
+        'title', 'author', 'author_record', 'isbn', 'genre',
+        'publish_date', 'total_copies', 'available_copies', 'status',
+    ]
+
+    def bulk_save(self, created=(), updated=()):
+        """
+        Insert and update many books with one ``bulk_create`` and one
+        ``bulk_update`` in a single transaction.
+
+        Does what ``Book.save()`` does for each book (status, author record,
+        facet counts and change events) in a fixed number of queries. The
+        books must already be validated, and ``updated`` books loaded from
+        the database so their previous facet values are known.
+        """
+        created, updated = list(created), list(updated)
+        books = created + updated
+        authors = Author.objects.for_names({book.author for book in books})
+        changes = []
+        for book in books:
+            book.update_status()
+            book.author_record = authors[fold(book.author)]
+            before = None if book._state.adding else book.loaded_facet_values()
+            changes.append((before, book.facet_values(only=before)))
+
+        with db_transaction.atomic():
+            self.bulk_create(created, batch_size=500)
+            if updated:
+                self.bulk_update(updated, self.BULK_FIELDS, batch_size=500)
+            BookFacetCount.objects.record_many(changes)
+            books_bulk_saved.send(sender=Book, created=created, updated=updated)
+        for book in books:
+            book._loaded_values = {field.attname: getattr(book, field.attname) for field in Book._meta.concrete_fields}
+        return created, updated
 
 
 class Book(models.Model):
@@ -13,6 +112,7 @@ class Book(models.Model):
     Attributes:
         title (str): The title of the book
         author (str): The author's name
+        author_record (Author): The normalised author the name resolves to
         isbn (str): Unique 13-digit ISBN identifier
         publish_date (date): The book's publication date
         total_copies (int): Total number of copies owned by the library
@@ -28,6 +128,14 @@ class Book(models.Model):
 
     title = models.CharField(max_length=255)
     author = models.CharField(max_length=255)
+    author_record = models.ForeignKey(
+        Author,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='books',
+        db_index=False,  # covered by the (author_record, title) index
+    )
     isbn = models.CharField(max_length=13, unique=True)
     publish_date = models.DateField()
     genre = models.CharField(max_length=255, null=False, default="genre")
@@ -39,26 +147,85 @@ class Book(models.Model):
         default=Status.AVAILABLE,
     )
 
+    objects = BookManager()
+
     class Meta:
         ordering = ['title']
         indexes = [
             models.Index(fields=['isbn']),
-            models.Index(fields=['status']),
+            models.Index(fields=['title']),
+            # Serve "available books" and "books by author" in title order without a sort
+            models.Index(fields=['status', 'title']),
+            models.Index(fields=['author_record', 'title']),
         ]
 
     def __str__(self):
         return f"{self.title} by {self.author}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the loaded values so save() can tell what changed."""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        """Reload from the database and remember the reloaded values as the loaded ones."""
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        loaded = getattr(self, '_loaded_values', {})
+        for field in self._meta.concrete_fields:
+            if field.attname in self.__dict__ and (fields is None or {field.name, field.attname} & set(fields)):
+                loaded[field.attname] = getattr(self, field.attname)
+        self._loaded_values = loaded
+
     def clean(self):
         """Validate the book's data ensuring that available copies do not exceed total copies."""
         if self.available_copies > self.total_copies:
             raise ValidationError("Available copies cannot exceed total copies")
 
     def save(self, *args, **kwargs):
-        """Validate the book's data and update the book's status."""
+        """Validate the book's data, update the book's status and keep facet counts current."""
         self.full_clean()
         self.update_status()
-        super().save(*args, **kwargs) 
+        self.resolve_author()
+        before = None if self._state.adding else self.loaded_facet_values()
+        with db_transaction.atomic():
+            super().save(*args, **kwargs)
+            BookFacetCount.objects.record(before, self.facet_values(only=before))
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+        }
+
+    def resolve_author(self):
+        """Link the book to the Author record for its author name."""
+        loaded_author = getattr(self, '_loaded_values', {}).get('author')
+        if self.author_record_id is None or self.author != loaded_author:
+            self.author_record = Author.objects.for_name(self.author)
+
+    def facet_values(self, only=None):
+        """
+        Return the book's browse facets: genre, status and publication decade.
+
+        Args:
+            only (dict): Restrict the result to these facet names
+        """
+        values = {}
+        for facet, field in BookFacetCount.FACET_FIELDS.items():
+            if only is not None and facet not in only:
+                continue
+            values[facet] = BookFacetCount.facet_value(facet, getattr(self, field))
+        return values
+
+    def loaded_facet_values(self):
+        """Facet values as last loaded from or saved to the database, skipping deferred fields."""
+        loaded = getattr(self, '_loaded_values', {})
+        return {
+            facet: BookFacetCount.facet_value(facet, loaded[field])
+            for facet, field in BookFacetCount.FACET_FIELDS.items()
+            if field in loaded
+        }
 
     def update_status(self):
         """Updates the status based on available copies."""
@@ -72,10 +239,25 @@ class Book(models.Model):
         """Check if the book is available for checkout."""
         return self.status == self.Status.AVAILABLE and self.available_copies > 0
 
-    def checkout(self, user):
+    def save_counters(self):
+        """
+        Reload the copy counters after an ``F()`` update of them and save the
+        status they imply, with its facet counts and change event.
+
+        Runs in the transaction holding the write lock taken by that update,
+        so the reloaded values cannot be stale.
+        """
+        self.refresh_from_db(fields=['available_copies', 'total_copies', 'status'])
+        self.save(update_fields=['available_copies', 'status'])
+
+    @retry_on_locked
+    def checkout(self, user, copy=None):
         """
         Attempt to checkout the book to a user.
         Added checking for unpaid penalties.
+
+        Args:
+            copy (BookCopy): The scanned physical copy being lent, if known
     
         Returns:
             Transaction or None: The created transaction if successful, raises ValueError if the book is unavailable.
@@ -87,45 +269,339 @@ class Book(models.Model):
             # Check if the book is available using the `is_available` property
             if not self.is_available:
                 raise ValueError("Book is not available for checkout")
+
+            if copy is not None:
+                if copy.book_id != self.pk:
+                    raise ValueError("This copy belongs to a different book")
+                # The unique_open_loan_per_copy constraint backs this up under races.
+                if copy.loans.filter(return_date__isnull=True).exists():
+                    raise ValueError("This copy is already on loan")
     
-            # Decrement available copies and save the book
-            self.available_copies -= 1
-            self.save()
-    
-            # Create a new transaction for checking out the book
-            return Transaction.objects.create(
-                user=user,
-                book=self,
-                transaction_type=Transaction.TransactionType.CHECK_OUT,
-                penalty_amount=Decimal('0.00')
-            )
+            with db_transaction.atomic():
+                # Take the copy with a conditional UPDATE rather than saving
+                # a count read before the transaction, which concurrent
+                # checkouts would overwrite.
+                taken = Book.objects.filter(pk=self.pk, available_copies__gt=0).update(
+                    available_copies=F('available_copies') - 1
+                )
+                if not taken:
+                    raise ValueError("Book is not available for checkout")
+                self.save_counters()
+
+                # Create a new transaction for checking out the book
+                transaction = Transaction.objects.create(
+                    user=user,
+                    book=self,
+                    transaction_type=Transaction.TransactionType.CHECK_OUT,
+                    penalty_amount=Decimal('0.00'),
+                    copy=copy,
+                )
+                book_checked_out.send(sender=Book, book=self, user=user, transaction=transaction)
+            return transaction
         except Exception as e:
             print(f"Error in checkout method: {str(e)}")
             raise
 
-    def return_book(self, user):
+    @retry_on_locked
+    def return_book(self, user, transaction=None):
         """
         Attempt to return the book from a user.
+
+        Args:
+            transaction (Transaction): The open loan, when the caller already
+                found it (e.g. by scanning the copy); looked up otherwise
         
         Returns:
             transaction or ValueError: The updated transaction if successful, ValueError if not found
         """
-        transaction = self.transaction_set.filter(
-            user=user, 
-            return_date__isnull=True
-        ).first()
+        if transaction is None:
+            transaction = self.transaction_set.filter(
+                user=user, 
+                return_date__isnull=True
+            ).first()
         
         if not transaction:
             raise ValueError("No active transaction found for this book and user")
         
-        self.available_copies += 1
-        self.save()
-        
-        transaction.return_date = timezone.now()
-        transaction.save()
+        with db_transaction.atomic():
+            Book.objects.filter(pk=self.pk).update(available_copies=F('available_copies') + 1)
+            self.save_counters()
+
+            transaction.book = self
+            transaction.return_book()
+            book_returned.send(sender=Book, book=self, user=user, transaction=transaction)
         return transaction
 
 
+class BookCopyManager(models.Manager):
+    def with_open_loan(self):
+        """
+        Copies joined to their book and, through the partial unique index on
+        ``Transaction.copy``, to their open loan. Loan columns are annotated as
+        ``loan_id``, ``loan_user_id``, ``loan_user_email``,
+        ``loan_checkout_date`` and ``loan_due_date`` (None when on the shelf).
+        """
+        return self.select_related('book').annotate(
+            open_loan=models.FilteredRelation('loans', condition=models.Q(loans__return_date__isnull=True)),
+            loan_id=F('open_loan__id'),
+            loan_user_id=F('open_loan__user_id'),
+            loan_user_email=F('open_loan__user__email'),
+            loan_checkout_date=F('open_loan__checkout_date'),
+            loan_due_date=F('open_loan__due_date'),
+        )
+
+    def scan(self, barcode):
+        """Resolve a scanned barcode to its copy, book and open loan in one query."""
+        return self.with_open_loan().get(barcode=barcode)
+
+
+class BookCopy(models.Model):
+    """
+    One physical copy of a book, identified by the barcode on its label.
+
+    Whether the copy is on loan is not stored here: it is on loan exactly
+    when a Transaction for it has no return date.
+    """
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='copies')
+    barcode = models.CharField(max_length=32, unique=True)
+    added_at = models.DateTimeField(auto_now_add=True)
+
+    objects = BookCopyManager()
+
+    class Meta:
+        verbose_name_plural = 'book copies'
+
+    def __str__(self):
+        return f"{self.barcode} ({self.book})"
+
+
+class CounterManager(models.Manager):
+    """Manager for tables of counters kept up to date with ``F()`` increments."""
+
+    def increment(self, lookup, **deltas):
+        """
+        Add ``deltas`` to the counter row matching ``lookup``, creating the row if needed.
+
+        Returns:
+            bool: True when a new row was created
+        """
+        rows = self.filter(**lookup)
+        if rows.update(**{field: F(field) + delta for field, delta in deltas.items()}):
+            return False
+        try:
+            with db_transaction.atomic():
+                self.create(**lookup, **deltas)
+        except IntegrityError:
+            # Another writer created the row first; apply our deltas to it.
+            rows.update(**{field: F(field) + delta for field, delta in deltas.items()})
+            return False
+        return True
+
+
+class BookFacetCountManager(CounterManager):
+    def record(self, before, after):
+        """
+        Move one book's contribution from the ``before`` facet values to ``after``.
+
+        Either side may be None for a created or deleted book.
+        """
+        before = before or {}
+        after = after or {}
+        for facet in before.keys() | after.keys():
+            old, new = before.get(facet), after.get(facet)
+            if old == new:
+                continue
+            if old is not None:
+                self.increment({'facet': facet, 'value': old}, count=-1)
+            if new is not None:
+                self.increment({'facet': facet, 'value': new}, count=1)
+
+    def record_many(self, changes):
+        """
+        Apply many books' ``(before, after)`` facet changes, netted so each
+        affected counter row is written once.
+        """
+        deltas = {}
+        for before, after in changes:
+            before = before or {}
+            after = after or {}
+            for facet in before.keys() | after.keys():
+                old, new = before.get(facet), after.get(facet)
+                if old == new:
+                    continue
+                if old is not None:
+                    deltas[facet, old] = deltas.get((facet, old), 0) - 1
+                if new is not None:
+                    deltas[facet, new] = deltas.get((facet, new), 0) + 1
+        for (facet, value), count in deltas.items():
+            if count:
+                self.increment({'facet': facet, 'value': value}, count=count)
+
+    def tally(self, queryset):
+        """Group a Book queryset into ``{facet: {value: count}}``."""
+        facets = {facet: {} for facet in BookFacetCount.FACET_FIELDS}
+        rows = (
+            queryset.order_by()
+            .values_list('genre', 'status', 'publish_date__year')
+            .annotate(total=models.Count('id'))
+        )
+        for genre, status, year, total in rows:
+            for facet, value in (
+                (BookFacetCount.GENRE, genre),
+                (BookFacetCount.STATUS, status),
+                (BookFacetCount.DECADE, BookFacetCount.decade_label(year)),
+            ):
+                facets[facet][value] = facets[facet].get(value, 0) + total
+        return facets
+
+    def rebuild(self):
+        """Recompute every facet count from the Book table."""
+        facets = self.tally(Book.objects.all())
+        with db_transaction.atomic():
+            self.all().delete()
+            self.bulk_create(
+                BookFacetCount(facet=facet, value=value, count=count)
+                for facet, values in facets.items()
+                for value, count in values.items()
+            )
+
+    def as_dict(self):
+        """Return ``{facet: {value: count}}`` for every non-empty facet value."""
+        facets = {facet: {} for facet in BookFacetCount.FACET_FIELDS}
+        for facet, value, count in self.filter(count__gt=0).values_list('facet', 'value', 'count'):
+            facets[facet][value] = count
+        return facets
+
+
+class BookFacetCount(models.Model):
+    """
+    Precomputed number of books per browse facet value.
+
+    Book.save() and Book deletion adjust these rows incrementally, so browse
+    pages read a handful of rows instead of grouping the whole catalogue.
+    """
+
+    GENRE = 'genre'
+    STATUS = 'status'
+    DECADE = 'decade'
+    FACET_FIELDS = {
+        GENRE: 'genre',
+        STATUS: 'status',
+        DECADE: 'publish_date',
+    }
+
+    facet = models.CharField(max_length=20)
+    value = models.CharField(max_length=255)
+    count = models.IntegerField(default=0)
+
+    objects = BookFacetCountManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['facet', 'value'], name='unique_book_facet_value'),
+        ]
+
+    def __str__(self):
+        return f"{self.facet}={self.value}: {self.count}"
+
+    @staticmethod
+    def decade_label(year):
+        """Return the decade label for a year, e.g. 1964 -> '1960s'."""
+        return f"{year // 10 * 10}s"
+
+    @classmethod
+    def facet_value(cls, facet, value):
+        """Convert a Book field value to the facet value it is counted under."""
+        if facet == cls.DECADE:
+            return cls.decade_label(value.year)
+        return value
+
+
+class TransactionQuerySet(models.QuerySet):
+    def overdue(self, today=None):
+        """Open loans past their due date; a range over the open-loan due_date index."""
+        today = today or timezone.now().date()
+        return self.filter(return_date__isnull=True, due_date__lt=today)
+
+    def with_overdue(self, today=None):
+        """
+        Annotate ``overdue_days`` and ``accrued_penalty``: the SQL counterparts
+        of ``days_overdue`` and ``calculate_penalty()``, so they can be used in
+        filters and ordering.
+        """
+        today = today or timezone.now().date()
+        overdue_days = models.Case(
+            models.When(
+                return_date__isnull=True,
+                due_date__lt=today,
+                then=DaysBetween(models.Value(today, output_field=models.DateField()), F('due_date')),
+            ),
+            default=models.Value(0),
+            output_field=models.IntegerField(),
+        )
+        return self.annotate(overdue_days=overdue_days).annotate(
+            accrued_penalty=Least(
+                models.ExpressionWrapper(
+                    F('overdue_days') * models.Value(Transaction.PENALTY_RATE),
+                    output_field=models.DecimalField(max_digits=5, decimal_places=2),
+                ),
+                models.Value(Transaction.MAX_PENALTY),
+                output_field=models.DecimalField(max_digits=5, decimal_places=2),
+            )
+        )
+
+
+    @retry_on_locked
+    def pay_penalties(self, payment_method):
+        """
+        Pay every unpaid penalty among these loans, recording one
+        ``PenaltyPayment`` per patron, in one transaction.
+
+        A single ``UPDATE`` marks the loans paid and links them to their
+        patron's payment, and the payment amounts are then summed from the
+        linked rows, so a loan paid concurrently by another request is never
+        charged twice. Sends ``penalties_paid`` with the payments.
+
+        Returns:
+            list: The payments made, empty when nothing was owed
+        """
+        unpaid = self.filter(penalty_paid=False, penalty_amount__gt=0)
+        with db_transaction.atomic():
+            user_ids = list(unpaid.order_by().values_list('user_id', flat=True).distinct())
+            if not user_ids:
+                return []
+            payments = {
+                user_id: PenaltyPayment.objects.create(user_id=user_id, payment_method=payment_method)
+                for user_id in user_ids
+            }
+            unpaid.filter(user_id__in=user_ids).update(
+                penalty_paid=True,
+                payment=models.Case(
+                    *(models.When(user_id=user_id, then=models.Value(payment.pk))
+                      for user_id, payment in payments.items()),
+                    output_field=models.BigIntegerField(),
+                ),
+            )
+            totals = Transaction.objects.filter(payment__in=payments.values()).values('payment').annotate(
+                amount=models.Sum('penalty_amount'), loan_count=models.Count('id')
+            )
+            by_payment = {row['payment']: row for row in totals}
+            paid = []
+            for payment in payments.values():
+                row = by_payment.get(payment.pk)
+                if row is None:
+                    # Every loan was paid by someone else in the meantime.
+                    payment.delete()
+                    continue
+                payment.amount, payment.loan_count = row['amount'], row['loan_count']
+                paid.append(payment)
+            PenaltyPayment.objects.bulk_update(paid, ['amount', 'loan_count'])
+            if paid:
+                penalties_paid.send(sender=Transaction, payments=paid)
+        return paid
+
+
 class Transaction(models.Model):
     """
     Tracks the checkout, return, and penalties for books.
@@ -167,13 +643,48 @@ class Transaction(models.Model):
     )
     
     penalty_paid = models.BooleanField(default=False)
+    # The payment that settled the penalty
+    payment = models.ForeignKey(
+        'PenaltyPayment',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='transactions',
+    )
+    # The physical copy lent, when it was scanned at checkout
+    copy = models.ForeignKey(
+        'BookCopy',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='loans',
+        db_index=False,  # covered by the open-loan constraint and copy_loans_idx
+    )
+
+    objects = TransactionQuerySet.as_manager()
 
     class Meta:
         ordering = ['-checkout_date']
         indexes = [
-            models.Index(fields=['user']),
+            # Per-user loan lists come back in checkout order straight off the index
+            models.Index(fields=['user', 'checkout_date']),
             models.Index(fields=['book']),
             models.Index(fields=['due_date']),
+            # Overdue reports page through open loans only, in due date order
+            models.Index(
+                fields=['due_date', 'id'],
+                condition=models.Q(return_date__isnull=True),
+                name='open_loan_due_idx',
+            ),
+            models.Index(fields=['copy', 'checkout_date'], name='copy_loans_idx'),
+        ]
+        constraints = [
+            # A copy can only be on one open loan; also serves scan lookups
+            models.UniqueConstraint(
+                fields=['copy'],
+                condition=models.Q(return_date__isnull=True),
+                name='unique_open_loan_per_copy',
+            ),
         ]
 
     def __str__(self):
@@ -209,17 +720,26 @@ class Transaction(models.Model):
         self.penalty_amount = self.calculate_penalty()
         self.save()
     
-    def pay_penalty(self):
-        """Mark the penalty as paid."""
-        if self.penalty_amount > 0:
-            self.penalty_paid = True
-            self.save()
-    
+    def pay_penalty(self, payment_method=''):
+        """
+        Pay this loan's penalty, recording a ``PenaltyPayment``.
+
+        Returns:
+            bool: True if the penalty was paid, False if nothing was owed
+        """
+        payments = Transaction.objects.filter(pk=self.pk).pay_penalties(payment_method)
+        if not payments:
+            return False
+        self.penalty_paid, self.payment = True, payments[0]
+        return True
+
     def return_book(self):
         """Mark the transaction as returned and apply penalty calculation if needed."""
+        # Assess the penalty while the loan is still open; is_overdue is
+        # always False once return_date is set.
+        self.penalty_amount = self.calculate_penalty()
         self.return_date = timezone.now().date()
         self.transaction_type = self.TransactionType.RETURN
-        self.apply_penalty()
         self.save()
 
     def save(self, *args, **kwargs):
@@ -236,3 +756,775 @@ class Transaction(models.Model):
             book=book, 
             return_date__isnull=True
         ).first()
+
+
+class PenaltyPayment(models.Model):
+    """
+    One payment of a patron's penalties, covering one or more loans.
+
+    Made by ``TransactionQuerySet.pay_penalties()``; the loans it settled
+    are its ``transactions`` and, once archived, its ``archived_transactions``.
+    """
+
+    class Method(models.TextChoices):
+        CREDIT_CARD = 'credit_card', 'Credit card'
+        DEBIT_CARD = 'debit_card', 'Debit card'
+        MPESA = 'M-pesa', 'M-Pesa'
+        STAFF = 'staff', 'Recorded by staff'
+
+    # Methods patrons can pay with; STAFF is for payments taken at the desk
+    PATRON_METHODS = [Method.CREDIT_CARD, Method.DEBIT_CARD, Method.MPESA]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='penalty_payments')
+    amount = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    payment_method = models.CharField(max_length=20, choices=Method.choices, blank=True)
+    loan_count = models.PositiveIntegerField(default=0)
+    paid_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-paid_at']
+        indexes = [
+            models.Index(fields=['user', 'paid_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user} paid ${self.amount} for {self.loan_count} loans"
+
+
+class BookCooccurrenceManager(models.Manager):
+    # Only a patron's most recent distinct books take part in co-occurrence,
+    # which bounds the pair work for very heavy borrowers.
+    MAX_HISTORY = 200
+
+    def record_checkout(self, transaction):
+        """
+        Count ``transaction.book`` as borrowed together with every other book
+        the same patron has borrowed before.
+
+        A repeat borrow of a book adds nothing: pairs count distinct patrons.
+        """
+        book_id = transaction.book_id
+        user_id = transaction.user_id
+        borrowed_before = (
+            Transaction.objects.filter(user_id=user_id, book_id=book_id).exclude(pk=transaction.pk).exists()
+            or ArchivedTransaction.objects.filter(user_id=user_id, book_id=book_id).exists()
+        )
+        if borrowed_before:
+            return
+        others = self.patron_history(user_id, exclude=transaction.pk, limit=self.MAX_HISTORY)
+        if not others:
+            return
+
+        pairs = [(book_id, other) for other in others] + [(other, book_id) for other in others]
+        rows = self.filter(
+            models.Q(book_id=book_id, related_book_id__in=others)
+            | models.Q(book_id__in=others, related_book_id=book_id)
+        )
+        existing = set(rows.values_list('book_id', 'related_book_id'))
+        if existing:
+            rows.update(count=F('count') + 1)
+        self.bulk_create(
+            BookCooccurrence(book_id=a, related_book_id=b, count=1)
+            for a, b in pairs
+            if (a, b) not in existing
+        )
+
+    def patron_history(self, user_id, exclude=None, limit=None):
+        """
+        Return the patron's distinct borrowed book ids, most recent first.
+
+        Rows are read in chunks and reading stops once ``limit`` distinct
+        books have been seen, so a heavy borrower's older loans are never
+        fetched.
+        """
+        seen = {}
+        rows = ArchivedTransaction.objects.history(user_id, exclude=exclude)
+        for _, _, _, loan_book_id in rows.iterator(chunk_size=limit or 2000):
+            seen.setdefault(loan_book_id, None)
+            if limit is not None and len(seen) >= limit:
+                break
+        return list(seen)
+
+    def top_related(self, book_id, limit):
+        """Return the ``limit`` books most often borrowed with ``book_id``, best first."""
+        return (
+            self.filter(book_id=book_id)
+            .select_related('related_book')
+            .order_by('-count', 'related_book_id')[:limit]
+        )
+
+
+class BookCooccurrence(models.Model):
+    """
+    How many patrons borrowed both ``book`` and ``related_book``.
+
+    Each pair is stored in both directions so a book's top related titles are
+    a single range scan of the (book, -count, related_book) index. The table
+    is built by the ``build_cooccurrence`` command and then kept current on
+    every checkout.
+    """
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    related_book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    count = models.PositiveIntegerField(default=0)
+
+    objects = BookCooccurrenceManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'related_book'], name='unique_book_cooccurrence'),
+        ]
+        indexes = [
+            models.Index(fields=['book', '-count', 'related_book'], name='cooccurrence_top_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.book_id} ~ {self.related_book_id}: {self.count}"
+
+
+class BookBorrowCountManager(CounterManager):
+    def record_checkout(self, transaction):
+        """Count a checkout in its book's bucket for the checkout day."""
+        created = self.increment(
+            {'book_id': transaction.book_id, 'day': transaction.checkout_date},
+            count=1,
+        )
+        if created:
+            # A new bucket starts at most once per book per day, which makes
+            # it a cheap moment to drop buckets that fell out of retention.
+            self.prune(transaction.checkout_date)
+
+    def prune(self, today=None):
+        """Delete buckets older than RETENTION_DAYS."""
+        today = today or timezone.localdate()
+        cutoff = today - timedelta(days=BookBorrowCount.RETENTION_DAYS)
+        return self.filter(day__lt=cutoff).delete()[0]
+
+    def top(self, days, limit, today=None):
+        """
+        Return ``[(book_id, borrows), ...]`` for the ``limit`` most borrowed
+        books over the last ``days`` days, best first.
+        """
+        today = today or timezone.localdate()
+        since = today - timedelta(days=days - 1)
+        totals = {}
+        for book_id, count in self.filter(day__gte=since).values_list('book_id', 'count'):
+            totals[book_id] = totals.get(book_id, 0) + count
+        return heapq.nlargest(limit, totals.items(), key=lambda item: (item[1], -item[0]))
+
+
+class BookBorrowCount(models.Model):
+    """
+    Number of checkouts of a book on one day.
+
+    Rolling "popular this week/month" leaderboards merge a window of these
+    daily buckets instead of grouping the Transaction table. Buckets older
+    than RETENTION_DAYS are pruned as new ones are created.
+    """
+
+    RETENTION_DAYS = 90
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    day = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    objects = BookBorrowCountManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'book'], name='unique_book_borrow_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.book_id} on {self.day}: {self.count}"
+
+
+class DailyCirculationStatManager(CounterManager):
+    METRICS = ('checkouts', 'returns', 'overdue_returns', 'penalties_assessed', 'penalties_paid')
+
+    def record_checkout(self, transaction):
+        self.increment(
+            {'day': transaction.checkout_date, 'genre': transaction.book.genre},
+            checkouts=1,
+        )
+
+    def record_return(self, transaction):
+        overdue = transaction.return_date > transaction.due_date
+        self.increment(
+            {'day': transaction.return_date, 'genre': transaction.book.genre},
+            returns=1,
+            overdue_returns=int(overdue),
+            penalties_assessed=transaction.penalty_amount,
+        )
+
+    def record_payment(self, genre, amount, day=None):
+        self.increment(
+            {'day': day or timezone.localdate(), 'genre': genre},
+            penalties_paid=amount,
+        )
+
+    def summarize(self, start, end, genre=None, bucket='day'):
+        """
+        Sum the daily rows between ``start`` and ``end`` (inclusive) into
+        day or month buckets.
+
+        Returns:
+            list: One dict per bucket with every metric and the overdue rate
+        """
+        rows = self.filter(day__gte=start, day__lte=end)
+        if genre:
+            rows = rows.filter(genre=genre)
+
+        buckets = {}
+        for day, *values in rows.order_by('day').values_list('day', *self.METRICS):
+            key = day.replace(day=1) if bucket == 'month' else day
+            totals = buckets.setdefault(key, dict.fromkeys(self.METRICS, 0))
+            for metric, value in zip(self.METRICS, values):
+                totals[metric] += value
+
+        summary = []
+        for key, totals in buckets.items():
+            returns = totals['returns']
+            summary.append({
+                'period': key.strftime('%Y-%m') if bucket == 'month' else key.isoformat(),
+                **totals,
+                'overdue_rate': round(totals['overdue_returns'] / returns, 4) if returns else 0.0,
+            })
+        return summary
+
+
+class DailyCirculationStat(models.Model):
+    """
+    Circulation totals for one genre on one day.
+
+    Maintained incrementally by the checkout, return and penalty payment
+    signals, and rebuildable with the ``rebuild_circulation_stats`` command.
+
+    Attributes:
+        checkouts (int): Loans started that day
+        returns (int): Loans returned that day
+        overdue_returns (int): Returns that came back after their due date
+        penalties_assessed (Decimal): Penalties fixed on that day's returns
+        penalties_paid (Decimal): Penalty payments received that day
+    """
+
+    day = models.DateField()
+    genre = models.CharField(max_length=255)
+    checkouts = models.PositiveIntegerField(default=0)
+    returns = models.PositiveIntegerField(default=0)
+    overdue_returns = models.PositiveIntegerField(default=0)
+    penalties_assessed = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    penalties_paid = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+
+    objects = DailyCirculationStatManager()
+
+    class Meta:
+        ordering = ['day', 'genre']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'genre'], name='unique_circulation_day_genre'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.genre}"
+
+
+class ArchivedTransactionManager(models.Manager):
+    def history(self, user_id, exclude=None):
+        """
+        Return a patron's loans from the live and archive tables as one
+        queryset of ``(id, checkout_date, archived, book_id)`` rows, most
+        recent first.
+        """
+        live = Transaction.objects.filter(user_id=user_id).order_by()
+        if exclude is not None:
+            live = live.exclude(pk=exclude)
+        live = live.annotate(
+            archived=models.Value(False, output_field=models.BooleanField())
+        ).values_list('id', 'checkout_date', 'archived', 'book_id')
+        archived = self.filter(user_id=user_id).order_by().annotate(
+            archived=models.Value(True, output_field=models.BooleanField())
+        ).values_list('id', 'checkout_date', 'archived', 'book_id')
+        return live.union(archived, all=True).order_by('-checkout_date', '-id')
+
+    def load_history(self, rows):
+        """
+        Turn ``history()`` rows into Transaction and ArchivedTransaction
+        instances, in order. Live loans carry the ``with_overdue()``
+        annotations; archived ones are closed and never overdue.
+        """
+        live_ids = [row[0] for row in rows if not row[2]]
+        archived_ids = [row[0] for row in rows if row[2]]
+        live = Transaction.objects.with_overdue().select_related('book').in_bulk(live_ids)
+        archived = self.select_related('book').in_bulk(archived_ids)
+        return [(archived if row[2] else live)[row[0]] for row in rows]
+
+
+class ArchivedTransaction(models.Model):
+    """
+    A closed loan moved out of the live Transaction table by the
+    ``archive_transactions`` command.
+
+    Only returned loans whose penalty is paid or zero are archived, so an
+    archived loan is never overdue and never owes anything. The original
+    Transaction id is kept as the primary key.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_transactions')
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='archived_transactions')
+    transaction_type = models.CharField(
+        max_length=2,
+        choices=Transaction.TransactionType.choices,
+        default=Transaction.TransactionType.RETURN
+    )
+    checkout_date = models.DateField()
+    due_date = models.DateField(null=True, blank=True)
+    return_date = models.DateField()
+    penalty_amount = models.DecimalField(max_digits=5, decimal_places=2, default=Decimal('0.00'))
+    penalty_paid = models.BooleanField(default=False)
+    payment = models.ForeignKey(
+        PenaltyPayment,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='archived_transactions',
+    )
+    copy = models.ForeignKey(
+        BookCopy,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='archived_loans',
+    )
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ArchivedTransactionManager()
+
+    # Fields copied verbatim from Transaction when a loan is archived
+    COPIED_FIELDS = (
+        'id', 'user_id', 'book_id', 'transaction_type', 'checkout_date',
+        'due_date', 'return_date', 'penalty_amount', 'penalty_paid',
+        'payment_id', 'copy_id',
+    )
+
+    class Meta:
+        ordering = ['-checkout_date']
+        indexes = [
+            models.Index(fields=['user', 'checkout_date', 'id'], name='archived_txn_history_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} returned {self.book} (archived)"
+
+    @property
+    def is_overdue(self):
+        return False
+
+    @property
+    def days_overdue(self):
+        return 0
+
+    @classmethod
+    def closed_transactions(cls, before):
+        """Live transactions eligible for archiving: returned before ``before`` with nothing owed."""
+        return Transaction.objects.filter(
+            return_date__isnull=False,
+            return_date__lt=before,
+        ).filter(models.Q(penalty_paid=True) | models.Q(penalty_amount=0))
+
+
+class OutboxEventManager(models.Manager):
+    def emit(self, topic, instance, **payload):
+        """
+        Append an event about ``instance`` to the outbox.
+
+        Call it inside the transaction that makes the change, so the event is
+        committed (or rolled back) together with it.
+        """
+        return self.create(
+            topic=topic,
+            object_type=instance._meta.model_name,
+            object_id=instance.pk,
+            payload=payload,
+        )
+
+    def after(self, cursor, limit):
+        """Up to ``limit`` events with an id above ``cursor``, oldest first."""
+        return self.filter(pk__gt=cursor).order_by('pk')[:limit]
+
+    def compactable_position(self):
+        """The highest id every registered consumer has acknowledged, or None without consumers."""
+        return OutboxConsumer.objects.aggregate(position=models.Min('position'))['position']
+
+
+class OutboxEvent(models.Model):
+    """
+    A change to circulation or the catalogue, written in the same database
+    transaction as the change itself (the transactional outbox pattern).
+
+    Consumers read the feed in id order from ``/api/changes/`` and remember
+    the last id they processed; ``compact_outbox`` deletes events every
+    consumer has acknowledged.
+
+    Topics:
+        book.created, book.updated, book.deleted: ``Book`` edits, with the
+            book's catalogue fields
+        loan.checked_out, loan.returned: circulation, with the loan's dates
+            and any penalty assessed at return
+        penalty.paid: a loan's penalty was paid
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    topic = models.CharField(max_length=50)
+    object_type = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = OutboxEventManager()
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"#{self.pk} {self.topic} {self.object_type}:{self.object_id}"
+
+
+class OutboxConsumer(models.Model):
+    """
+    A downstream reader of the outbox and the last event id it has
+    acknowledged. Events are only compacted once every consumer is past them.
+    """
+
+    name = models.CharField(max_length=100, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
+
+
+class IndexVersionManager(CounterManager):
+    def bump(self, name):
+        """Record a change to the data behind in-memory index ``name``."""
+        self.increment({'name': name}, version=1)
+
+    def current(self, name):
+        """The version of index ``name``; 0 before its first change."""
+        return self.filter(name=name).values_list('version', flat=True).first() or 0
+
+
+class IndexVersion(models.Model):
+    """
+    A change counter for data that worker processes keep in memory.
+
+    Writers bump it in the transaction that changes the data; each worker
+    compares it with the version its copy was built from and rebuilds when
+    they differ.
+    """
+
+    name = models.CharField(max_length=50, unique=True)
+    version = models.BigIntegerField(default=0)
+
+    objects = IndexVersionManager()
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+
+class JobManager(models.Manager):
+    def enqueue(self, name, *args, run_at=None, max_attempts=None, **kwargs):
+        """Queue a call to the registered job ``name`` (see ``library.jobs``)."""
+        fields = {'name': name, 'args': list(args), 'kwargs': kwargs, 'run_at': run_at or timezone.now()}
+        if max_attempts is not None:
+            fields['max_attempts'] = max_attempts
+        return self.create(**fields)
+
+    def runnable(self, now, lock_timeout):
+        """
+        Jobs a worker may claim: queued jobs that are due, and running jobs
+        whose worker has held them longer than ``lock_timeout`` (it died).
+        """
+        return self.filter(
+            models.Q(status=Job.Status.QUEUED, run_at__lte=now)
+            | models.Q(status=Job.Status.RUNNING, locked_at__lt=now - lock_timeout)
+        ).order_by('run_at', 'id')
+
+    def stats(self, since=None):
+        """
+        Per job name: counts by status and the mean/max queue wait and run
+        time in milliseconds of finished jobs.
+        """
+        queryset = self.all()
+        if since is not None:
+            queryset = queryset.filter(created_at__gte=since)
+        rows = queryset.order_by().values('name').annotate(
+            queued=models.Count('id', filter=models.Q(status=Job.Status.QUEUED)),
+            running=models.Count('id', filter=models.Q(status=Job.Status.RUNNING)),
+            succeeded=models.Count('id', filter=models.Q(status=Job.Status.SUCCEEDED)),
+            failed=models.Count('id', filter=models.Q(status=Job.Status.FAILED)),
+            avg_wait_ms=models.Avg('wait_ms'),
+            avg_run_ms=models.Avg('duration_ms'),
+            max_run_ms=models.Max('duration_ms'),
+        )
+        return {row.pop('name'): row for row in rows}
+
+
+class Job(models.Model):
+    """
+    A unit of background work stored in the database and executed by the
+    ``run_workers`` command.
+
+    ``name`` refers to a function registered with ``library.jobs.job``; it is
+    called with ``args`` and ``kwargs``. Failed attempts are retried with
+    exponential backoff until ``max_attempts`` is reached.
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = 'queued', 'Queued'
+        RUNNING = 'running', 'Running'
+        SUCCEEDED = 'succeeded', 'Succeeded'
+        FAILED = 'failed', 'Failed'
+
+    name = models.CharField(max_length=100)
+    args = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    kwargs = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Timing of the last attempt: time spent waiting to be picked up after
+    # run_at, and time spent running
+    wait_ms = models.PositiveIntegerField(null=True, blank=True)
+    duration_ms = models.PositiveIntegerField(null=True, blank=True)
+
+    objects = JobManager()
+
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            # Workers look for the oldest due job of a given status
+            models.Index(fields=['status', 'run_at', 'id'], name='job_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.name} ({self.status})"
+
+
+class Reminder(models.Model):
+    """
+    A due-soon or overdue email sent about a loan by ``send_reminders``.
+
+    The command skips loans that already have a matching reminder, so it can
+    be re-run (or resumed after a failure) without emailing anyone twice.
+    """
+
+    class Kind(models.TextChoices):
+        DUE_SOON = 'due_soon', 'Due soon'
+        OVERDUE = 'overdue', 'Overdue'
+
+    transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, related_name='reminders')
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    sent_on = models.DateField()
+
+    class Meta:
+        constraints = [
+            # Also serves the dispatcher's "already reminded?" lookups
+            models.UniqueConstraint(fields=['transaction', 'kind', 'sent_on'], name='unique_reminder_per_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} reminder for {self.transaction_id} on {self.sent_on}"
+
+
+class BranchHoldingManager(models.Manager):
+    def for_branch(self, code):
+        """Holdings queryset on the shard of branch ``code``."""
+        return self.using(branch_database(code)).filter(branch_code=code)
+
+    @retry_on_locked
+    def checkout(self, code, book, user):
+        """
+        Lend a copy of ``book`` from branch ``code`` to ``user``.
+
+        Only the branch's own holding row is decremented, on the branch's
+        shard; the shared Book row is not touched.
+
+        Returns:
+            BranchLoan: The new loan; raises ValueError if the branch has no copy available
+        """
+        if not user.can_borrow_books():
+            raise ValueError("cannot checkout book because of unpaid penalties")
+        database = branch_database(code)
+        if not user.has_branch_loans:
+            # Flagged before the loan exists, so its penalties are never missed.
+            User.objects.filter(pk=user.pk).update(has_branch_loans=True)
+            user.has_branch_loans = True
+        with db_transaction.atomic(using=database):
+            taken = self.for_branch(code).filter(book=book, available_copies__gt=0).update(
+                available_copies=F('available_copies') - 1
+            )
+            if not taken:
+                raise ValueError("Book is not available at this branch")
+            loan = BranchLoan.objects.using(database).create(branch_code=code, book=book, user=user)
+            branch_loan_changed.send(sender=BranchLoan, loan=loan)
+        return loan
+
+    def availability(self, book_ids):
+        """
+        Merge every branch's holdings of ``book_ids`` into one view.
+
+        Returns:
+            dict: ``{book_id: {'total_copies', 'available_copies', 'branches': {code: available}}}``
+        """
+        merged = {
+            book_id: {'total_copies': 0, 'available_copies': 0, 'branches': {}}
+            for book_id in book_ids
+        }
+        for database, codes in branch_databases().items():
+            rows = self.using(database).filter(book_id__in=book_ids, branch_code__in=codes).values_list(
+                'branch_code', 'book_id', 'total_copies', 'available_copies'
+            )
+            for code, book_id, total, available in rows:
+                entry = merged[book_id]
+                entry['total_copies'] += total
+                entry['available_copies'] += available
+                entry['branches'][code] = available
+        return merged
+
+
+class BranchHolding(models.Model):
+    """
+    The copies of a catalogue book held by one branch.
+
+    Stored on the branch's database shard (see ``library.routers``), so
+    checkouts at different branches never contend on the same row. ``book``
+    refers to the shared catalogue without a database constraint.
+    """
+
+    branch_code = models.CharField(max_length=20)
+    book = models.ForeignKey(Book, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    total_copies = models.PositiveIntegerField(default=0)
+    available_copies = models.PositiveIntegerField(default=0)
+
+    objects = BranchHoldingManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['branch_code', 'book'], name='unique_branch_holding'),
+        ]
+
+    def __str__(self):
+        return f"{self.branch_code}: {self.available_copies}/{self.total_copies} of {self.book_id}"
+
+
+class BranchLoanManager(models.Manager):
+    def for_branch(self, code):
+        """Loans queryset on the shard of branch ``code``."""
+        return self.using(branch_database(code)).filter(branch_code=code)
+
+    def unpaid_total(self, user_id):
+        """A patron's unpaid branch penalties, summed over every branch shard."""
+        total = Decimal('0.00')
+        for database, codes in branch_databases().items():
+            total += self.using(database).filter(
+                branch_code__in=codes, user_id=user_id, penalty_paid=False, penalty_amount__gt=0
+            ).aggregate(total=models.Sum('penalty_amount'))['total'] or 0
+        return total
+
+
+class BranchLoan(models.Model):
+    """
+    A loan of a branch's copy, stored on the branch's shard next to its
+    holding. Penalties follow the same rules as ``Transaction``.
+    """
+
+    branch_code = models.CharField(max_length=20)
+    book = models.ForeignKey(Book, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    checkout_date = models.DateField(auto_now_add=True)
+    due_date = models.DateField()
+    return_date = models.DateField(null=True, blank=True)
+    penalty_amount = models.DecimalField(max_digits=5, decimal_places=2, default=Decimal('0.00'))
+    penalty_paid = models.BooleanField(default=False)
+    # The PenaltyPayment on the default database that settled the penalty
+    payment = models.ForeignKey(
+        PenaltyPayment, on_delete=models.DO_NOTHING, db_constraint=False,
+        null=True, blank=True, related_name='+'
+    )
+
+    objects = BranchLoanManager()
+
+    class Meta:
+        ordering = ['-checkout_date']
+        indexes = [
+            models.Index(fields=['branch_code', 'user', 'checkout_date'], name='branch_loan_user_idx'),
+        ]
+
+    def __str__(self):
+        status = "returned" if self.return_date else "checked out"
+        return f"{self.user_id} {status} {self.book_id} at {self.branch_code}"
+
+    def save(self, *args, **kwargs):
+        if not self.due_date:
+            self.due_date = timezone.now().date() + timedelta(days=Transaction.LOAN_PERIOD_DAYS)
+        super().save(*args, **kwargs)
+
+    def calculate_penalty(self, today=None):
+        today = today or timezone.now().date()
+        if self.return_date or today <= self.due_date:
+            return Decimal('0.00')
+        return min((today - self.due_date).days * Transaction.PENALTY_RATE, Transaction.MAX_PENALTY)
+
+    @retry_on_locked
+    def return_book(self):
+        """Close the loan, assess any penalty and put the copy back on the branch's shelf."""
+        if self.return_date:
+            raise ValueError("This loan has already been returned")
+        database = self._state.db
+        with db_transaction.atomic(using=database):
+            self.penalty_amount = self.calculate_penalty()
+            self.return_date = timezone.now().date()
+            self.save(using=database)
+            BranchHolding.objects.using(database).filter(
+                branch_code=self.branch_code, book_id=self.book_id
+            ).update(available_copies=F('available_copies') + 1)
+            branch_loan_changed.send(sender=BranchLoan, loan=self)
+        return self
+
+    @retry_on_locked
+    def pay_penalty(self, payment_method=''):
+        """
+        Pay this loan's penalty, recording a ``PenaltyPayment`` on the
+        default database.
+
+        The loan is marked paid by a conditional ``UPDATE`` on its shard, so
+        a concurrent payment of the same loan is never charged twice; the
+        shard commits first, so a failure can only leave a paid loan without
+        its receipt, never a charge for a loan still owed.
+
+        Returns:
+            bool: True if the penalty was paid, False if nothing was owed
+        """
+        database = self._state.db
+        with db_transaction.atomic():
+            payment = PenaltyPayment.objects.create(
+                user_id=self.user_id, payment_method=payment_method,
+                amount=self.penalty_amount, loan_count=1,
+            )
+            with db_transaction.atomic(using=database):
+                paid = BranchLoan.objects.using(database).filter(
+                    pk=self.pk, penalty_paid=False, penalty_amount__gt=0
+                ).update(penalty_paid=True, payment_id=payment.pk)
+                if not paid:
+                    payment.delete()
+                    return False
+                self.penalty_paid, self.payment = True, payment
+                branch_loan_changed.send(sender=BranchLoan, loan=self)
+        return True
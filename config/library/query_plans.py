@@ -0,0 +1,94 @@
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+FULL_SCAN = 'full_scan'
+TEMP_SORT = 'temp_sort'
+
+_SQLITE_SCAN = re.compile(r'^SCAN (?!CONSTANT ROW)(?:TABLE )?("?[\w]+"?)(?: AS (\w+))?(?P<index> USING .*)?$')
+_SQLITE_TEMP_BTREE = re.compile(r'USE TEMP B-TREE FOR (.*)')
+
+
+def explain(sql, params=(), using=DEFAULT_DB_ALIAS):
+    """
+    Return the database's plan for ``sql`` as a list of readable lines.
+
+    SQLite lines are the ``detail`` column of ``EXPLAIN QUERY PLAN``;
+    MySQL rows are rendered as ``table=... type=... key=... extra=...``.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+        cursor.execute(f'EXPLAIN {sql}', params)
+        columns = [col[0].lower() for col in cursor.description]
+        lines = []
+        for row in cursor.fetchall():
+            values = dict(zip(columns, row))
+            lines.append(
+                f"table={values.get('table')} type={values.get('type')} "
+                f"key={values.get('key')} extra={values.get('extra') or ''}"
+            )
+        return lines
+
+
+def plan_issues(plan, vendor='sqlite'):
+    """
+    Find full table scans and temporary sorts in a plan from ``explain()``.
+
+    Returns:
+        list: ``(kind, table)`` pairs; ``table`` is the table or alias named
+        in the plan, or None for a sort the plan does not attribute
+    """
+    issues = []
+    for line in plan:
+        if vendor == 'sqlite':
+            scan = _SQLITE_SCAN.match(line)
+            if scan and not scan.group('index'):
+                issues.append((FULL_SCAN, scan.group(2) or scan.group(1).strip('"')))
+            if _SQLITE_TEMP_BTREE.search(line):
+                issues.append((TEMP_SORT, None))
+        else:
+            table = re.search(r'table=(\S+)', line)
+            table = table.group(1) if table else None
+            if ' type=ALL ' in f'{line} ':
+                issues.append((FULL_SCAN, table))
+            if 'Using filesort' in line or 'Using temporary' in line:
+                issues.append((TEMP_SORT, table))
+    return issues
+
+
+def queryset_plan(queryset):
+    """Explain a queryset on the database it would run against."""
+    sql, params = queryset.query.sql_with_params()
+    return explain(sql, params, using=queryset.db)
+
+
+def hot_queries():
+    """
+    The circulation hot-path queries whose plans are snapshotted by the test
+    suite. Each entry maps a name to the queryset the application runs.
+    """
+    from .models import ArchivedTransaction, Book, BookBorrowCount, BookCooccurrence, BookCopy, Transaction
+
+    user_id = book_id = 1
+    return {
+        'active_loan_lookup': Transaction.objects.filter(
+            user_id=user_id, book_id=book_id, return_date__isnull=True
+        )[:1],
+        'unpaid_penalties': Transaction.objects.filter(
+            user_id=user_id, penalty_paid=False, penalty_amount__gt=0
+        ),
+        'available_books': Book.objects.filter(
+            status=Book.Status.AVAILABLE, available_copies__gt=0
+        ),
+        'book_list': Book.objects.all()[:30],
+        'user_transactions': Transaction.objects.filter(user_id=user_id)[:30],
+        'user_history': ArchivedTransaction.objects.history(user_id)[:30],
+        'related_books': BookCooccurrence.objects.top_related(book_id, 10),
+        'popular_window': BookBorrowCount.objects.filter(day__gte='2024-01-01').values_list('book_id', 'count'),
+        'author_books': Book.objects.filter(author_record_id=1)[:30],
+        'copy_scan': BookCopy.objects.with_open_loan().filter(barcode='0001'),
+        'overdue_report': Transaction.objects.overdue().with_overdue().order_by('due_date', 'id')[:50],
+    }
@@ -0,0 +1,173 @@
+from accounts.models import Profile
+from django.db import transaction as db_transaction
+from django.db.models import Sum
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import autocomplete, dashboard
+from .models import Book, BookBorrowCount, BookCooccurrence, BookFacetCount, DailyCirculationStat, IndexVersion, OutboxEvent, Transaction
+from .signals import book_checked_out, book_returned, branch_loan_changed, books_bulk_saved, penalties_paid
+
+
+@receiver(post_delete, sender=Book)
+def remove_book_from_facets(sender, instance, **kwargs):
+    """Take a deleted book out of the facet counts (covers queryset and admin deletes too)."""
+    BookFacetCount.objects.record(instance.facet_values(), None)
+
+
+def bump_autocomplete_version():
+    """
+    Tell every worker's autocomplete index the catalogue changed. The bump
+    commits with the change; this worker checks again right after commit.
+    """
+    IndexVersion.objects.bump(autocomplete.INDEX_NAME)
+    db_transaction.on_commit(autocomplete.index.invalidate)
+
+
+def autocomplete_fields_changed(book):
+    # Runs before save() refreshes _loaded_values, so they are still the old ones.
+    loaded = getattr(book, '_loaded_values', None)
+    return loaded is None or any(loaded.get(field) != getattr(book, field) for field in ('title', 'author'))
+
+
+@receiver(post_save, sender=Book)
+def reindex_saved_book(sender, instance, created, **kwargs):
+    # Checkouts and returns save the book too; only a new title or author matters.
+    if created or autocomplete_fields_changed(instance):
+        bump_autocomplete_version()
+
+
+@receiver(books_bulk_saved, sender=Book)
+def reindex_bulk_saved_books(sender, created, updated, **kwargs):
+    if created or any(autocomplete_fields_changed(book) for book in updated):
+        bump_autocomplete_version()
+
+
+@receiver(post_delete, sender=Book)
+def reindex_deleted_book(sender, instance, **kwargs):
+    bump_autocomplete_version()
+
+
+@receiver(book_checked_out)
+def update_cooccurrence(sender, transaction, **kwargs):
+    """Fold a new checkout into the "patrons also borrowed" counts."""
+    BookCooccurrence.objects.record_checkout(transaction)
+
+
+@receiver(book_checked_out)
+def count_borrow(sender, transaction, **kwargs):
+    """Add the checkout to its book's daily popularity bucket."""
+    BookBorrowCount.objects.record_checkout(transaction)
+
+
+@receiver(book_checked_out)
+def roll_up_checkout(sender, transaction, **kwargs):
+    DailyCirculationStat.objects.record_checkout(transaction)
+
+
+@receiver(book_returned)
+def roll_up_return(sender, transaction, **kwargs):
+    DailyCirculationStat.objects.record_return(transaction)
+
+
+@receiver(penalties_paid)
+def roll_up_payments(sender, payments, **kwargs):
+    """Add the paid penalties to today's rollups, one grouped query for all the loans."""
+    paid = Transaction.objects.filter(payment__in=payments).order_by().values('book__genre').annotate(
+        amount=Sum('penalty_amount')
+    )
+    for row in paid:
+        DailyCirculationStat.objects.record_payment(row['book__genre'], row['amount'])
+
+
+def book_payload(book):
+    return {
+        'title': book.title,
+        'author': book.author,
+        'author_id': book.author_record_id,
+        'isbn': book.isbn,
+        'genre': book.genre,
+        'status': book.status,
+        'total_copies': book.total_copies,
+        'available_copies': book.available_copies,
+    }
+
+
+def loan_payload(transaction):
+    return {
+        'book_id': transaction.book_id,
+        'user_id': transaction.user_id,
+        'checkout_date': transaction.checkout_date,
+        'due_date': transaction.due_date,
+        'return_date': transaction.return_date,
+        'penalty_amount': transaction.penalty_amount,
+    }
+
+
+@receiver(post_save, sender=Book)
+def publish_book_saved(sender, instance, created, **kwargs):
+    OutboxEvent.objects.emit('book.created' if created else 'book.updated', instance, **book_payload(instance))
+
+
+@receiver(books_bulk_saved, sender=Book)
+def publish_books_bulk_saved(sender, created, updated, **kwargs):
+    OutboxEvent.objects.bulk_create(
+        OutboxEvent(topic=topic, object_type='book', object_id=book.pk, payload=book_payload(book))
+        for topic, books in (('book.created', created), ('book.updated', updated))
+        for book in books
+    )
+
+
+@receiver(post_delete, sender=Book)
+def publish_book_deleted(sender, instance, **kwargs):
+    OutboxEvent.objects.emit('book.deleted', instance, **book_payload(instance))
+
+
+@receiver(book_checked_out)
+def publish_checkout(sender, transaction, **kwargs):
+    OutboxEvent.objects.emit('loan.checked_out', transaction, **loan_payload(transaction))
+
+
+@receiver(book_returned)
+def publish_return(sender, transaction, **kwargs):
+    OutboxEvent.objects.emit('loan.returned', transaction, **loan_payload(transaction))
+
+
+@receiver(penalties_paid)
+def publish_payments(sender, payments, **kwargs):
+    """One ``penalty.paid`` event per settled loan, written in one insert."""
+    loans = Transaction.objects.filter(payment__in=payments).order_by('pk').values_list(
+        'pk', 'user_id', 'book_id', 'penalty_amount', 'payment_id'
+    )
+    OutboxEvent.objects.bulk_create(
+        OutboxEvent(
+            topic='penalty.paid', object_type='transaction', object_id=pk,
+            payload={'user_id': user_id, 'book_id': book_id, 'amount': amount, 'payment_id': payment_id},
+        )
+        for pk, user_id, book_id, amount, payment_id in loans
+    )
+
+
+@receiver(book_checked_out)
+@receiver(book_returned)
+def invalidate_dashboard(sender, transaction, **kwargs):
+    """A circulation event changes the patron's dashboard; drop it once the change commits."""
+    db_transaction.on_commit(lambda: dashboard.invalidate(transaction.user_id))
+
+
+@receiver(penalties_paid)
+def invalidate_paid_dashboards(sender, payments, **kwargs):
+    user_ids = [payment.user_id for payment in payments]
+    db_transaction.on_commit(lambda: dashboard.invalidate(*user_ids))
+
+
+@receiver(branch_loan_changed)
+def invalidate_branch_dashboard(sender, loan, **kwargs):
+    # Branch loans are written on their shard, so wait for that commit.
+    db_transaction.on_commit(lambda: dashboard.invalidate(loan.user_id), using=loan._state.db)
+
+
+@receiver(post_save, sender=Profile)
+def invalidate_profile_dashboard(sender, instance, **kwargs):
+    if instance.user_id is not None:
+        db_transaction.on_commit(lambda: dashboard.invalidate(instance.user_id))
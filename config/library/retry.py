@@ -0,0 +1,46 @@
+import functools
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connections, models
+
+LOCKED_MESSAGES = ('database is locked', 'database table is locked')
+
+
+def is_locked_error(error):
+    """True for SQLite's "database is locked" errors, which are worth retrying."""
+    return isinstance(error, OperationalError) and any(message in str(error) for message in LOCKED_MESSAGES)
+
+
+def retry_on_locked(func):
+    """
+    Retry ``func`` when SQLite reports the database locked, up to
+    ``DB_LOCK_RETRY_ATTEMPTS`` attempts with exponential, fully jittered
+    sleeps so competing writers spread out instead of colliding again.
+
+    Only a whole transaction can be retried: when the error reaches us inside
+    an enclosing atomic block it is re-raised for that block's owner. Model
+    instances among the arguments (including ``self``) are reloaded before
+    each retry, so the retry starts from the committed rows rather than the
+    failed attempt's in-memory changes.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        attempts = max(getattr(settings, 'DB_LOCK_RETRY_ATTEMPTS', 5), 1)
+        base = getattr(settings, 'DB_LOCK_RETRY_BASE_DELAY', 0.05)
+        cap = getattr(settings, 'DB_LOCK_RETRY_MAX_DELAY', 1.0)
+        for attempt in range(1, attempts + 1):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as e:
+                in_transaction = any(
+                    connection.in_atomic_block for connection in connections.all(initialized_only=True)
+                )
+                if attempt == attempts or in_transaction or not is_locked_error(e):
+                    raise
+            time.sleep(random.uniform(0, min(base * 2 ** (attempt - 1), cap)))
+            for value in (*args, *kwargs.values()):
+                if isinstance(value, models.Model) and value.pk is not None:
+                    value.refresh_from_db()
+    return wrapper
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+BRANCH_MODELS = {'branchholding', 'branchloan'}
+
+
+def branch_database(code):
+    """The database alias holding branch ``code``'s holdings and loans."""
+    try:
+        return settings.LIBRARY_BRANCHES[code]
+    except KeyError:
+        raise LookupError(f'Unknown branch {code!r}')
+
+
+def branch_databases():
+    """Map each database alias to the branch codes stored in it."""
+    aliases = {}
+    for code, alias in settings.LIBRARY_BRANCHES.items():
+        aliases.setdefault(alias, []).append(code)
+    return aliases
+
+
+def is_branch_model(model):
+    return model._meta.app_label == 'library' and model._meta.model_name in BRANCH_MODELS
+
+
+class BranchRouter:
+    """
+    Route per-branch inventory and circulation to the branch's shard.
+
+    ``BranchHolding`` and ``BranchLoan`` instances are read and written on the
+    database of their ``branch_code`` (see ``LIBRARY_BRANCHES``); querysets
+    pick the shard with ``.using()``, usually via ``for_branch()``. Everything
+    else, including the shared catalogue, stays on the default database, and
+    shards only get the branch tables.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not is_branch_model(model):
+            return DEFAULT_DB_ALIAS
+        code = getattr(hints.get('instance'), 'branch_code', None)
+        if code in settings.LIBRARY_BRANCHES:
+            return settings.LIBRARY_BRANCHES[code]
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Branch rows point at catalogue and user rows on the default database.
+        if is_branch_model(obj1) or is_branch_model(obj2):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == DEFAULT_DB_ALIAS or db not in settings.LIBRARY_BRANCHES.values():
+            return None
+        return app_label == 'library' and model_name in BRANCH_MODELS
@@ -0,0 +1,25 @@
+from django.dispatch import Signal
+
+# Circulation events. They are sent inside the database transaction that
+# records the event, so receivers that write derived data (recommendations,
+# counters, rollups) commit or roll back together with it.
+
+# Sent by Book.checkout() with ``book``, ``user`` and ``transaction``.
+book_checked_out = Signal()
+
+# Sent by Book.return_book() with ``book``, ``user`` and ``transaction``
+# once the loan is closed and its penalty assessed.
+book_returned = Signal()
+
+# Sent by Transaction.objects.pay_penalties() with the ``payments`` made
+# (PenaltyPayment instances) once their loans are marked paid.
+penalties_paid = Signal()
+
+# Sent by Book.objects.bulk_save() with the ``created`` and ``updated`` books,
+# which bypass save() and so send no post_save.
+books_bulk_saved = Signal()
+
+# Sent by branch checkout, BranchLoan.return_book() and
+# BranchLoan.pay_penalty() with the ``loan``, inside the transaction on the
+# branch's shard.
+branch_loan_changed = Signal()
@@ -0,0 +1,31 @@
+from . import dashboard
+from .jobs import job
+from .models import PenaltyPayment, Transaction
+
+
+@job
+def recompute_penalties(batch_size=1000):
+    """Store the accrued penalty of every open overdue loan, computed in SQL."""
+    loans = Transaction.objects.overdue().with_overdue().order_by('due_date', 'id')
+    last = None
+    while True:
+        page = loans if last is None else loans.filter(
+            due_date__gte=last.due_date
+        ).exclude(due_date=last.due_date, id__lte=last.id)
+        batch = list(page[:batch_size])
+        if not batch:
+            break
+        for loan in batch:
+            loan.penalty_amount = loan.accrued_penalty
+        Transaction.objects.bulk_update(batch, ['penalty_amount'])
+        dashboard.invalidate(*(loan.user_id for loan in batch))
+        last = batch[-1]
+
+
+@job
+def mark_penalties_paid(transaction_ids):
+    """
+    Record staff payment of the given loans' penalties, one payment per
+    patron (the admin action; queued for large selections).
+    """
+    Transaction.objects.filter(pk__in=transaction_ids).pay_penalties(PenaltyPayment.Method.STAFF)
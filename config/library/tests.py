@@ -1,8 +1,33 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, OperationalError, connection, transaction as db_transaction
+from django.conf import settings
+from django.core import mail
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.utils import timezone
+from rest_framework.test import APITestCase
 from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
+import json
+import os
+import tempfile
+from pathlib import Path
 from decimal import Decimal
-from .models import User, Book, Transaction
+from api.models import IdempotencyKey
+from api.serializers import PenaltyReceiptSerializer
+from api.throttling import MemoryStore, SQLiteStore, get_store
+from . import autocomplete, dashboard
+from .isbn import normalize as normalize_isbn
+from . import jobs
+from .jobs import Worker, claim, job, run_job
+from .management.commands.seed_branch_holdings import Command as SeedBranchHoldings
+from .query_plans import FULL_SCAN, TEMP_SORT, hot_queries, plan_issues, queryset_plan
+from .retry import retry_on_locked
+from accounts.models import Profile
+from .models import User, ArchivedTransaction, Author, Book, BookBorrowCount, BookCooccurrence, BookFacetCount, DailyCirculationStat, BookCopy, BranchHolding, BranchLoan, IndexVersion, Job, OutboxConsumer, OutboxEvent, PenaltyPayment, Reminder, Transaction
 
 class PenaltySystemTests(TestCase):
     def setUp(self):
@@ -69,3 +94,1790 @@ class PenaltySystemTests(TestCase):
             transaction.apply_penalty()  # Assuming this method applies penalties
             
         self.assertFalse(self.user.can_borrow_books())
+
+    def test_stale_copies_of_a_book_cannot_lend_the_same_copy_twice(self):
+        first, second = Book.objects.get(pk=self.book.pk), Book.objects.get(pk=self.book.pk)
+        loan = first.checkout(self.user)
+
+        with self.assertRaises(ValueError):
+            second.checkout(self.user)
+        second.return_book(self.user, transaction=loan)
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 1)
+        self.assertEqual(self.book.status, Book.Status.AVAILABLE)
+
+
+class EstimatedCountPaginationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='reader@example.com',
+            first_name='Test',
+            last_name='Reader',
+            username='reader',
+            password='testpass'
+        )
+        self.client.force_authenticate(self.user)
+        for i in range(3):
+            Book.objects.create(
+                title=f'Book {i}',
+                author='Test Author',
+                isbn=f'978000000000{i}',
+                genre='Fiction',
+                publish_date='2023-01-01',
+                total_copies=1,
+                available_copies=1
+            )
+
+    def test_small_table_uses_exact_count(self):
+        response = self.client.get(reverse('book-list'))
+
+        self.assertEqual(response.data['count'], 3)
+        self.assertFalse(response.data['count_is_approximate'])
+
+    @override_settings(PAGINATION_ESTIMATE_THRESHOLD=2)
+    def test_large_unfiltered_table_uses_estimate(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        response = self.client.get(reverse('book-list'), {'limit': 2})
+
+        self.assertTrue(response.data['count_is_approximate'])
+        self.assertEqual(response.data['count'], 3)
+        self.assertIsNotNone(response.data['next'])
+
+    @override_settings(PAGINATION_ESTIMATE_THRESHOLD=0)
+    def test_filtered_queryset_uses_exact_count(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        response = self.client.get(reverse('transaction-list'))
+
+        self.assertEqual(response.data['count'], 0)
+        self.assertFalse(response.data['count_is_approximate'])
+
+
+class AuthorTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='reader@example.com',
+            first_name='Test',
+            last_name='Reader',
+            username='reader',
+            password='testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.first = Book.objects.create(
+            title='Weep Not, Child',
+            author="Ngũgĩ wa Thiong'o",
+            isbn='9780143106692',
+            genre='African Literature',
+            publish_date='1964-01-17',
+            total_copies=1,
+            available_copies=1
+        )
+        self.second = Book.objects.create(
+            title='A Grain of Wheat',
+            author="Ngugi wa Thiong’o",
+            isbn='9780143106760',
+            genre='African Literature',
+            publish_date='1967-06-30',
+            total_copies=1,
+            available_copies=1
+        )
+
+    def test_spelling_variants_share_one_author(self):
+        self.assertEqual(Author.objects.count(), 1)
+        self.assertEqual(self.first.author_record, self.second.author_record)
+        self.assertEqual(self.second.author, "Ngugi wa Thiong’o")
+
+    def test_changing_author_name_relinks_book(self):
+        self.second.author = 'Another Author'
+        self.second.save()
+
+        self.assertNotEqual(self.second.author_record, self.first.author_record)
+
+    def test_author_books_endpoint(self):
+        author = self.first.author_record
+        response = self.client.get(reverse('author-books', kwargs={'pk': author.pk}))
+
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(
+            {book['author_id'] for book in response.data['results']},
+            {author.pk}
+        )
+
+
+class BookFacetTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='reader@example.com',
+            first_name='Test',
+            last_name='Reader',
+            username='reader',
+            password='testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.novel = Book.objects.create(
+            title='Weep Not, Child',
+            author="Ngũgĩ wa Thiong'o",
+            isbn='9780143106692',
+            genre='Fiction',
+            publish_date='1964-01-17',
+            total_copies=1,
+            available_copies=1
+        )
+        self.science = Book.objects.create(
+            title='Cosmos',
+            author='Carl Sagan',
+            isbn='9780345539434',
+            genre='Science',
+            publish_date='1980-09-28',
+            total_copies=2,
+            available_copies=2
+        )
+
+    def test_counts_follow_writes_and_circulation(self):
+        self.novel.checkout(self.user)
+        self.science.genre = 'Astronomy'
+        self.science.save()
+
+        facets = BookFacetCount.objects.as_dict()
+        self.assertEqual(facets['genre'], {'Fiction': 1, 'Astronomy': 1})
+        self.assertEqual(facets['status'], {'C': 1, 'A': 1})
+        self.assertEqual(facets['decade'], {'1960s': 1, '1980s': 1})
+
+        self.science.delete()
+        self.assertEqual(BookFacetCount.objects.as_dict()['genre'], {'Fiction': 1})
+
+    def test_incremental_counts_match_rebuild(self):
+        self.novel.checkout(self.user)
+        incremental = BookFacetCount.objects.as_dict()
+
+        BookFacetCount.objects.rebuild()
+
+        self.assertEqual(BookFacetCount.objects.as_dict(), incremental)
+
+    def test_facets_endpoint_accepts_list_filters(self):
+        url = reverse('book-facets')
+
+        response = self.client.get(url)
+        self.assertEqual(response.data['total'], 2)
+
+        response = self.client.get(url, {'decade': '1960s'})
+        self.assertEqual(response.data['total'], 1)
+        self.assertEqual(response.data['genre'], {'Fiction': 1})
+
+        response = self.client.get(reverse('book-list'), {'genre': 'Science'})
+        self.assertEqual(response.data['count'], 1)
+
+
+class BookCooccurrenceTests(APITestCase):
+    def setUp(self):
+        self.readers = [
+            User.objects.create_user(
+                email=f'reader{i}@example.com',
+                first_name='Test',
+                last_name='Reader',
+                username=f'reader{i}',
+                password='testpass'
+            )
+            for i in range(3)
+        ]
+        self.client.force_authenticate(self.readers[0])
+        self.books = [
+            Book.objects.create(
+                title=f'Book {i}',
+                author='Test Author',
+                isbn=f'978000000000{i}',
+                genre='Fiction',
+                publish_date='2023-01-01',
+                total_copies=5,
+                available_copies=5
+            )
+            for i in range(3)
+        ]
+
+    def borrow(self, reader, *books):
+        for book in books:
+            book.refresh_from_db()
+            book.checkout(reader)
+
+    def test_incremental_counts_match_batch_rebuild(self):
+        first, second, third = self.books
+        self.borrow(self.readers[0], first, second, third)
+        self.borrow(self.readers[1], first, second)
+        self.borrow(self.readers[2], second, second, third)
+
+        incremental = set(BookCooccurrence.objects.values_list('book_id', 'related_book_id', 'count'))
+        call_command('build_cooccurrence', stdout=StringIO())
+        rebuilt = set(BookCooccurrence.objects.values_list('book_id', 'related_book_id', 'count'))
+
+        self.assertEqual(incremental, rebuilt)
+        self.assertIn((first.pk, second.pk, 2), rebuilt)
+
+    def test_checkout_pairs_only_the_most_recent_books(self):
+        first, second, third = self.books
+        with mock.patch.object(type(BookCooccurrence.objects), 'MAX_HISTORY', 1):
+            self.borrow(self.readers[0], first, second, third)
+            # Outside the window, but still a repeat borrow.
+            self.borrow(self.readers[0], first)
+
+        self.assertEqual(
+            set(BookCooccurrence.objects.values_list('book_id', 'related_book_id', 'count')),
+            {(first.pk, second.pk, 1), (second.pk, first.pk, 1),
+             (second.pk, third.pk, 1), (third.pk, second.pk, 1)}
+        )
+        self.assertEqual(
+            BookCooccurrence.objects.patron_history(self.readers[0].pk, limit=2),
+            [first.pk, third.pk]
+        )
+
+    def test_related_endpoint_returns_top_books(self):
+        first, second, third = self.books
+        self.borrow(self.readers[0], first, second, third)
+        self.borrow(self.readers[1], first, second)
+
+        response = self.client.get(reverse('book-related', kwargs={'pk': first.pk}))
+
+        self.assertEqual(
+            [(book['id'], book['borrowed_together']) for book in response.data['results']],
+            [(second.pk, 2), (third.pk, 1)]
+        )
+
+
+class PopularBooksTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='reader@example.com',
+            first_name='Test',
+            last_name='Reader',
+            username='reader',
+            password='testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.books = [
+            Book.objects.create(
+                title=f'Book {i}',
+                author='Test Author',
+                isbn=f'978000000000{i}',
+                genre='Fiction',
+                publish_date='2023-01-01',
+                total_copies=5,
+                available_copies=5
+            )
+            for i in range(3)
+        ]
+
+    def test_popular_merges_buckets_in_window(self):
+        today = timezone.localdate()
+        first, second, third = self.books
+        BookBorrowCount.objects.create(book=first, day=today - timedelta(days=10), count=9)
+        BookBorrowCount.objects.create(book=second, day=today - timedelta(days=2), count=2)
+        BookBorrowCount.objects.create(book=second, day=today, count=1)
+        third.checkout(self.user)
+
+        response = self.client.get(reverse('book-popular'), {'window': '7d'})
+        self.assertEqual(
+            [(book['id'], book['borrow_count']) for book in response.data['results']],
+            [(second.pk, 3), (third.pk, 1)]
+        )
+
+        response = self.client.get(reverse('book-popular'), {'window': '2w', 'limit': 1})
+        self.assertEqual([book['id'] for book in response.data['results']], [first.pk])
+
+    def test_expired_buckets_are_pruned(self):
+        old_day = timezone.localdate() - timedelta(days=BookBorrowCount.RETENTION_DAYS + 1)
+        BookBorrowCount.objects.create(book=self.books[0], day=old_day, count=4)
+
+        self.books[1].checkout(self.user)
+
+        self.assertFalse(BookBorrowCount.objects.filter(day=old_day).exists())
+
+    def test_invalid_window_is_rejected(self):
+        response = self.client.get(reverse('book-popular'), {'window': '1y'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CirculationStatsTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='reader@example.com',
+            first_name='Test',
+            last_name='Reader',
+            username='reader',
+            password='testpass'
+        )
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_authenticate(self.user)
+        self.book = Book.objects.create(
+            title='Test Book',
+            author='Test Author',
+            isbn='1234567890123',
+            genre='Fiction',
+            publish_date='2023-01-01',
+            total_copies=2,
+            available_copies=2
+        )
+
+    def circulate(self):
+        late = self.book.checkout(self.user)
+        late.due_date = timezone.now().date() - timedelta(days=5)
+        late.save()
+        self.book.return_book(self.user)
+        self.book.checkout(self.user)
+        late.refresh_from_db()
+        late.pay_penalty()
+
+    def stat_values(self):
+        return list(DailyCirculationStat.objects.values_list(
+            'day', 'genre', *DailyCirculationStat.objects.METRICS
+        ))
+
+    def test_events_update_rollups(self):
+        self.circulate()
+
+        stat = DailyCirculationStat.objects.get()
+        self.assertEqual((stat.checkouts, stat.returns, stat.overdue_returns), (2, 1, 1))
+        self.assertEqual(stat.penalties_assessed, Decimal('5.00'))
+        self.assertEqual(stat.penalties_paid, Decimal('5.00'))
+
+    def test_rebuild_matches_incremental_rollups(self):
+        self.circulate()
+        incremental = self.stat_values()
+
+        call_command('rebuild_circulation_stats', stdout=StringIO())
+
+        self.assertEqual(self.stat_values(), incremental)
+
+    def test_rebuild_counts_payments_on_the_day_they_were_paid(self):
+        late = self.book.checkout(self.user)
+        late.due_date = timezone.now().date() - timedelta(days=5)
+        late.save()
+        self.book.return_book(self.user)
+        late.refresh_from_db()
+        later = timezone.now() + timedelta(days=3)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            late.pay_penalty('credit_card')
+        incremental = self.stat_values()
+        self.assertEqual(
+            [(day, paid) for day, _, _, _, _, _, paid in incremental],
+            [(timezone.localdate(), Decimal('0.00')), (timezone.localdate(later), Decimal('5.00'))]
+        )
+
+        call_command('rebuild_circulation_stats', stdout=StringIO())
+
+        self.assertEqual(self.stat_values(), incremental)
+
+    def test_stats_endpoint(self):
+        self.circulate()
+
+        response = self.client.get(reverse('circulation-stats'), {'bucket': 'month'})
+
+        self.assertEqual(response.status_code, 200)
+        [month] = response.data['results']
+        self.assertEqual(month['checkouts'], 2)
+        self.assertEqual(month['overdue_rate'], 1.0)
+
+
+class ArchiveTransactionsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='reader@example.com',
+            first_name='Test',
+            last_name='Reader',
+            username='reader',
+            password='testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.book = Book.objects.create(
+            title='Test Book',
+            author='Test Author',
+            isbn='1234567890123',
+            genre='Fiction',
+            publish_date='2023-01-01',
+            total_copies=3,
+            available_copies=3
+        )
+        long_ago = timezone.now().date() - timedelta(days=400)
+        self.closed = Transaction.objects.create(
+            user=self.user, book=self.book, due_date=long_ago, return_date=long_ago
+        )
+        self.unpaid = Transaction.objects.create(
+            user=self.user, book=self.book, due_date=long_ago, return_date=long_ago,
+            penalty_amount=Decimal('3.00')
+        )
+        self.active = self.book.checkout(self.user)
+
+    def test_only_old_closed_loans_are_archived(self):
+        call_command('archive_transactions', '--batch-size', '1', '--sleep', '0', stdout=StringIO())
+
+        self.assertEqual(list(ArchivedTransaction.objects.values_list('id', flat=True)), [self.closed.pk])
+        self.assertEqual(
+            set(Transaction.objects.values_list('id', flat=True)),
+            {self.unpaid.pk, self.active.pk}
+        )
+
+    def test_archived_loans_keep_their_payment_and_copy(self):
+        copy = BookCopy.objects.create(book=self.book, barcode='LIB-0001')
+        Transaction.objects.filter(pk=self.unpaid.pk).update(copy=copy)
+        self.assertTrue(self.unpaid.pay_penalty('credit_card'))
+
+        call_command('archive_transactions', '--sleep', '0', stdout=StringIO())
+
+        archived = ArchivedTransaction.objects.get(pk=self.unpaid.pk)
+        self.assertEqual((archived.payment, archived.copy), (self.unpaid.payment, copy))
+        receipt = PenaltyReceiptSerializer(archived.payment).data
+        self.assertEqual((receipt['loan_count'], receipt['transactions']), (1, [self.unpaid.pk]))
+
+    def test_history_spans_live_and_archived_loans(self):
+        call_command('archive_transactions', '--sleep', '0', stdout=StringIO())
+
+        response = self.client.get(reverse('transaction-list'))
+
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(
+            [row['id'] for row in response.data['results']],
+            [self.active.pk, self.unpaid.pk, self.closed.pk]
+        )
+        self.assertEqual(response.data['results'][2]['book_title'], 'Test Book')
+
+
+class OverdueReportTests(APITestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(
+            email='staff@example.com',
+            first_name='Staff',
+            last_name='User',
+            username='staff',
+            password='testpass'
+        )
+        self.staff.is_staff = True
+        self.staff.save()
+        self.reader = User.objects.create_user(
+            email='reader@example.com',
+            first_name='Test',
+            last_name='Reader',
+            username='reader',
+            password='testpass'
+        )
+        self.book = Book.objects.create(
+            title='Test Book',
+            author='Test Author',
+            isbn='1234567890123',
+            genre='Fiction',
+            publish_date='2023-01-01',
+            total_copies=5,
+            available_copies=5
+        )
+        today = timezone.now().date()
+        self.loans = {
+            days: Transaction.objects.create(
+                user=self.reader, book=self.book, due_date=today - timedelta(days=days)
+            )
+            for days in (3, 90, 30)
+        }
+        Transaction.objects.create(user=self.reader, book=self.book, due_date=today + timedelta(days=5))
+        Transaction.objects.create(
+            user=self.reader, book=self.book, due_date=today - timedelta(days=10), return_date=today
+        )
+
+    def test_annotations_match_the_python_properties(self):
+        for loan in Transaction.objects.with_overdue():
+            with self.subTest(due_date=loan.due_date):
+                self.assertEqual(loan.overdue_days, loan.days_overdue)
+                self.assertEqual(loan.accrued_penalty, loan.calculate_penalty())
+
+    def test_report_orders_and_pages_by_days_overdue(self):
+        self.client.force_authenticate(self.staff)
+
+        first = self.client.get(reverse('transaction-overdue'), {'limit': 2})
+        second = self.client.get(first.data['next'])
+
+        self.assertEqual([row['days_overdue'] for row in first.data['results']], [90, 30])
+        self.assertEqual(first.data['results'][0]['accrued_penalty'], '60.00')
+        self.assertEqual([row['days_overdue'] for row in second.data['results']], [3])
+
+        response = self.client.get(reverse('transaction-overdue'), {'order': 'days_overdue', 'min_days': 10})
+        self.assertEqual([row['days_overdue'] for row in response.data['results']], [30, 90])
+
+    def test_patron_history_reads_overdue_days_from_sql(self):
+        self.client.force_authenticate(self.reader)
+        not_in_python = mock.PropertyMock(side_effect=AssertionError('days_overdue computed in Python'))
+
+        with mock.patch.object(Transaction, 'days_overdue', not_in_python):
+            response = self.client.get(reverse('transaction-list'))
+            detail = self.client.get(reverse('transaction-detail', args=[self.loans[30].pk]))
+
+        self.assertEqual(
+            sorted(row['days_overdue'] for row in response.data['results']), [0, 0, 3, 30, 90]
+        )
+        self.assertEqual(detail.data['days_overdue'], 30)
+
+    def test_report_is_staff_only(self):
+        self.client.force_authenticate(self.reader)
+
+        self.assertEqual(self.client.get(reverse('transaction-overdue')).status_code, 403)
+
+
+class OutboxTests(APITestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(
+            email='staff@example.com',
+            first_name='Staff',
+            last_name='User',
+            username='staff',
+            password='testpass'
+        )
+        self.staff.is_staff = True
+        self.staff.save()
+        self.client.force_authenticate(self.staff)
+        self.book = Book.objects.create(
+            title='Test Book',
+            author='Test Author',
+            isbn='1234567890123',
+            genre='Fiction',
+            publish_date='2023-01-01',
+            total_copies=1,
+            available_copies=1
+        )
+
+    def test_circulation_writes_events_in_order(self):
+        loan = self.book.checkout(self.staff)
+        self.book.return_book(self.staff)
+
+        topics = list(OutboxEvent.objects.values_list('topic', flat=True))
+        self.assertEqual(topics, [
+            'book.created', 'book.updated', 'loan.checked_out', 'book.updated', 'loan.returned',
+        ])
+        returned = OutboxEvent.objects.get(topic='loan.returned')
+        self.assertEqual((returned.object_type, returned.object_id), ('transaction', loan.pk))
+        self.assertEqual(returned.payload['penalty_amount'], '0.00')
+
+    def test_failed_checkout_leaves_no_event(self):
+        self.book.checkout(self.staff)
+        before = OutboxEvent.objects.count()
+
+        with self.assertRaises(ValueError):
+            self.book.checkout(self.staff)
+
+        self.assertEqual(OutboxEvent.objects.count(), before)
+
+    def test_feed_pages_by_cursor_and_compacts_acknowledged_events(self):
+        self.book.checkout(self.staff)
+        ids = list(OutboxEvent.objects.values_list('id', flat=True))
+
+        first = self.client.get(reverse('change-feed'), {'limit': 2, 'consumer': 'search'})
+        second = self.client.get(reverse('change-feed'), {'after': first.data['next'], 'consumer': 'search'})
+
+        self.assertEqual([event['id'] for event in first.data['results']], ids[:2])
+        self.assertTrue(first.data['has_more'])
+        self.assertEqual([event['id'] for event in second.data['results']], ids[2:])
+        self.assertFalse(second.data['has_more'])
+        self.assertEqual(OutboxConsumer.objects.get(name='search').position, ids[1])
+
+        call_command('compact_outbox', '--sleep', '0', stdout=StringIO())
+        self.assertEqual(list(OutboxEvent.objects.values_list('id', flat=True)), ids[2:])
+
+
+@job(name='tests.fail', max_attempts=2)
+def failing_job():
+    raise RuntimeError('boom')
+
+
+class TemporaryDashboardCacheMixin:
+    """Give each test its own dashboard cache directory, never the server's."""
+
+    def setUp(self):
+        location = self.enterContext(tempfile.TemporaryDirectory(prefix='dashboard-cache-'))
+        self.enterContext(override_settings(CACHES={
+            **settings.CACHES,
+            'dashboard': {**settings.CACHES['dashboard'], 'LOCATION': location},
+        }))
+        super().setUp()
+
+
+class DashboardTests(TemporaryDashboardCacheMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            email='patron@example.com',
+            first_name='Test',
+            last_name='Patron',
+            username='patron',
+            password='testpass'
+        )
+        Profile.objects.create(user=self.user, bio='Reads a lot')
+        self.client.force_authenticate(self.user)
+        self.books = [
+            Book.objects.create(
+                title=f'Test Book {n}',
+                author='Test Author',
+                isbn=f'978030640615{n}',
+                genre='Fiction',
+                publish_date='2023-01-01',
+                total_copies=1,
+                available_copies=1
+            )
+            for n in range(3)
+        ]
+
+    def test_dashboard_in_fixed_queries_and_cached(self):
+        late = self.books[0].checkout(self.user)
+        late.due_date = timezone.now().date() - timedelta(days=4)
+        late.save()
+        self.books[1].checkout(self.user)
+
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('me-dashboard'))
+
+        data = response.data
+        self.assertEqual(len(data['loans']), 2)
+        self.assertEqual(data['loans'][0]['id'], late.pk)
+        self.assertTrue(data['loans'][0]['is_overdue'])
+        self.assertEqual(data['overdue_count'], 1)
+        self.assertEqual(data['penalties']['accruing'], Decimal('4.00'))
+        self.assertTrue(data['can_borrow'])
+        self.assertEqual(data['profile']['bio'], 'Reads a lot')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('me-dashboard')).data, data)
+
+    def test_circulation_events_invalidate_the_cache(self):
+        self.assertEqual(self.client.get(reverse('me-dashboard')).data['loans'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.books[2].checkout(self.user)
+
+        loans = self.client.get(reverse('me-dashboard')).data['loans']
+        self.assertEqual([loan['book'] for loan in loans], [self.books[2].pk])
+
+    def test_dashboard_invalidated_while_it_is_built_is_not_cached(self):
+        penalty_totals = dashboard.penalty_totals
+
+        def checkout_meanwhile(user):
+            # Another request's checkout commits between our reads and the cache write.
+            dashboard.invalidate(user.pk)
+            return penalty_totals(user)
+
+        with mock.patch.object(dashboard, 'penalty_totals', checkout_meanwhile):
+            self.client.get(reverse('me-dashboard'))
+
+        with self.assertNumQueries(3):
+            self.client.get(reverse('me-dashboard'))
+        with self.assertNumQueries(0):
+            self.client.get(reverse('me-dashboard'))
+
+
+class BatchTests(TemporaryDashboardCacheMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            email='patron@example.com',
+            first_name='Test',
+            last_name='Patron',
+            username='patron',
+            password='testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.book = Book.objects.create(
+            title='Test Book',
+            author='Test Author',
+            isbn='9780306406157',
+            genre='Fiction',
+            publish_date='2023-01-01',
+            total_copies=1,
+            available_copies=1
+        )
+        self.book.checkout(self.user)
+
+    def test_runs_sub_requests_as_the_caller(self):
+        response = self.client.post(reverse('batch'), {'requests': [
+            {'id': 'book', 'path': f'/api/books/{self.book.pk}/'},
+            {'id': 'me', 'path': '/api/me/dashboard/'},
+            {'id': 'search', 'path': '/api/books/?search=Test'},
+            {'id': 'missing', 'path': '/api/books/999999/'},
+            {'id': 'unknown', 'path': '/api/nowhere/'},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['complete'])
+        results = {item['id']: item for item in response.data['results']}
+        self.assertEqual(results['book']['status'], 200)
+        self.assertEqual(results['book']['body']['isbn'], '9780306406157')
+        self.assertEqual(len(results['me']['body']['loans']), 1)
+        self.assertEqual(results['search']['body']['results'][0]['id'], self.book.pk)
+        self.assertEqual(results['missing']['status'], 404)
+        self.assertEqual(results['unknown']['status'], 404)
+
+        # Sub-requests see the caller's permissions, not more.
+        staff_only = self.client.post(reverse('batch'), ['/api/transactions/overdue/'], format='json')
+        self.assertEqual(staff_only.data['results'][0]['status'], 403)
+
+    def test_rejects_malformed_batches(self):
+        for body in ([], [{'path': '/api/books/', 'method': 'POST'}], ['/api/books/'] * 21,
+                     [{'id': 'a', 'path': '/api/books/'}, {'id': 'a', 'path': '/api/authors/'}]):
+            response = self.client.post(reverse('batch'), body, format='json')
+            self.assertEqual(response.status_code, 400, body)
+
+        response = self.client.post(reverse('batch'), ['/admin/', '/api/batch/'], format='json')
+        self.assertEqual([item['status'] for item in response.data['results']], [400, 400])
+
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.post(reverse('batch'), ['/api/books/'], format='json').status_code, 401)
+
+    def test_requests_past_the_budget_are_not_run(self):
+        response = self.client.post(
+            reverse('batch'), {'requests': ['/api/books/', '/api/authors/'], 'budget_ms': 0}, format='json'
+        )
+        self.assertFalse(response.data['complete'])
+        self.assertEqual([item['status'] for item in response.data['results']], [504, 504])
+
+
+class AutocompleteTests(APITestCase):
+    def setUp(self):
+        # Test rollbacks rewind IndexVersion, so never reuse another test's index.
+        autocomplete.index.reset()
+        self.user = User.objects.create_user(
+            email='patron@example.com',
+            first_name='Test',
+            last_name='Patron',
+            username='patron',
+            password='testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.books = [
+            Book.objects.create(
+                title=title,
+                author=author,
+                isbn=f'978030640615{n}',
+                genre='Fiction',
+                publish_date='2023-01-01',
+                total_copies=1,
+                available_copies=1
+            )
+            for n, (title, author) in enumerate([
+                ('The Rings of Saturn', 'W. G. Sebald'),
+                ('Petals of Blood', 'Ngũgĩ wa Thiong’o'),
+                ('Ringworld', 'Larry Niven'),
+            ])
+        ]
+
+    def suggest(self, q, **params):
+        response = self.client.get(reverse('book-autocomplete'), {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_matches_word_starts_accent_folded(self):
+        saturn, petals, ringworld = self.books
+        self.assertEqual(self.suggest('ngugi'), [petals.pk])
+        self.assertEqual(self.suggest('THIONG\'O'), [petals.pk])
+        # Titles starting with the prefix come before inner word matches.
+        self.assertEqual(self.suggest('ring'), [ringworld.pk, saturn.pk])
+        self.assertEqual(self.suggest('ring', limit=1), [ringworld.pk])
+        self.assertEqual(self.suggest('the r'), [saturn.pk])
+        self.assertEqual(self.suggest(''), [])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest('sebald'), [saturn.pk])
+
+    def test_follows_catalogue_changes(self):
+        saturn, petals, ringworld = self.books
+        self.assertEqual(self.suggest('austerlitz'), [])
+        version = IndexVersion.objects.current(autocomplete.INDEX_NAME)
+
+        # Circulation saves the book but leaves the index alone.
+        saturn.checkout(self.user)
+        self.assertEqual(IndexVersion.objects.current(autocomplete.INDEX_NAME), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            saturn.title = 'Austerlitz'
+            saturn.save()
+        self.assertEqual(self.suggest('austerlitz'), [saturn.pk])
+
+        # Another worker's change: only the shared version moves here.
+        Book.objects.filter(pk=ringworld.pk).delete()
+        self.assertEqual(self.suggest('ringworld'), [ringworld.pk])
+        with override_settings(AUTOCOMPLETE_VERSION_CHECK_SECONDS=0):
+            self.assertEqual(self.suggest('ringworld'), [])
+
+    def test_lookups_during_a_rebuild_use_the_previous_index(self):
+        saturn, petals, ringworld = self.books
+        self.assertEqual(self.suggest('ringworld'), [ringworld.pk])
+        autocomplete.index.invalidate()
+
+        # Another thread holds the lock while it rebuilds.
+        with autocomplete.index.lock, self.assertNumQueries(0):
+            self.assertEqual(self.suggest('ringworld'), [ringworld.pk])
+
+
+class PenaltyPaymentTests(TemporaryDashboardCacheMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = [
+            User.objects.create_user(
+                email=f'patron{n}@example.com',
+                first_name='Test',
+                last_name='Patron',
+                username=f'patron{n}',
+                password='testpass'
+            )
+            for n in range(2)
+        ]
+        self.books = [
+            Book.objects.create(
+                title=f'Test Book {n}',
+                author='Test Author',
+                isbn=f'978030640615{n}',
+                genre=genre,
+                publish_date='2023-01-01',
+                total_copies=10,
+                available_copies=10
+            )
+            for n, genre in enumerate(['Fiction', 'History'])
+        ]
+
+    def fine(self, user, amounts, book=None):
+        return [
+            Transaction.objects.create(user=user, book=book or self.books[n % 2], penalty_amount=Decimal(amount))
+            for n, amount in enumerate(amounts)
+        ]
+
+    def pay_all(self, user):
+        self.client.force_authenticate(user)
+        return self.client.post(reverse('transaction-pay-all'), {'payment_method': 'M-pesa'}, format='json')
+
+    def test_pay_all_records_one_payment(self):
+        loans = self.fine(self.users[0], ['2.00', '3.50', '5.00'])
+        other = self.fine(self.users[1], ['4.00'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.pay_all(self.users[0])
+
+        self.assertEqual(response.status_code, 200)
+        payment = PenaltyPayment.objects.get()
+        self.assertEqual(response.data['payment']['id'], payment.pk)
+        self.assertEqual(sorted(response.data['payment']['transactions']), [loan.pk for loan in loans])
+        self.assertEqual(
+            (payment.user, payment.amount, payment.loan_count, payment.payment_method),
+            (self.users[0], Decimal('10.50'), 3, 'M-pesa')
+        )
+        self.assertEqual(
+            set(Transaction.objects.filter(payment=payment, penalty_paid=True).values_list('pk', flat=True)),
+            {loan.pk for loan in loans}
+        )
+        self.assertFalse(Transaction.objects.get(pk=other[0].pk).penalty_paid)
+
+        self.assertEqual(OutboxEvent.objects.filter(topic='penalty.paid').count(), 3)
+        self.assertEqual(
+            dict(DailyCirculationStat.objects.values_list('genre', 'penalties_paid')),
+            {'Fiction': Decimal('7.00'), 'History': Decimal('3.50')}
+        )
+        self.assertEqual(self.pay_all(self.users[0]).status_code, 400)
+
+    def test_pay_all_is_one_update_however_many_loans(self):
+        self.fine(self.users[0], ['1.00'] * 2, book=self.books[0])
+        self.fine(self.users[1], ['1.00'] * 8, book=self.books[0])
+        # The first payment of the day would otherwise also create the rollup row.
+        DailyCirculationStat.objects.record_payment(self.books[0].genre, Decimal('0.00'))
+
+        counts = []
+        for user in self.users:
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.pay_all(user).status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_admin_action_and_single_payments_share_the_path(self):
+        first, second = self.fine(self.users[0], ['2.00', '3.00'])
+        third, = self.fine(self.users[1], ['4.00'])
+
+        self.assertTrue(first.pay_penalty('credit_card'))
+        self.assertEqual((first.penalty_paid, first.payment.amount), (True, Decimal('2.00')))
+        self.assertFalse(first.pay_penalty('credit_card'))
+
+        from .tasks import mark_penalties_paid
+        mark_penalties_paid([first.pk, second.pk, third.pk])
+
+        staff = PenaltyPayment.objects.filter(payment_method=PenaltyPayment.Method.STAFF)
+        self.assertEqual(
+            sorted(staff.values_list('user_id', 'amount', 'loan_count')),
+            [(self.users[0].pk, Decimal('3.00'), 1), (self.users[1].pk, Decimal('4.00'), 1)]
+        )
+        self.assertFalse(Transaction.objects.filter(penalty_paid=False).exists())
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='reader@example.com',
+            first_name='Test',
+            last_name='Reader',
+            username='reader',
+            password='testpass'
+        )
+        self.book = Book.objects.create(
+            title='Test Book',
+            author='Test Author',
+            isbn='1234567890123',
+            genre='Fiction',
+            publish_date='2023-01-01',
+            total_copies=5,
+            available_copies=5
+        )
+        self.loan = Transaction.objects.create(
+            user=self.user, book=self.book, due_date=timezone.now().date() - timedelta(days=7)
+        )
+
+    def test_claimed_job_runs_once_and_records_timings(self):
+        from .tasks import recompute_penalties
+        queued = recompute_penalties.enqueue()
+
+        job = claim('worker-1')
+        self.assertEqual(job.pk, queued.pk)
+        self.assertIsNone(claim('worker-2'))
+        run_job(job)
+
+        job.refresh_from_db()
+        self.loan.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.SUCCEEDED)
+        self.assertIsNotNone(job.duration_ms)
+        self.assertEqual(self.loan.penalty_amount, Decimal('7.00'))
+        self.assertEqual(Job.objects.stats()[recompute_penalties.job_name]['succeeded'], 1)
+
+    def test_failures_are_retried_with_backoff_then_given_up(self):
+        failing_job.enqueue()
+
+        with self.assertLogs('library.jobs', 'WARNING'):
+            job = run_job(claim('worker-1'))
+        self.assertEqual((job.status, job.attempts), (Job.Status.QUEUED, 1))
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIsNone(claim('worker-1'))
+
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs('library.jobs', 'WARNING'):
+            job = run_job(claim('worker-1'))
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertIn('RuntimeError: boom', job.last_error)
+
+    def test_jobs_abandoned_by_a_dead_worker_are_reclaimed(self):
+        failing_job.enqueue()
+        claim('worker-1')
+        self.assertIsNone(claim('worker-2'))
+
+        Job.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(claim('worker-2').locked_by, 'worker-2')
+
+
+class RunWorkersTests(TransactionTestCase):
+    def test_workers_drain_the_queue(self):
+        user = User.objects.create_user(
+            email='reader@example.com', first_name='Test', last_name='Reader',
+            username='reader', password='testpass'
+        )
+        book = Book.objects.create(
+            title='Test Book', author='Test Author', isbn='1234567890123', genre='Fiction',
+            publish_date='2023-01-01', total_copies=5, available_copies=5
+        )
+        loans = [
+            Transaction.objects.create(user=user, book=book, penalty_amount=Decimal('2.00'))
+            for _ in range(3)
+        ]
+        from .tasks import mark_penalties_paid
+        for loan in loans:
+            mark_penalties_paid.enqueue([loan.pk])
+
+        out = StringIO()
+        call_command('run_workers', '--workers', '2', '--drain', stdout=out)
+
+        self.assertIn('Processed 3 jobs', out.getvalue())
+        self.assertFalse(Transaction.objects.filter(penalty_paid=False).exists())
+        self.assertEqual(Job.objects.filter(status=Job.Status.SUCCEEDED).count(), 3)
+
+    def test_worker_survives_a_locked_database(self):
+        from .tasks import recompute_penalties
+        recompute_penalties.enqueue()
+        real_claim = jobs.claim
+        errors = [OperationalError('database is locked')]
+
+        def flaky_claim(name):
+            if errors:
+                raise errors.pop()
+            return real_claim(name)
+
+        with mock.patch.object(jobs, 'claim', flaky_claim):
+            self.assertEqual(Worker('worker-1', poll_interval=0.01, drain=True).run(), 1)
+        self.assertEqual(Job.objects.get().status, Job.Status.SUCCEEDED)
+
+        with mock.patch.object(jobs, 'claim', side_effect=OperationalError('no such table: library_job')):
+            with self.assertRaises(OperationalError):
+                Worker('worker-1', poll_interval=0.01, drain=True).run()
+
+
+class SendRemindersTests(TestCase):
+    def setUp(self):
+        self.readers = [
+            User.objects.create_user(
+                email=f'reader{i}@example.com',
+                first_name='Test',
+                last_name='Reader',
+                username=f'reader{i}',
+                password='testpass'
+            )
+            for i in range(2)
+        ]
+        self.book = Book.objects.create(
+            title='Test Book',
+            author='Test Author',
+            isbn='1234567890123',
+            genre='Fiction',
+            publish_date='2023-01-01',
+            total_copies=5,
+            available_copies=5
+        )
+        today = timezone.now().date()
+        self.overdue = Transaction.objects.create(
+            user=self.readers[0], book=self.book, due_date=today - timedelta(days=4)
+        )
+        self.due_soon = Transaction.objects.create(
+            user=self.readers[0], book=self.book, due_date=today + timedelta(days=2)
+        )
+        Transaction.objects.create(user=self.readers[1], book=self.book, due_date=today + timedelta(days=1))
+        # Not due for a while, and already returned: no reminders
+        Transaction.objects.create(user=self.readers[1], book=self.book, due_date=today + timedelta(days=30))
+        Transaction.objects.create(
+            user=self.readers[1], book=self.book, due_date=today - timedelta(days=4), return_date=today
+        )
+
+    def send(self, *args):
+        call_command('send_reminders', '--rate', '0', *args, stdout=StringIO())
+
+    def test_one_message_per_patron_covering_all_their_loans(self):
+        self.send()
+
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), [
+            'reader0@example.com', 'reader1@example.com'
+        ])
+        message = next(message for message in mail.outbox if message.to == ['reader0@example.com'])
+        self.assertEqual(message.subject, 'Overdue library books')
+        self.assertIn('4 days overdue, $4.00 so far', message.body)
+        self.assertIn('These books are due soon', message.body)
+        self.assertEqual(Reminder.objects.count(), 3)
+
+    def test_rerun_sends_nothing_new(self):
+        self.send()
+        self.send()
+
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_overdue_reminders_repeat_after_the_interval(self):
+        self.send()
+        Reminder.objects.update(sent_on=timezone.now().date() - timedelta(days=7))
+        mail.outbox.clear()
+
+        self.send()
+
+        self.assertEqual([message.to for message in mail.outbox], [['reader0@example.com']])
+        self.assertNotIn('due soon', mail.outbox[0].body)
+
+
+class BranchTestMixin:
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='reader@example.com',
+            first_name='Test',
+            last_name='Reader',
+            username='reader',
+            password='testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.book = Book.objects.create(
+            title='Test Book',
+            author='Test Author',
+            isbn='1234567890123',
+            genre='Fiction',
+            publish_date='2023-01-01',
+            total_copies=3,
+            available_copies=3
+        )
+        call_command('seed_branch_holdings', stdout=StringIO())
+
+    def checkout(self, code):
+        return self.client.post(reverse('branch-checkout', args=[code]), {'book': self.book.pk}, format='json')
+
+    def availability(self):
+        return self.client.get(reverse('book-availability', args=[self.book.pk])).data
+
+
+@override_settings(LIBRARY_BRANCHES={'north': 'default', 'south': 'default'})
+class BranchCirculationTests(TemporaryDashboardCacheMixin, BranchTestMixin, APITestCase):
+    def test_copies_are_split_and_lent_per_branch(self):
+        self.assertEqual(self.availability()['branches'], {'north': 2, 'south': 1})
+
+        self.assertEqual(self.checkout('south').status_code, 201)
+        response = self.checkout('south')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.checkout('north').status_code, 201)
+
+        availability = self.availability()
+        self.assertEqual((availability['total_copies'], availability['available_copies']), (3, 1))
+        self.assertEqual(availability['branches'], {'north': 1, 'south': 0})
+        # Seeding moved the shelved copies out of the shared counter, so
+        # they cannot also be lent through the legacy checkout.
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.total_copies, self.book.available_copies), (0, 0))
+        response = self.client.post(reverse('checkout-book'), {'book': self.book.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_seeding_again_moves_copies_returned_to_the_shared_pool(self):
+        Book.objects.filter(pk=self.book.pk).update(total_copies=2, available_copies=2)
+
+        call_command('seed_branch_holdings', stdout=StringIO())
+
+        self.assertEqual(self.availability()['branches'], {'north': 3, 'south': 2})
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.total_copies, self.book.available_copies), (0, 0))
+
+    def test_unpaid_branch_penalties_block_borrowing(self):
+        loan_id = self.checkout('north').data['id']
+        BranchLoan.objects.filter(pk=loan_id).update(
+            return_date=timezone.now().date(), penalty_amount=Transaction.MAX_PENALTY
+        )
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.has_branch_loans)
+        self.assertFalse(self.user.can_borrow_books())
+        self.assertEqual(self.checkout('south').status_code, 400)
+
+    def test_failed_seeding_never_leaves_a_copy_lendable_twice(self):
+        book = Book.objects.create(
+            title='Second Book', author='Test Author', isbn='1234567890124', genre='Fiction',
+            publish_date='2023-01-01', total_copies=4, available_copies=4
+        )
+        stock = SeedBranchHoldings.stock
+
+        def fail_south(command, code, *args):
+            if code == 'south':
+                raise DatabaseError('disk I/O error')
+            return stock(command, code, *args)
+
+        with mock.patch.object(SeedBranchHoldings, 'stock', fail_south), self.assertRaises(CommandError):
+            call_command('seed_branch_holdings', stdout=StringIO())
+
+        book.refresh_from_db()
+        self.assertEqual((book.total_copies, book.available_copies), (0, 0))
+        self.assertEqual(
+            list(BranchHolding.objects.filter(book=book).values_list('branch_code', 'available_copies')),
+            [('north', 2)]
+        )
+
+    def test_branch_penalties_are_paid_and_refresh_the_dashboard(self):
+        loan_id = self.checkout('north').data['id']
+        BranchLoan.objects.filter(pk=loan_id).update(due_date=timezone.now().date() - timedelta(days=90))
+        self.assertTrue(self.client.get(reverse('me-dashboard')).data['can_borrow'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('branch-return', args=['north']), {'loan': loan_id}, format='json')
+        penalties = self.client.get(reverse('me-dashboard')).data
+        self.assertEqual(penalties['penalties']['branch_unpaid_total'], Transaction.MAX_PENALTY)
+        self.assertFalse(penalties['can_borrow'])
+
+        pay = lambda: self.client.post(
+            reverse('branch-pay-penalty', args=['north']),
+            {'loan': loan_id, 'payment_method': 'credit_card'}, format='json'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = pay()
+        self.assertEqual(response.status_code, 200)
+        payment = PenaltyPayment.objects.get(pk=response.data['loan']['payment'])
+        self.assertEqual((payment.amount, payment.loan_count), (Transaction.MAX_PENALTY, 1))
+        self.assertTrue(self.client.get(reverse('me-dashboard')).data['can_borrow'])
+        self.assertEqual(pay().status_code, 400)
+        self.assertEqual(PenaltyPayment.objects.count(), 1)
+
+    def test_return_puts_the_copy_back_at_its_branch(self):
+        loan_id = self.checkout('south').data['id']
+
+        response = self.client.post(reverse('branch-return', args=['south']), {'loan': loan_id}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.data['return_date'])
+        self.assertEqual(self.availability()['branches']['south'], 1)
+
+    def test_unknown_branch_is_not_found(self):
+        self.assertEqual(self.checkout('east').status_code, 404)
+
+
+@skipUnless(
+    {'branch_north', 'branch_south'} <= set(settings.DATABASES),
+    'Run with LIBRARY_BRANCHES=north,south to test separate branch databases'
+)
+class ShardedBranchTests(BranchTestMixin, APITestCase):
+    # Only name aliases that exist, so the runner still works without shards.
+    databases = {'default', 'branch_north', 'branch_south'} & set(settings.DATABASES)
+
+    def test_branch_rows_live_on_their_shard(self):
+        self.checkout('north')
+
+        self.assertEqual(BranchLoan.objects.using('branch_north').count(), 1)
+        self.assertEqual(BranchLoan.objects.using('branch_south').count(), 0)
+        self.assertEqual(BranchHolding.objects.using('default').count(), 0)
+        self.assertEqual(self.availability()['branches'], {'north': 1, 'south': 1})
+
+    def test_legacy_borrowers_are_not_looked_up_on_the_shards(self):
+        with self.assertNumQueries(0, using='branch_north'), self.assertNumQueries(0, using='branch_south'):
+            self.assertTrue(self.user.can_borrow_books())
+
+        self.checkout('north')
+        self.user.refresh_from_db()
+        with self.assertNumQueries(1, using='branch_north'), self.assertNumQueries(1, using='branch_south'):
+            self.assertTrue(self.user.can_borrow_books())
+
+
+class CopyScanTests(APITestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(
+            email='staff@example.com',
+            first_name='Staff',
+            last_name='User',
+            username='staff',
+            password='testpass'
+        )
+        self.staff.is_staff = True
+        self.staff.save()
+        self.reader = User.objects.create_user(
+            email='reader@example.com',
+            first_name='Test',
+            last_name='Reader',
+            username='reader',
+            password='testpass'
+        )
+        self.book = Book.objects.create(
+            title='Test Book',
+            author='Test Author',
+            isbn='1234567890123',
+            genre='Fiction',
+            publish_date='2023-01-01',
+            total_copies=2,
+            available_copies=2
+        )
+        self.copies = [BookCopy.objects.create(book=self.book, barcode=f'LIB-000{i}') for i in range(2)]
+
+    def checkout(self, barcode):
+        self.client.force_authenticate(self.reader)
+        return self.client.post(reverse('checkout-book'), {'barcode': barcode}, format='json')
+
+    def test_scan_resolves_copy_book_and_loan_in_one_query(self):
+        loan = self.book.checkout(self.reader, copy=self.copies[0])
+
+        with self.assertNumQueries(1):
+            copy = BookCopy.objects.scan('LIB-0000')
+            self.assertEqual(copy.book.title, 'Test Book')
+        self.assertEqual((copy.loan_id, copy.loan_user_email), (loan.pk, 'reader@example.com'))
+        self.assertIsNone(BookCopy.objects.scan('LIB-0001').loan_id)
+
+    def test_checkout_and_return_by_scan(self):
+        self.assertEqual(self.checkout('LIB-0001').status_code, 201)
+        self.assertEqual(self.checkout('LIB-0001').status_code, 400)
+
+        self.client.force_authenticate(self.staff)
+        scanned = self.client.get(reverse('scan', args=['LIB-0001'])).data
+        self.assertEqual(scanned['book']['id'], self.book.pk)
+        self.assertEqual(scanned['open_loan']['user_email'], 'reader@example.com')
+
+        response = self.client.post(reverse('scan-return', args=['LIB-0001']))
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(self.client.get(reverse('scan', args=['LIB-0001'])).data['open_loan'])
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 2)
+
+    def test_unknown_barcode_is_not_found(self):
+        self.client.force_authenticate(self.staff)
+
+        self.assertEqual(self.client.get(reverse('scan', args=['NOPE'])).status_code, 404)
+        self.assertEqual(self.client.post(reverse('scan-return', args=['LIB-0000'])).status_code, 400)
+
+
+class IsbnLookupTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='reader@example.com',
+            first_name='Test',
+            last_name='Reader',
+            username='reader',
+            password='testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.book = Book.objects.create(
+            title='Test Book',
+            author='Test Author',
+            isbn='9780306406157',
+            genre='Fiction',
+            publish_date='2023-01-01',
+            total_copies=1,
+            available_copies=1
+        )
+
+    def test_normalize_converts_and_validates(self):
+        self.assertEqual(normalize_isbn('0-306-40615-2'), '9780306406157')
+        self.assertEqual(normalize_isbn('978 0 306 40615 7'), '9780306406157')
+        self.assertEqual(normalize_isbn('080442957x'), '9780804429573')
+        for value in ('0306406153', '9780306406158', '12345'):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                normalize_isbn(value)
+
+    def test_lookup_maps_every_input(self):
+        isbns = ['0-306-40615-2', '9780306406157', '9780804429573', '9780306406158']
+
+        response = self.client.post(reverse('book-lookup'), {'isbns': isbns}, format='json')
+
+        results = response.data['results']
+        self.assertEqual(list(results), isbns)
+        self.assertEqual(response.data['found'], 2)
+        self.assertEqual(results['0-306-40615-2']['book']['id'], self.book.pk)
+        self.assertEqual(results['9780804429573'], {'isbn': '9780804429573', 'book': None})
+        self.assertIn('check digit', results['9780306406158']['error'])
+
+    def test_books_stored_without_a_valid_check_digit_are_still_found(self):
+        cache.clear()
+        legacy = Book.objects.create(
+            title='Legacy Book', author='Test Author', isbn='1234567890123', genre='Fiction',
+            publish_date='2023-01-01', total_copies=1, available_copies=1
+        )
+
+        response = self.client.get(reverse('book-list'), {'isbn': '1234567890123'})
+        self.assertEqual([book['id'] for book in response.data['results']], [legacy.pk])
+
+        response = self.client.post(
+            reverse('book-lookup'), {'isbns': ['123-4567890123', '1234567890124']}, format='json'
+        )
+        results = response.data['results']
+        self.assertEqual(results['123-4567890123']['book']['id'], legacy.pk)
+        self.assertIn('check digit', results['1234567890124']['error'])
+
+    def test_large_batches_are_chunked(self):
+        # ISBN-10s are converted, so any 9 digits plus a valid check digit will do.
+        isbns = []
+        for n in range(2500):
+            digits = f'{n:09d}'
+            check = (11 - sum((10 - i) * int(d) for i, d in enumerate(digits)) % 11) % 11
+            isbns.append(digits + ('X' if check == 10 else str(check)))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('book-lookup'), {'isbns': isbns}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        lookups = [query['sql'] for query in queries if 'library_book' in query['sql'] and ' IN ' in query['sql']]
+        self.assertGreater(len(lookups), 1)
+
+    def test_isbn_filter_on_the_book_list(self):
+        cache.clear()
+        response = self.client.get(reverse('book-list'), {'isbn': '0-306-40615-2'})
+
+        self.assertEqual([book['id'] for book in response.data['results']], [self.book.pk])
+
+
+class BookBulkWriteTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='cataloguer@example.com',
+            first_name='Test',
+            last_name='Cataloguer',
+            username='cataloguer',
+            password='testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.book = Book.objects.create(
+            title='Test Book',
+            author='Test Author',
+            isbn='9780306406157',
+            genre='Fiction',
+            publish_date='2023-01-01',
+            total_copies=1,
+            available_copies=1
+        )
+
+    def rows(self, count, start=0):
+        return [
+            {
+                'title': f'Book {n}',
+                'author': f'Author {n % 3}',
+                'isbn': f'{9790000000000 + n}',
+                'genre': 'Poetry',
+                'publish_date': '1999-05-01',
+                'total_copies': 2,
+                'available_copies': 2,
+            }
+            for n in range(start, start + count)
+        ]
+
+    def test_list_create_writes_the_batch_in_fixed_queries(self):
+        # The first batch also creates the authors and facet rows.
+        self.assertEqual(self.client.post(reverse('book-list'), self.rows(5), format='json').status_code, 201)
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(reverse('book-list'), self.rows(5, start=5), format='json')
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.post(reverse('book-list'), self.rows(45, start=10), format='json')
+
+        self.assertEqual(response.data['created'], 45)
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(Book.objects.filter(genre='Poetry').count(), 55)
+        self.assertEqual(Author.objects.filter(name__startswith='Author ').count(), 3)
+        self.assertFalse(Book.objects.filter(genre='Poetry', author_record__isnull=True).exists())
+        self.assertEqual(BookFacetCount.objects.as_dict()[BookFacetCount.GENRE]['Poetry'], 55)
+        self.assertEqual(OutboxEvent.objects.filter(topic='book.created').count(), 56)
+
+    def test_upsert_matches_existing_books_by_isbn(self):
+        rows = [
+            {'isbn': self.book.isbn, 'available_copies': 0, 'genre': 'Poetry'},
+            self.rows(1)[0],
+        ]
+
+        response = self.client.post(reverse('book-upsert'), rows, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['updated']), (1, 1))
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.title, 'Test Book')
+        self.assertEqual(self.book.status, Book.Status.CHECKED_OUT)
+        facets = BookFacetCount.objects.as_dict()
+        self.assertEqual(facets[BookFacetCount.GENRE], {'Poetry': 2})
+        self.assertEqual(facets[BookFacetCount.STATUS], {Book.Status.AVAILABLE: 1, Book.Status.CHECKED_OUT: 1})
+        event = OutboxEvent.objects.get(topic='book.updated')
+        self.assertEqual((event.object_id, event.payload['genre']), (self.book.pk, 'Poetry'))
+
+    def test_bulk_update_by_id(self):
+        response = self.client.patch(
+            reverse('book-bulk-update'),
+            [{'id': self.book.pk, 'total_copies': 4, 'available_copies': 3}],
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.total_copies, self.book.available_copies), (4, 3))
+
+    def test_errors_are_reported_per_row_and_nothing_is_written(self):
+        rows = self.rows(4)
+        rows[1]['isbn'] = self.book.isbn
+        rows[2]['isbn'] = rows[0]['isbn']
+        rows[3]['available_copies'] = 5
+
+        response = self.client.post(reverse('book-list'), rows, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        errors = response.data['errors']
+        self.assertIsNone(errors[0])
+        self.assertIn('already exists', str(errors[1]['isbn']))
+        self.assertIn('Duplicate of row 0', str(errors[2]['isbn']))
+        self.assertIn('non_field_errors', errors[3])
+        self.assertFalse(Book.objects.filter(genre='Poetry').exists())
+
+        missing = self.client.patch(reverse('book-bulk-update'), [{'id': 0, 'title': 'Gone'}], format='json')
+        self.assertEqual(missing.data['errors'], [{'id': ['No book with this id']}])
+
+
+class IdempotencyKeyTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='reader@example.com',
+            first_name='Test',
+            last_name='Reader',
+            username='reader',
+            password='testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.book = Book.objects.create(
+            title='Test Book',
+            author='Test Author',
+            isbn='1234567890123',
+            genre='Fiction',
+            publish_date='2023-01-01',
+            total_copies=3,
+            available_copies=3
+        )
+
+    def checkout(self, key, book=None):
+        return self.client.post(
+            reverse('checkout-book'), {'book': (book or self.book).pk},
+            format='json', HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retried_checkout_replays_the_first_response(self):
+        first = self.checkout('checkout-1')
+        retry = self.checkout('checkout-1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.data['id'], first.data['id'])
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 2)
+
+    def test_retried_return_is_applied_once(self):
+        loan = self.book.checkout(self.user)
+        url = reverse('return-book', args=[loan.pk])
+
+        first = self.client.put(url, HTTP_IDEMPOTENCY_KEY='return-1')
+        retry = self.client.put(url, HTTP_IDEMPOTENCY_KEY='return-1')
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(retry.data, first.data)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 3)
+
+    def test_key_reused_for_a_different_request_is_rejected(self):
+        other = Book.objects.create(
+            title='Other Book', author='Test Author', isbn='9876543210987', genre='Fiction',
+            publish_date='2023-01-01', total_copies=1, available_copies=1
+        )
+        self.checkout('checkout-1')
+
+        response = self.checkout('checkout-1', book=other)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    @override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0)
+    def test_duplicate_of_an_unfinished_request_conflicts(self):
+        self.checkout('checkout-1')
+        # Make the stored key look like its request is still running.
+        IdempotencyKey.objects.update(response_status=None, response_body=None)
+
+        response = self.checkout('checkout-1')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    @override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0)
+    def test_key_abandoned_by_a_crashed_request_is_taken_over(self):
+        # A request that died after claiming the key and before answering.
+        IdempotencyKey.objects.claim(self.user, 'checkout-1', '')
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(minutes=5))
+        # Only the fingerprint of the retried request matters for a takeover.
+        IdempotencyKey.objects.update(request_hash='stale')
+
+        response = self.checkout('checkout-1')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(IdempotencyKey.objects.get().response_status, 201)
+
+    def test_key_is_released_when_the_view_raises(self):
+        pay_all = lambda: self.client.post(
+            reverse('transaction-pay-all'), {'payment_method': 'credit_card'},
+            format='json', HTTP_IDEMPOTENCY_KEY='pay-1'
+        )
+        with mock.patch.object(type(Transaction.objects.all()), 'pay_penalties', side_effect=RuntimeError('crash')):
+            with self.assertRaises(RuntimeError):
+                pay_all()
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        self.assertEqual(pay_all().status_code, 400)
+
+    def test_expired_keys_are_reused_and_purged(self):
+        self.checkout('checkout-1')
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        response = self.checkout('checkout-1')
+
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Transaction.objects.count(), 2)
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        call_command('purge_idempotency_keys', stdout=StringIO())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+class ThrottlingTests(APITestCase):
+    def setUp(self):
+        get_store().clear()
+        self.user = User.objects.create_user(
+            email='reader@example.com',
+            first_name='Test',
+            last_name='Reader',
+            username='reader',
+            password='testpass'
+        )
+
+    def rates(self, **rates):
+        return {
+            **settings.REST_FRAMEWORK,
+            'DEFAULT_THROTTLE_RATES': {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], **rates},
+        }
+
+    def test_gcra_allows_a_burst_then_the_sustained_rate(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for store in (MemoryStore(), SQLiteStore(os.path.join(directory, 'throttle.sqlite3'))):
+                with self.subTest(store=type(store).__name__):
+                    # Two requests per ten seconds.
+                    self.assertEqual(store.update('k', 100.0, 5, 10), 0)
+                    self.assertEqual(store.update('k', 100.0, 5, 10), 0)
+                    self.assertAlmostEqual(store.update('k', 101.0, 5, 10), 4)
+                    self.assertEqual(store.update('k', 105.0, 5, 10), 0)
+                    self.assertEqual(store.update('other', 105.0, 5, 10), 0)
+
+    def test_login_attempts_are_throttled_per_account(self):
+        with override_settings(REST_FRAMEWORK=self.rates(login_account='2/min')):
+            for _ in range(2):
+                response = self.client.post(
+                    reverse('token_obtain_pair'), {'email': 'reader@example.com', 'password': 'wrong'}
+                )
+                self.assertEqual(response.status_code, 401)
+            response = self.client.post(
+                reverse('token_obtain_pair'), {'email': 'Reader@Example.com', 'password': 'testpass'}
+            )
+            self.assertEqual(response.status_code, 429)
+            self.assertIn('Retry-After', response)
+
+            response = self.client.post(
+                reverse('token_obtain_pair'), {'email': 'someone@example.com', 'password': 'wrong'}
+            )
+            self.assertEqual(response.status_code, 401)
+
+    def test_circulation_is_throttled_per_user_and_reads_are_not(self):
+        book = Book.objects.create(
+            title='Test Book', author='Test Author', isbn='1234567890123', genre='Fiction',
+            publish_date='2023-01-01', total_copies=5, available_copies=5
+        )
+        self.client.force_authenticate(self.user)
+        with override_settings(REST_FRAMEWORK=self.rates(circulation_user='1/min')):
+            first = self.client.post(reverse('checkout-book'), {'book': book.pk}, format='json')
+            second = self.client.post(reverse('checkout-book'), {'book': book.pk}, format='json')
+            for _ in range(3):
+                self.assertEqual(self.client.get(reverse('book-list')).status_code, 200)
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 429)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+
+class AdviseIndexesTests(TestCase):
+    def test_workload_sort_produces_index_migration(self):
+        sql, params = Book.objects.filter(genre='Fiction').order_by('total_copies').query.sql_with_params()
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as workload:
+            workload.write(json.dumps({'sql': sql, 'params': list(params), 'count': 5}) + '\n')
+        self.addCleanup(os.remove, workload.name)
+
+        out = StringIO()
+        call_command('advise_indexes', '--workload', workload.name, '--dry-run', stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('library_book (genre, total_copies)', output)
+        self.assertIn("models.Index(fields=['genre', 'total_copies']", output)
+
+
+@override_settings(DB_LOCK_RETRY_BASE_DELAY=0)
+class LockRetryTests(TransactionTestCase):
+    def locked_then(self, failures, error='database is locked'):
+        calls = []
+
+        @retry_on_locked
+        def write():
+            calls.append(1)
+            if len(calls) <= failures:
+                raise OperationalError(error)
+            return len(calls)
+
+        return write, calls
+
+    def test_locked_writes_are_retried_a_bounded_number_of_times(self):
+        write, _ = self.locked_then(2)
+        self.assertEqual(write(), 3)
+
+        write, calls = self.locked_then(10)
+        with self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), settings.DB_LOCK_RETRY_ATTEMPTS)
+
+    def test_other_errors_and_enclosing_transactions_are_not_retried(self):
+        write, calls = self.locked_then(1, error='no such table: library_book')
+        with self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), 1)
+
+        write, calls = self.locked_then(1)
+        with self.assertRaises(OperationalError), db_transaction.atomic():
+            write()
+        self.assertEqual(len(calls), 1)
+
+    def test_retry_reloads_model_arguments(self):
+        book = Book.objects.create(
+            title='Test Book', author='Test Author', isbn='9780306406157', genre='Fiction',
+            publish_date='2023-01-01', total_copies=2, available_copies=2
+        )
+        attempts = []
+
+        @retry_on_locked
+        def lend(book):
+            book.available_copies -= 1
+            attempts.append(book.available_copies)
+            if len(attempts) == 1:
+                raise OperationalError('database is locked')
+            book.save()
+
+        lend(book)
+
+        self.assertEqual(attempts, [1, 1])
+        book.refresh_from_db()
+        self.assertEqual((book.available_copies, book.status), (1, Book.Status.AVAILABLE))
+        self.assertEqual(BookFacetCount.objects.as_dict()[BookFacetCount.STATUS], {Book.Status.AVAILABLE: 1})
+
+
+class ProfileStartupTests(TestCase):
+    def test_reports_cold_start_and_enforces_the_budget(self):
+        out = StringIO()
+        call_command('profile_startup', '--repeat', '1', '--json', stdout=out)
+
+        result = json.loads(out.getvalue())
+        self.assertEqual((result['path'], result['status']), ('/api/books/', 401))
+        phases = result['phases_ms']
+        self.assertGreater(phases['total'], phases['apps_ready'])
+        self.assertLess(phases['second_response'], phases['first_response'])
+        self.assertIn('django', result['packages_ms'])
+
+        with self.assertRaisesMessage(CommandError, 'over the 1ms budget'):
+            call_command('profile_startup', '--repeat', '1', '--budget-ms', '1', stdout=StringIO())
+
+
+class QueryPlanSnapshotTests(TestCase):
+    """
+    Guards the hot-path query plans against index regressions.
+
+    Plans are compared with library/plan_snapshots.json; a query fails when
+    its plan gains a full table scan or a temp sort the snapshot did not
+    have. Run with UPDATE_PLAN_SNAPSHOTS=1 to re-record after an intended
+    change.
+    """
+    SNAPSHOT_PATH = Path(__file__).with_name('plan_snapshots.json')
+
+    def test_hot_query_plans_have_not_degraded(self):
+        vendor = connection.vendor
+        current = {name: queryset_plan(queryset) for name, queryset in hot_queries().items()}
+        snapshots = json.loads(self.SNAPSHOT_PATH.read_text()) if self.SNAPSHOT_PATH.exists() else {}
+
+        if os.environ.get('UPDATE_PLAN_SNAPSHOTS'):
+            snapshots[vendor] = current
+            self.SNAPSHOT_PATH.write_text(json.dumps(snapshots, indent=2, sort_keys=True) + '\n')
+            return
+        if vendor not in snapshots:
+            self.skipTest(f'No plan snapshots recorded for {vendor}')
+
+        recorded = snapshots[vendor]
+        for name, plan in current.items():
+            with self.subTest(query=name):
+                self.assertIn(name, recorded, 'No snapshot yet; run with UPDATE_PLAN_SNAPSHOTS=1')
+                regressions = set(plan_issues(plan, vendor)) - set(plan_issues(recorded[name], vendor))
+                self.assertFalse(
+                    regressions,
+                    f'{name} plan degraded: {plan} (snapshot: {recorded[name]})'
+                )
+
+    def test_plan_issues_flags_scans_and_sorts(self):
+        self.assertEqual(
+            plan_issues(['SCAN library_book', 'USE TEMP B-TREE FOR ORDER BY']),
+            [(FULL_SCAN, 'library_book'), (TEMP_SORT, None)]
+        )
+        self.assertEqual(plan_issues(['SCAN library_book USING INDEX library_boo_title_c38ef2_idx']), [])
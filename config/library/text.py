@@ -0,0 +1,22 @@
+import re
+import unicodedata
+
+_APOSTROPHES = str.maketrans({'‘': "'", '’': "'", 'ʼ': "'", '`': "'"})
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fold(value):
+    """
+    Normalise text for matching: strip accents, unify apostrophes,
+    collapse whitespace and casefold.
+
+    "Ngũgĩ wa Thiong’o" and "ngugi  wa thiong'o" fold to the same key.
+    """
+    value = value or ''
+    if value.isascii():
+        # Nothing to decompose or translate; skip the per-character pass.
+        return _WHITESPACE.sub(' ', value).strip().casefold()
+    decomposed = unicodedata.normalize('NFKD', value)
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    stripped = stripped.translate(_APOSTROPHES)
+    return _WHITESPACE.sub(' ', stripped).strip().casefold()